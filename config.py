@@ -24,11 +24,27 @@ DB_PORT = get_required_env("POSTGRES_PORT")
 
 DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-# Получаем ID управляющих из переменных окружения
+# Получаем ID управляющих из переменных окружения (разбирается один раз при импорте)
 MANAGER_IDS_STR = os.getenv("MANAGER_IDS", "")
-MANAGER_IDS = [int(id.strip()) for id in MANAGER_IDS_STR.split(",") if id.strip().isdigit()] if MANAGER_IDS_STR else []
+MANAGER_IDS: frozenset[int] = frozenset(int(id.strip()) for id in MANAGER_IDS_STR.split(",") if id.strip().isdigit())
+
+def is_manager(tg_id: int) -> bool:
+    """Проверяет, входит ли пользователь в список управляющих из MANAGER_IDS"""
+
+    return tg_id in MANAGER_IDS
 
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 
+# Вывод SQL-запросов в лог (только для отладки: SQL_ECHO=1)
+SQL_ECHO = os.getenv("SQL_ECHO", "") == "1"
+
+# Токены инициализации администраторов (через запятую) и лимит администраторов
+ADMIN_INIT_TOKENS_STR = os.getenv("ADMIN_INIT_TOKENS", os.getenv("ADMIN_INIT_TOKEN", ""))
+ADMIN_INIT_TOKENS: frozenset[str] = frozenset(token.strip() for token in ADMIN_INIT_TOKENS_STR.split(",") if token.strip())
+MAX_ADMINS = int(os.getenv("MAX_ADMINS", "5"))
+
+# Автоматическая авторизация зарегистрированных пользователей без /login
+ALLOW_AUTO_AUTH = os.getenv("ALLOW_AUTO_AUTH", "true").lower() == "true"
+
 # Роль по умолчанию для новых пользователей
 DEFAULT_ROLE = os.getenv("DEFAULT_ROLE", "Стажер") 
\ No newline at end of file
@@ -1,182 +1,592 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker, selectinload, joinedload
-from sqlalchemy import select, insert, delete, func, update, or_, and_, text
-from typing import AsyncGenerator, Optional, List
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import Session, aliased, selectinload, joinedload
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import select, insert, delete, func, update, or_, and_, text, exists, event, bindparam, table, column
+from typing import AsyncIterator, Optional, List, Set, Tuple
 import asyncio
+import functools
+import inspect
+import time
 from datetime import datetime
 
-from config import DATABASE_URL
+from config import DATABASE_URL, SQL_ECHO, ADMIN_INIT_TOKENS, MAX_ADMINS
 from database.models import (
     Base, Role, Permission, User, user_roles, role_permissions,
-    Test, TestQuestion, TestResult, InternshipStage, Mentorship, TraineeTestAccess,
+    Test, TestQuestion, QuestionStats, TestResult, InternshipStage, Mentorship, TraineeTestAccess,
     Group, user_groups, Object, user_objects,
     LearningPath, LearningStage, LearningSession, session_tests,
     Attestation, AttestationQuestion,
     TraineeLearningPath, TraineeStageProgress, TraineeSessionProgress,
     AttestationResult, TraineeManager, TraineeAttestation, AttestationQuestionResult,
-    KnowledgeFolder, KnowledgeMaterial, folder_group_access
+    KnowledgeFolder, KnowledgeMaterial, folder_group_access, SchemaVersion
 )
 from utils.logger import logger
-from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, InputMediaPhoto, InputMediaDocument
 import json
-import os
+import orjson
+
+from middlewares.rate_limit_middleware import bulk_sending
+
+
+# Число постоянных соединений пула; warm_up_pool открывает их все при старте
+DB_POOL_SIZE = 25
+
+
+def _json_serializer(value) -> str:
+    """Сериализация JSONB-колонок (answers_details, options, photos) через orjson"""
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
 
 
 engine = create_async_engine(
     DATABASE_URL,
-    echo=False,
-    pool_size=50,
-    max_overflow=100,
+    # SQL-эхо включается только явно через SQL_ECHO=1, иначе каждый запрос форматируется в лог
+    echo=SQL_ECHO,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=10,
     pool_timeout=30,
-    pool_recycle=3600,
-    pool_pre_ping=True
+    pool_recycle=1800,
+    pool_pre_ping=True,
+    json_serializer=_json_serializer,
+    json_deserializer=orjson.loads,
+    connect_args={
+        # Кэш подготовленных выражений на соединение: повторные запросы не парсятся заново
+        "prepared_statement_cache_size": 1024,
+        # JIT не окупается на коротких OLTP-запросах бота и добавляет задержку планирования
+        "server_settings": {"jit": "off"},
+    }
 )
-async_session = sessionmaker(
+async_session = async_sessionmaker(
     engine, expire_on_commit=False, class_=AsyncSession
 )
 
 
-async def get_session() -> AsyncGenerator[AsyncSession, None]:
-    async with async_session() as session:
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _clear_permissions_cache(session):
+    """Сброс закэшированных в сессии прав и чтений после завершения транзакции"""
+    session.info.pop("user_permissions", None)
+    session.info.pop("request_cache", None)
+
+
+# Кэш пользователей хранит роли, группы и объекты, поэтому сбрасывается и при их изменении
+_USER_TABLES = frozenset({
+    "users", "user_roles", "role_permissions",
+    "user_groups", "user_objects", "groups", "objects",
+})
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_user_writes(orm_execute_state):
+    """Пометка сессии, выполнившей INSERT/UPDATE/DELETE по пользователям, их ролям, группам или объектам"""
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table_name = getattr(getattr(orm_execute_state.statement, "table", None), "name", None)
+        if table_name in _USER_TABLES:
+            orm_execute_state.session.info.setdefault("user_tables_changed", set()).add(table_name)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_user_flush(session, flush_context):
+    """Пометка сессии, сохранившей изменения ORM-объектов User, Role, Group или Object"""
+    changed = session.info.setdefault("user_tables_changed", set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, User):
+            changed.add("users")
+        elif isinstance(obj, Role):
+            changed.add("roles")
+        elif isinstance(obj, Group):
+            changed.add("groups")
+        elif isinstance(obj, Object):
+            changed.add("objects")
+    if not changed:
+        session.info.pop("user_tables_changed")
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_user_cache_on_commit(session):
+    changed = session.info.pop("user_tables_changed", None)
+    if changed:
+        # Список пользователей зависит только от таблицы users: смена ролей его не сбрасывает
+        invalidate_user_cache(users_changed="users" in changed)
+
+
+def request_scoped_cache(name: str):
+    """Кэширование результата чтения в рамках текущей транзакции сессии
+    
+    Повторный вызов с теми же аргументами в одном обновлении возвращает
+    сохранённый в session.info результат без запроса к БД. Кэш сбрасывается
+    при commit/rollback. Пустые результаты не кэшируются.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(session: AsyncSession, *args):
+            cache = session.info.setdefault("request_cache", {})
+            key = (name, *args)
+            if key in cache:
+                return cache[key]
+            result = await func(session, *args)
+            if result:
+                cache[key] = result
+            return result
+        return wrapper
+    return decorator
+
+
+# Ссылки на фоновые задачи, чтобы сборщик мусора не уничтожил их до завершения
+_background_tasks: set = set()
+
+
+def _on_background_task_done(task: asyncio.Task):
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception():
+        logger.error(f"Ошибка фоновой задачи {task.get_name()}: {task.exception()}")
+
+
+def run_in_background(coro) -> asyncio.Task:
+    """Запуск корутины в фоне без ожидания результата (например, уведомлений)"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_on_background_task_done)
+    return task
+
+
+# Недавно отправленные уведомления: ключ события -> момент истечения блокировки
+NOTIFICATION_DEDUP_TTL = 60
+_recent_notifications: dict = {}
+
+
+def claim_notification(*key) -> bool:
+    """Захват ключа уведомления на NOTIFICATION_DEDUP_TTL секунд (аналог SET NX EX)
+    
+    Возвращает False, если такое же уведомление уже отправлялось недавно:
+    повторные события (например, двойная выдача доступа) не дублируют сообщения.
+    """
+    now = time.monotonic()
+    if len(_recent_notifications) > 1000:
+        for stale_key in [k for k, expires in _recent_notifications.items() if expires <= now]:
+            del _recent_notifications[stale_key]
+    if _recent_notifications.get(key, 0) > now:
+        return False
+    _recent_notifications[key] = now + NOTIFICATION_DEDUP_TTL
+    return True
+
+
+def release_notification(*key) -> None:
+    """Освобождение ключа уведомления, которое не удалось отправить"""
+    _recent_notifications.pop(key, None)
+
+
+def deduplicated_notification(kind: str, *key_params: str):
+    """Декоратор уведомления, которое не повторяется в течение NOTIFICATION_DEDUP_TTL
+    
+    Ключ (kind и значения аргументов key_params) захватывается до отправки,
+    чтобы одновременные события не дублировали сообщение. Если функция вернула
+    не True или упала, ключ освобождается и повторное событие снова отправит
+    уведомление.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            arguments = signature.bind(*args, **kwargs).arguments
+            key = (kind, *(arguments[name] for name in key_params))
+            # Повторное событие в течение TTL не рассылается второй раз
+            if not claim_notification(*key):
+                return True
+            sent = False
+            try:
+                sent = await func(*args, **kwargs) is True
+                return sent
+            finally:
+                if not sent:
+                    release_notification(*key)
+        return wrapper
+    return decorator
+
+
+# Очередь уведомлений: обработчики только ставят задание и сразу отвечают
+# пользователю, а фиксированное число воркеров отправляет сообщения в Telegram
+NOTIFICATION_WORKERS = 4
+_notification_queue: Optional[asyncio.Queue] = None
+_notification_workers: List[asyncio.Task] = []
+
+
+async def _notification_worker():
+    while True:
+        job, args = await _notification_queue.get()
         try:
-            yield session
+            await job(*args)
+        except Exception:
+            logger.exception("Ошибка задания уведомления %s", job.__name__)
         finally:
-            await session.close()
+            _notification_queue.task_done()
+
+
+def enqueue_notification(job, *args):
+    """Постановка задания уведомления job(*args) в очередь
+    
+    Если воркеры не запущены (например, в служебных скриптах), задание
+    выполняется как обычная фоновая задача.
+    """
+    if _notification_queue is None:
+        run_in_background(job(*args))
+        return
+    _notification_queue.put_nowait((job, args))
+
+
+async def start_notification_workers():
+    """Запуск воркеров очереди уведомлений при старте бота"""
+    global _notification_queue
+    if _notification_queue is None:
+        _notification_queue = asyncio.Queue()
+        _notification_workers.extend(
+            asyncio.create_task(_notification_worker(), name=f"notification-worker-{i}")
+            for i in range(NOTIFICATION_WORKERS)
+        )
+
+
+async def stop_notification_workers(timeout: float = 10):
+    """Отправка оставшихся уведомлений и остановка воркеров при завершении бота"""
+    global _notification_queue
+    if _notification_queue is None:
+        return
+    try:
+        await asyncio.wait_for(_notification_queue.join(), timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"Не отправлено уведомлений при остановке: {_notification_queue.qsize()}")
+    for worker in _notification_workers:
+        worker.cancel()
+    await asyncio.gather(*_notification_workers, return_exceptions=True)
+    _notification_workers.clear()
+    _notification_queue = None
+
+
+async def gather_in_sessions(*queries):
+    """Параллельное выполнение независимых чтений, каждое в своей короткой сессии
+    
+    Одну AsyncSession нельзя использовать из нескольких корутин одновременно,
+    поэтому каждая функция query(session) получает собственную сессию из пула.
+    Возвращает результаты в порядке переданных функций.
+    """
+    async def run(query):
+        async with async_session() as session:
+            return await query(session)
+    
+    return await asyncio.gather(*(run(query) for query in queries))
+
+
+async def set_async_commit(session: AsyncSession) -> None:
+    """Отключение ожидания fsync при commit текущей транзакции
+    
+    Подходит только для записей, которые можно безопасно повторить (выдача и
+    отзыв доступа): при сбое сервера БД последние миллисекунды записей могут
+    потеряться, но целостность данных сохраняется.
+    """
+    await session.execute(text("SET LOCAL synchronous_commit = off"))
+
+
+# Начиная с этого числа строк массовая вставка идёт через COPY, а не INSERT
+COPY_THRESHOLD = 100
+
+
+async def bulk_insert_copy(session: AsyncSession, table, columns: List[str], records: list) -> None:
+    """Массовая вставка строк через COPY в рамках текущей транзакции сессии
+    
+    На PostgreSQL с asyncpg используется copy_records_to_table, которая заметно
+    быстрее пакетного INSERT на больших объёмах; для других драйверов выполняется
+    обычный executemany. COPY обходит значения по умолчанию ORM, поэтому все
+    нужные колонки (включая даты) передаются явно, а JSONB - готовой JSON-строкой.
+    """
+    if not records:
+        return
+    
+    table = getattr(table, "__table__", table)
+    conn = await session.connection()
+    
+    if conn.dialect.name == "postgresql" and conn.dialect.driver == "asyncpg":
+        raw_connection = await conn.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            table.name, records=records, columns=columns
+        )
+    else:
+        await session.execute(insert(table), [dict(zip(columns, record)) for record in records])
+
+
+async def warm_up_pool():
+    """Предварительное открытие соединений пула, чтобы первые запросы не ждали подключения"""
+    async def open_connection():
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    
+    await asyncio.gather(*(open_connection() for _ in range(DB_POOL_SIZE)))
+    logger.info(f"Пул соединений с БД прогрет ({DB_POOL_SIZE} соединений)")
 
 
 async def init_db():
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+        # create_all проверяет каждую таблицу отдельным запросом, поэтому сначала
+        # одним запросом выясняем, не хватает ли вообще каких-либо таблиц
+        missing_tables = await conn.scalar(
+            text("SELECT count(*) FROM unnest(CAST(:names AS text[])) AS name WHERE to_regclass(name) IS NULL"),
+            {"names": list(Base.metadata.tables.keys())}
+        )
+        if missing_tables:
+            await conn.run_sync(Base.metadata.create_all)
     
 
     await create_initial_data()
 
-    await update_role_permissions_for_existing_db()
+    # Однократные миграции данных выполняются только при отставании версии схемы
+    schema_version = await get_schema_version()
+    if schema_version < 2 and await update_role_permissions_for_existing_db():
+        schema_version = 2
+        await set_schema_version(schema_version)
+    if schema_version == 2 and await migrate_user_links_cascade():
+        schema_version = 3
+        await set_schema_version(schema_version)
+    if schema_version == 3 and await migrate_test_result_answers_to_jsonb():
+        schema_version = 4
+        await set_schema_version(schema_version)
+    if schema_version == 4 and await deduplicate_active_test_access():
+        schema_version = 5
+        await set_schema_version(schema_version)
+    if schema_version == 5 and await backfill_question_stats():
+        schema_version = 6
+        await set_schema_version(schema_version)
+    if schema_version == 6 and await drop_redundant_test_result_columns():
+        schema_version = 7
+        await set_schema_version(schema_version)
     await migrate_new_tables()
     await update_existing_users_role_date()
     # Только диагностика дубликатов, НЕ автоматическая очистка
     await cleanup_all_duplicate_attestations_on_startup()
 
-async def create_initial_data():
+async def get_schema_version() -> int:
+    """Получение текущей версии схемы БД (0, если версия ещё не записана)"""
     async with async_session() as session:
-        result = await session.execute(select(func.count()).select_from(Role))
-        count = result.scalar()
-        if count == 0:
-            roles = [
-                Role(name="Рекрутер", description="Специалист по подбору и управлению персоналом"),
-                Role(name="Наставник", description="Прокачанный сотрудник, который ведет стажеров"),
-                Role(name="Стажер", description="Новый сотрудник на испытательном сроке"),
-                Role(name="Сотрудник", description="Постоянный работник компании после прохождения аттестации"),
-                Role(name="Руководитель", description="Руководитель для проведения аттестаций стажеров")
-            ]
-            session.add_all(roles)
-            
-            permissions = [
-                Permission(name="view_profile", description="Просмотр собственного профиля"),
-                Permission(name="edit_profile", description="Редактирование собственного профиля"),
-                Permission(name="view_trainee_list", description="Просмотр списка Стажеров"),
-                Permission(name="manage_trainees", description="Управление Стажерами"),
-                Permission(name="manage_users", description="Управление пользователями"),
-                Permission(name="manage_roles", description="Управление ролями"),
-                Permission(name="conduct_attestations", description="Проведение аттестаций стажеров"),
-                Permission(name="create_tests", description="Создание тестов"),
-                Permission(name="edit_tests", description="Редактирование тестов"),
-                Permission(name="take_tests", description="Прохождение тестов"),
-                Permission(name="view_test_results", description="Просмотр результатов тестов"),
-                Permission(name="assign_mentors", description="Назначение наставников"),
-                Permission(name="view_mentorship", description="Просмотр информации о наставничестве"),
-                Permission(name="grant_test_access", description="Предоставление доступа к тестам"),
-                Permission(name="manage_groups", description="Управление группами пользователей"),
-                Permission(name="manage_objects", description="Управление объектами"),
-                Permission(name="view_knowledge_base", description="Просмотр базы знаний")
-            ]
-            session.add_all(permissions)
-            
+        version = await session.scalar(select(SchemaVersion.version))
+        return version or 0
+
+
+async def set_schema_version(version: int):
+    """Запись версии схемы БД"""
+    async with async_session() as session:
+        try:
+            result = await session.execute(update(SchemaVersion).values(version=version))
+            if result.rowcount == 0:
+                session.add(SchemaVersion(version=version))
             await session.commit()
-            
-            roles_query = await session.execute(select(Role))
-            roles = roles_query.scalars().all()
-            
-            permissions_query = await session.execute(select(Permission))
-            permissions = permissions_query.scalars().all()
-            
+            logger.info(f"Версия схемы БД обновлена до {version}")
+        except Exception as e:
+            logger.error(f"Ошибка обновления версии схемы БД: {e}")
+            await session.rollback()
 
-            for role in roles:
-                if role.name != "Руководитель":
-                    for perm in permissions:
-                        if perm.name in ["view_profile", "edit_profile"]:
-                            stmt = insert(role_permissions).values(
-                                role_id=role.id,
-                                permission_id=perm.id
-                            )
-                            await session.execute(stmt)
-            
+
+async def migrate_user_links_cascade() -> bool:
+    """Перевод связей пользователя с ролями, группами и объектами на ON DELETE CASCADE"""
+    try:
+        async with engine.begin() as conn:
+            for table_name in ("user_roles", "user_groups", "user_objects"):
+                # Имена ограничений могли быть заданы вручную, поэтому ищем их в каталоге
+                result = await conn.execute(text("""
+                    SELECT c.conname FROM pg_constraint c
+                    JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = ANY (c.conkey)
+                    WHERE c.contype = 'f'
+                      AND c.conrelid = CAST(:table_name AS regclass)
+                      AND c.confrelid = CAST('users' AS regclass)
+                      AND a.attname = 'user_id'
+                """), {"table_name": table_name})
+                for constraint in result.scalars().all():
+                    await conn.execute(text(f'ALTER TABLE {table_name} DROP CONSTRAINT "{constraint}"'))
+                await conn.execute(text(f"""
+                    ALTER TABLE {table_name}
+                    ADD CONSTRAINT {table_name}_user_id_fkey FOREIGN KEY (user_id)
+                        REFERENCES users (id) ON DELETE CASCADE
+                """))
+        logger.info("Связи пользователей переведены на ON DELETE CASCADE")
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка миграции внешних ключей связей пользователей: {e}")
+        return False
+
+
+async def migrate_test_result_answers_to_jsonb() -> bool:
+    """Перевод test_results.answers из текста с JSON в JSONB"""
+    try:
+        async with engine.begin() as conn:
+            column_type = await conn.scalar(text("""
+                SELECT data_type FROM information_schema.columns
+                WHERE table_name = 'test_results' AND column_name = 'answers'
+            """))
+            # Столбец мог быть уже удалён следующей миграцией (новая БД)
+            if column_type not in (None, "jsonb"):
+                await conn.execute(text("""
+                    ALTER TABLE test_results
+                    ALTER COLUMN answers TYPE JSONB USING NULLIF(answers, '')::jsonb
+                """))
+        logger.info("Столбец test_results.answers переведён на JSONB")
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка миграции test_results.answers на JSONB: {e}")
+        return False
+
+
+async def deduplicate_active_test_access() -> bool:
+    """Деактивация дублей активного доступа к тесту перед созданием уникального индекса"""
+    try:
+        async with engine.begin() as conn:
+            result = await conn.execute(text("""
+                UPDATE trainee_test_access SET is_active = false
+                WHERE is_active AND id NOT IN (
+                    SELECT min(id) FROM trainee_test_access
+                    WHERE is_active
+                    GROUP BY trainee_id, test_id
+                )
+            """))
+        if result.rowcount:
+            logger.info(f"Деактивировано дублирующихся доступов к тестам: {result.rowcount}")
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка удаления дублей доступа к тестам: {e}")
+        return False
+
+
+async def backfill_question_stats() -> bool:
+    """Первичное заполнение question_stats по уже сохранённым результатам тестов"""
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(text("DELETE FROM question_stats"))
+            result = await conn.execute(text("""
+                INSERT INTO question_stats (question_id, total, correct, total_time)
+                SELECT q.id,
+                       COUNT(*),
+                       COUNT(*) FILTER (WHERE ad -> 'is_correct' = 'true'::jsonb),
+                       COALESCE(SUM((ad ->> 'time_spent')::float), 0)
+                FROM test_results tr
+                CROSS JOIN LATERAL jsonb_array_elements(tr.answers_details) AS ad
+                JOIN test_questions q ON q.id = (ad ->> 'question_id')::int
+                GROUP BY q.id
+            """))
+        logger.info(f"Статистика заполнена для {result.rowcount} вопросов")
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка заполнения статистики вопросов: {e}")
+        return False
+
+async def drop_redundant_test_result_columns() -> bool:
+    """Удаление test_results.answers и wrong_answers: данные есть в answers_details"""
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(text("""
+                ALTER TABLE test_results
+                DROP COLUMN IF EXISTS answers,
+                DROP COLUMN IF EXISTS wrong_answers
+            """))
+        logger.info("Удалены избыточные столбцы test_results.answers и wrong_answers")
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка удаления избыточных столбцов test_results: {e}")
+        return False
+
+async def create_initial_data():
+    """Заполнение справочников ролей, прав и этапов стажировки
+    
+    Справочники заполняются только в пустой БД: роли и права, удаленные
+    администратором, не должны появляться снова при каждом запуске бота.
+    Вставки выполняются с ON CONFLICT DO NOTHING, чтобы одновременный запуск
+    нескольких экземпляров не падал на уникальном name.
+    """
+    async with async_session() as session:
+        roles_exist = await session.scalar(select(select(Role.id).exists()))
+        if roles_exist:
+            return
+        
+        role_rows = [
+            {"name": "Рекрутер", "description": "Специалист по подбору и управлению персоналом"},
+            {"name": "Наставник", "description": "Прокачанный сотрудник, который ведет стажеров"},
+            {"name": "Стажер", "description": "Новый сотрудник на испытательном сроке"},
+            {"name": "Сотрудник", "description": "Постоянный работник компании после прохождения аттестации"},
+            {"name": "Руководитель", "description": "Руководитель для проведения аттестаций стажеров"}
+        ]
+        
+        permission_rows = [
+            {"name": "view_profile", "description": "Просмотр собственного профиля"},
+            {"name": "edit_profile", "description": "Редактирование собственного профиля"},
+            {"name": "view_trainee_list", "description": "Просмотр списка Стажеров"},
+            {"name": "manage_trainees", "description": "Управление Стажерами"},
+            {"name": "manage_users", "description": "Управление пользователями"},
+            {"name": "manage_roles", "description": "Управление ролями"},
+            {"name": "conduct_attestations", "description": "Проведение аттестаций стажеров"},
+            {"name": "create_tests", "description": "Создание тестов"},
+            {"name": "edit_tests", "description": "Редактирование тестов"},
+            {"name": "take_tests", "description": "Прохождение тестов"},
+            {"name": "view_test_results", "description": "Просмотр результатов тестов"},
+            {"name": "assign_mentors", "description": "Назначение наставников"},
+            {"name": "view_mentorship", "description": "Просмотр информации о наставничестве"},
+            {"name": "grant_test_access", "description": "Предоставление доступа к тестам"},
+            {"name": "manage_groups", "description": "Управление группами пользователей"},
+            {"name": "manage_objects", "description": "Управление объектами"},
+            {"name": "view_knowledge_base", "description": "Просмотр базы знаний"}
+        ]
+        
+        await session.execute(
+            pg_insert(Permission).values(permission_rows).on_conflict_do_nothing(index_elements=["name"])
+        )
+        
+        result = await session.execute(
+            pg_insert(Role).values(role_rows)
+            .on_conflict_do_nothing(index_elements=["name"])
+            .returning(Role.id, Role.name)
+        )
+        role_by_name = {name: role_id for role_id, name in result.all()}
+        
+        if not role_by_name:
+            await session.commit()
+            return
+        
+        permissions_query = await session.execute(select(Permission.name, Permission.id))
+        perm_by_name = dict(permissions_query.all())
+        
+        # Базовые права профиля есть у всех ролей
+        base_perms = ["view_profile", "edit_profile"]
+        role_perms = {
             # Рекрутер (1) - создает траектории, тесты, управляет пользователями
-            for role in roles:
-                if role.name == "Рекрутер":
-                    for perm in permissions:
-                        if perm.name in ["view_trainee_list", "manage_trainees", "assign_mentors", "view_mentorship", "create_tests", "edit_tests", "take_tests", "view_test_results", "manage_groups", "manage_objects"]:
-                            stmt = insert(role_permissions).values(
-                                role_id=role.id,
-                                permission_id=perm.id
-                            )
-                            await session.execute(stmt)
-            
+            "Рекрутер": base_perms + ["view_trainee_list", "manage_trainees", "assign_mentors", "view_mentorship", "create_tests", "edit_tests", "take_tests", "view_test_results", "manage_groups", "manage_objects"],
             # Наставник (2) - ведет стажеров, открывает этапы, предоставляет доступ к тестам, проходит тесты от рекрутера
-            for role in roles:
-                if role.name == "Наставник":
-                    for perm in permissions:
-                        if perm.name in ["take_tests", "view_test_results", "grant_test_access", "view_mentorship", "view_knowledge_base"]:
-                            stmt = insert(role_permissions).values(
-                                role_id=role.id,
-                                permission_id=perm.id
-                            )
-                            await session.execute(stmt)
-            
+            "Наставник": base_perms + ["take_tests", "view_test_results", "grant_test_access", "view_mentorship", "view_knowledge_base"],
             # Стажер (3) - проходит тесты, смотрит результаты, общается с наставником, просматривает базу знаний
-            for role in roles:
-                if role.name == "Стажер":
-                    for perm in permissions:
-                        if perm.name in ["take_tests", "view_test_results", "view_mentorship", "view_knowledge_base"]:
-                            stmt = insert(role_permissions).values(
-                                role_id=role.id,
-                                permission_id=perm.id
-                            )
-                            await session.execute(stmt)
-            
+            "Стажер": base_perms + ["take_tests", "view_test_results", "view_mentorship", "view_knowledge_base"],
             # Сотрудник (4) - прошедший аттестацию стажер, может проходить назначенные тесты, просматривать базу знаний
-            for role in roles:
-                if role.name == "Сотрудник":
-                    for perm in permissions:
-                        if perm.name in ["take_tests", "view_test_results", "view_knowledge_base"]:
-                            stmt = insert(role_permissions).values(
-                                role_id=role.id,
-                                permission_id=perm.id
-                            )
-                            await session.execute(stmt)
-            
+            "Сотрудник": base_perms + ["take_tests", "view_test_results", "view_knowledge_base"],
             # Руководитель (5) - проводит аттестации, может проходить тесты
-            for role in roles:
-                if role.name == "Руководитель":
-                    for perm in permissions:
-                        if perm.name in ["view_profile", "edit_profile", "conduct_attestations", "take_tests", "view_test_results", "view_knowledge_base"]:
-                            stmt = insert(role_permissions).values(
-                                role_id=role.id,
-                                permission_id=perm.id
-                            )
-                            await session.execute(stmt)
-            
-            # Создание базовых этапов стажировки
-            stages = [
-                InternshipStage(name="Введение", description="Ознакомление с компанией", order_number=1),
-                InternshipStage(name="Базовые навыки", description="Изучение основных процессов", order_number=2),
-                InternshipStage(name="Практическое применение", description="Работа с реальными задачами", order_number=3),
-                InternshipStage(name="Аттестация", description="Финальная проверка знаний", order_number=4)
-            ]
-            session.add_all(stages)
-            
-            await session.commit()
-            logger.info("Начальные данные успешно созданы")
+            "Руководитель": base_perms + ["conduct_attestations", "take_tests", "view_test_results", "view_knowledge_base"],
+        }
+        
+        # Собираем связи роль-право для новых ролей и вставляем их одним executemany
+        role_perm_rows = [
+            {"role_id": role_by_name[role_name], "permission_id": perm_by_name[perm_name]}
+            for role_name, perm_names in role_perms.items() if role_name in role_by_name
+            for perm_name in perm_names
+        ]
+        
+        await session.execute(
+            pg_insert(role_permissions).on_conflict_do_nothing(),
+            role_perm_rows
+        )
+        
+        # Базовые этапы стажировки создаются только при первичной инициализации БД
+        if len(role_by_name) == len(role_rows):
+            await session.execute(insert(InternshipStage), [
+                {"name": "Введение", "description": "Ознакомление с компанией", "order_number": 1},
+                {"name": "Базовые навыки", "description": "Изучение основных процессов", "order_number": 2},
+                {"name": "Практическое применение", "description": "Работа с реальными задачами", "order_number": 3},
+                {"name": "Аттестация", "description": "Финальная проверка знаний", "order_number": 4}
+            ])
+        
+        await session.commit()
+        logger.info("Начальные данные успешно созданы")
 
 
 async def migrate_employee_to_mentor_roles():
@@ -302,55 +712,59 @@ async def update_existing_users_role_date():
             await session.rollback()
 
 
-async def update_role_permissions_for_existing_db():
+async def update_role_permissions_for_existing_db() -> bool:
     """Обновление прав ролей для существующих баз данных"""
     async with async_session() as session:
         try:
             logger.info("Обновление прав доступа для ролей...")
             
             # Получаем роль Сотрудник
-            employee_role = await get_role_by_name(session, "Сотрудник")
-            if employee_role:
-                # Удаляем права create_tests и edit_tests у Сотрудника
-                await remove_permission_from_role(session, employee_role.id, "create_tests")
-                await remove_permission_from_role(session, employee_role.id, "edit_tests")
+            employee_role_id = await get_role_id(session, "Сотрудник")
+            if employee_role_id is not None:
+                # Удаляем права create_tests и edit_tests у Сотрудника одним запросом
+                await session.execute(
+                    delete(role_permissions).where(
+                        role_permissions.c.role_id == employee_role_id,
+                        role_permissions.c.permission_id.in_(
+                            select(Permission.id).where(Permission.name.in_(["create_tests", "edit_tests"]))
+                        )
+                    )
+                )
+                await session.commit()
                 logger.info("Удалены права create_tests и edit_tests у роли Сотрудник")
             
             logger.info("Обновление прав доступа завершено")
+            return True
         except Exception as e:
             logger.error(f"Ошибка обновления прав доступа: {e}")
+            await session.rollback()
+            return False
 
 
+@request_scoped_cache("get_user_by_tg_id")
 async def get_user_by_tg_id(session: AsyncSession, tg_id: int) -> Optional[User]:
-    try:
-        result = await session.execute(
-            select(User)
-            .options(
-                selectinload(User.work_object),  # Загружаем объект работы
-                selectinload(User.internship_object),  # Загружаем объект стажировки
-                selectinload(User.roles),  # Загружаем роли пользователя
-                selectinload(User.groups)  # Загружаем группы пользователя
-            )
-            .where(User.tg_id == tg_id)
-        )
-        return result.scalar_one_or_none()
-    except Exception as e:
-        logger.error(f"Ошибка получения пользователя по tg_id {tg_id}: {e}")
-        return None
+    return await session.scalar(
+        select(User)
+        .options(
+            selectinload(User.work_object),  # Загружаем объект работы
+            selectinload(User.internship_object),  # Загружаем объект стажировки
+            selectinload(User.roles),  # Загружаем роли пользователя
+            selectinload(User.groups)  # Загружаем группы пользователя
+        )
+        .where(User.tg_id == tg_id)
+    )
 
 
 async def check_phone_exists(session: AsyncSession, phone_number: str) -> bool:
-    result = await session.execute(
-        select(func.count()).select_from(User).where(User.phone_number == phone_number)
+    return await session.scalar(
+        select(exists().where(User.phone_number == phone_number))
     )
-    count = result.scalar()
-    return count > 0
 
 
 async def get_user_by_phone(session: AsyncSession, phone_number: str) -> Optional[User]:
     """Получение пользователя по номеру телефона с загрузкой связанных объектов"""
     try:
-        result = await session.execute(
+        return await session.scalar(
             select(User)
             .options(
                 selectinload(User.work_object),  # Загружаем объект работы
@@ -360,7 +774,6 @@ async def get_user_by_phone(session: AsyncSession, phone_number: str) -> Optiona
             )
             .where(User.phone_number == phone_number)
         )
-        return result.scalar_one_or_none()
     except Exception as e:
         logger.error(f"Ошибка получения пользователя по телефону {phone_number}: {e}")
         return None
@@ -368,31 +781,31 @@ async def get_user_by_phone(session: AsyncSession, phone_number: str) -> Optiona
 
 async def create_user(session: AsyncSession, user_data: dict, role_name: str, bot=None) -> User:
     try:
-        user = User(
-            tg_id=user_data['tg_id'],
-            username=user_data.get('username'),
-            full_name=user_data['full_name'],
-            phone_number=user_data['phone_number']
+        # INSERT ... RETURNING сразу возвращает пользователя с ID без отдельного flush
+        user = await session.scalar(
+            insert(User).values(
+                tg_id=user_data['tg_id'],
+                username=user_data.get('username'),
+                full_name=user_data['full_name'],
+                phone_number=user_data['phone_number']
+            ).returning(User)
         )
-        session.add(user)
-        await session.flush()
         
-        role_result = await session.execute(
-            select(Role).where(Role.name == role_name)
-        )
-        role = role_result.scalar_one()
+        role_id = await get_role_id(session, role_name)
+        if role_id is None:
+            raise ValueError(f"Роль {role_name} не найдена")
 
         stmt = insert(user_roles).values(
             user_id=user.id,
-            role_id=role.id
+            role_id=role_id
         )
         await session.execute(stmt)
         
         await session.commit()
         
-        # Отправляем уведомления рекрутерам если создан новый стажёр
+        # Уведомляем рекрутеров в фоне: регистрация не ждёт ответа Telegram
         if role_name == "Стажер" and bot:
-            await send_notification_about_new_trainee_registration(session, bot, user.id)
+            enqueue_notification(_notify_new_trainee_registration, bot, user.id)
         
         return user
     except Exception as e:
@@ -412,12 +825,11 @@ async def create_user_without_role(session: AsyncSession, user_data: dict, bot=N
             is_activated=False  # Пользователь неактивирован до обработки рекрутером
         )
         session.add(user)
-        await session.flush()
         await session.commit()
         
-        # Отправляем уведомления рекрутерам о новом пользователе
+        # Уведомляем рекрутеров в фоне: регистрация не ждёт ответа Telegram
         if bot:
-            await send_notification_about_new_user_registration(session, bot, user.id)
+            enqueue_notification(send_notification_about_new_user_registration, bot, user.id)
         
         logger.info(f"Пользователь {user.id} создан без роли для последующей активации")
         return user
@@ -427,23 +839,37 @@ async def create_user_without_role(session: AsyncSession, user_data: dict, bot=N
         raise
 
 
+async def get_user_permissions(session: AsyncSession, user_id: int) -> Set[str]:
+    """Получение названий всех прав пользователя одним запросом
+    
+    Результат кэшируется в сессии до конца текущей транзакции, поэтому повторные
+    проверки прав в рамках одного обновления не обращаются к БД.
+    """
+    cache = session.info.setdefault("user_permissions", {})
+    if user_id not in cache:
+        stmt = select(Permission.name).join(
+            role_permissions, Permission.id == role_permissions.c.permission_id
+        ).join(
+            user_roles, role_permissions.c.role_id == user_roles.c.role_id
+        ).where(
+            user_roles.c.user_id == user_id
+        )
+        result = await session.execute(stmt)
+        cache[user_id] = set(result.scalars().all())
+    return cache[user_id]
+
+
 async def check_user_permission(session: AsyncSession, user_id: int, permission_name: str) -> bool:
-    stmt = select(func.count()).select_from(User).join(
-        user_roles, User.id == user_roles.c.user_id
-    ).join(
-        role_permissions, user_roles.c.role_id == role_permissions.c.role_id
-    ).join(
-        Permission, role_permissions.c.permission_id == Permission.id
-    ).where(
-        User.id == user_id,
-        Permission.name == permission_name
-    )
+    """Проверка наличия права у пользователя
     
-    result = await session.execute(stmt)
-    count = result.scalar()
-    return count > 0
+    Права загружаются одним запросом в транзакции сессии и кэшируются в
+    session.info до её завершения (см. get_user_permissions).
+    """
+    permissions = await get_user_permissions(session, user_id)
+    return permission_name in permissions
 
 
+@request_scoped_cache("get_user_roles")
 async def get_user_roles(session: AsyncSession, user_id: int) -> List[Role]:
     try:
         stmt = select(Role).join(
@@ -461,27 +887,23 @@ async def get_user_roles(session: AsyncSession, user_id: int) -> List[Role]:
 
 async def add_user_role(session: AsyncSession, user_id: int, role_name: str) -> bool:
     try:
-        role_result = await session.execute(
-            select(Role).where(Role.name == role_name)
-        )
-        role = role_result.scalar_one_or_none()
+        role_id = await get_role_id(session, role_name)
         
-        if not role:
+        if role_id is None:
             return False
         
-        check_stmt = select(func.count()).select_from(user_roles).where(
+        check_stmt = select(exists().where(
             user_roles.c.user_id == user_id,
-            user_roles.c.role_id == role.id
-        )
+            user_roles.c.role_id == role_id
+        ))
         check_result = await session.execute(check_stmt)
         
-        has_role = check_result.scalar()
-        if has_role > 0:
+        if check_result.scalar():
             return True
         
         stmt = insert(user_roles).values(
             user_id=user_id,
-            role_id=role.id
+            role_id=role_id
         )
         await session.execute(stmt)
         
@@ -495,17 +917,14 @@ async def add_user_role(session: AsyncSession, user_id: int, role_name: str) ->
 
 async def remove_user_role(session: AsyncSession, user_id: int, role_name: str) -> bool:
     try:
-        role_result = await session.execute(
-            select(Role).where(Role.name == role_name)
-        )
-        role = role_result.scalar_one_or_none()
+        role_id = await get_role_id(session, role_name)
         
-        if not role:
+        if role_id is None:
             return False
         
         stmt = delete(user_roles).where(
             user_roles.c.user_id == user_id,
-            user_roles.c.role_id == role.id
+            user_roles.c.role_id == role_id
         )
         await session.execute(stmt)
         
@@ -520,58 +939,214 @@ async def remove_user_role(session: AsyncSession, user_id: int, role_name: str)
 async def get_all_users(session: AsyncSession) -> List[User]:
     """ Получение списка всех пользователей"""
 
-    try:
-        result = await session.execute(select(User).order_by(User.registration_date.desc()))
-        return result.scalars().all()
-    except Exception as e:
-        logger.error(f"Ошибка получения всех пользователей: {e}")
-        return []
+    result = await session.execute(select(User).order_by(User.registration_date.desc()))
+    return result.scalars().all()
 
 
 async def get_all_trainees(session: AsyncSession) -> List[User]:
     """Получение списка всех активированных стажеров"""
 
-    try:
-        stmt = select(User).join(
+    stmt = select(User).join(
+        user_roles, User.id == user_roles.c.user_id
+    ).join(
+        Role, user_roles.c.role_id == Role.id
+    ).where(
+        Role.name == "Стажер",
+        User.is_activated == True  # Только активированные стажеры
+    ).order_by(User.registration_date.desc())
+    
+    result = await session.execute(stmt)
+    return result.scalars().all()
+
+
+async def get_all_trainees_lite(session: AsyncSession) -> list:
+    """Получение списка активированных стажеров без загрузки ORM-объектов
+    
+    Возвращает строки только с полями, нужными для списков и клавиатур
+    (id, full_name, username, phone_number, tg_id).
+    """
+    result = await session.execute(
+        select(
+            User.id, User.full_name, User.username, User.phone_number, User.tg_id
+        ).join(
             user_roles, User.id == user_roles.c.user_id
         ).join(
             Role, user_roles.c.role_id == Role.id
         ).where(
             Role.name == "Стажер",
-            User.is_activated == True  # Только активированные стажеры
+            User.is_activated == True
         ).order_by(User.registration_date.desc())
-        
-        result = await session.execute(stmt)
-        return result.scalars().all()
-    except Exception as e:
-        logger.error(f"Ошибка получения всех стажёров: {e}")
-        return []
+    )
+    return result.all()
 
 
 async def get_user_by_id(session: AsyncSession, user_id: int) -> Optional[User]:
     """Получение пользователя по его ID с загрузкой связанных объектов"""
 
-    try:
-        result = await session.execute(
-            select(User)
-            .options(
-                selectinload(User.work_object),  # Загружаем объект работы
-                selectinload(User.internship_object),  # Загружаем объект стажировки
-                selectinload(User.roles),  # Загружаем роли пользователя
-                selectinload(User.groups)  # Загружаем группы пользователя
-            )
-            .where(User.id == user_id)
+    return await session.scalar(
+        select(User)
+        .options(
+            selectinload(User.work_object),  # Загружаем объект работы
+            selectinload(User.internship_object),  # Загружаем объект стажировки
+            selectinload(User.roles),  # Загружаем роли пользователя
+            selectinload(User.groups)  # Загружаем группы пользователя
         )
-        return result.scalar_one_or_none()
-    except Exception as e:
-        logger.error(f"Ошибка получения пользователя по ID {user_id}: {e}")
-        return None
+        .where(User.id == user_id)
+    )
 
 
-async def update_user_profile(session: AsyncSession, user_id: int, update_data: dict) -> bool:
-    """Обновление профиля пользователя"""
+async def get_users_by_ids(session: AsyncSession, user_ids) -> dict:
+    """Получение нескольких пользователей одним запросом: {id: User}
+    
+    Связанные объекты загружаются так же, как в get_user_by_id.
+    """
+    result = await session.execute(
+        select(User)
+        .options(
+            selectinload(User.work_object),
+            selectinload(User.internship_object),
+            selectinload(User.roles),
+            selectinload(User.groups)
+        )
+        .where(User.id.in_(set(user_ids)))
+    )
+    return {user.id: user for user in result.scalars()}
 
-    try:
+
+# Кэш пользователей для уведомлений: одни и те же наставники и рекрутеры
+# запрашиваются при каждом событии. Объекты из кэша только читаются и не
+# добавляются в сессии; кэш сбрасывается после коммита любой записи в users,
+# user_roles, role_permissions, user_groups, user_objects, groups или objects.
+USER_CACHE_TTL = 300
+ROLE_USERS_CACHE_TTL = 60
+AUTH_CACHE_TTL = 60
+_user_cache: dict = {}
+_role_users_cache: dict = {}
+_auth_cache: dict = {}
+_user_list_cache: dict = {}
+_user_cache_stats = {"hit": 0, "miss": 0}
+
+
+def invalidate_user_cache(users_changed: bool = True):
+    """Сброс кэша пользователей для уведомлений и проверок доступа
+    
+    users_changed=False - изменились только роли или права: список
+    пользователей (id, ФИО, username) остаётся в кэше.
+    """
+    _user_cache.clear()
+    _role_users_cache.clear()
+    _auth_cache.clear()
+    if users_changed:
+        _user_list_cache.clear()
+
+
+async def get_cached_users_by_ids(session: AsyncSession, user_ids) -> dict:
+    """get_users_by_ids с кэшированием на USER_CACHE_TTL секунд"""
+    now = time.monotonic()
+    users = {}
+    missing = set()
+    for user_id in set(user_ids):
+        cached = _user_cache.get(user_id)
+        if cached and cached[0] > now:
+            users[user_id] = cached[1]
+        else:
+            missing.add(user_id)
+    _user_cache_stats["hit"] += len(users)
+    _user_cache_stats["miss"] += len(missing)
+    if missing:
+        loaded = await get_users_by_ids(session, missing)
+        for user_id, user in loaded.items():
+            _user_cache[user_id] = (now + USER_CACHE_TTL, user)
+        users.update(loaded)
+    logger.debug("CACHE_HIT users: %(hit)d попаданий, %(miss)d промахов", _user_cache_stats)
+    return users
+
+
+async def get_cached_user_list(session: AsyncSession) -> tuple:
+    """Строки (id, full_name, username) всех пользователей для списка выбора
+    
+    Порядок как в get_all_users. Результат кэшируется на ROLE_USERS_CACHE_TTL
+    секунд и сбрасывается при любой записи в users; кортеж строк хешируется,
+    поэтому по нему же кэшируется готовая клавиатура.
+    """
+    now = time.monotonic()
+    cached = _user_list_cache.get("all")
+    if cached and cached[0] > now:
+        return cached[1]
+    result = await session.execute(
+        select(User.id, User.full_name, User.username).order_by(User.registration_date.desc())
+    )
+    users = tuple(result.all())
+    _user_list_cache["all"] = (now + ROLE_USERS_CACHE_TTL, users)
+    return users
+
+
+_STMT_USER_AUTH = (
+    select(User.id, User.is_active, Role.name.label("role_name"), Permission.name.label("permission_name"))
+    .select_from(User)
+    .outerjoin(user_roles, user_roles.c.user_id == User.id)
+    .outerjoin(Role, Role.id == user_roles.c.role_id)
+    .outerjoin(role_permissions, role_permissions.c.role_id == Role.id)
+    .outerjoin(Permission, Permission.id == role_permissions.c.permission_id)
+    .where(User.tg_id == bindparam("tg_id"))
+    .order_by(user_roles.c.role_id)
+)
+
+
+async def get_cached_user_auth(session: AsyncSession, tg_id: int) -> Optional[dict]:
+    """Данные для проверки доступа по Telegram ID с кэшированием на AUTH_CACHE_TTL секунд
+    
+    Возвращает словарь с user_id, is_active, roles (названия ролей) и permissions
+    (названия прав всех ролей) или None, если пользователь не зарегистрирован.
+    Пользователь, роли и права читаются одним SQL-запросом с внешними
+    соединениями: по строке на пару (роль, право), без загрузки ORM-объектов.
+    """
+    now = time.monotonic()
+    cached = _auth_cache.get(tg_id)
+    if cached and cached[0] > now:
+        return cached[1]
+    result = await session.execute(_STMT_USER_AUTH, {"tg_id": tg_id})
+    rows = result.all()
+    if not rows:
+        return None
+    # dict сохраняет порядок ролей и убирает повторы из-за соединения с правами
+    roles = dict.fromkeys(row.role_name for row in rows if row.role_name is not None)
+    auth = {
+        "user_id": rows[0].id,
+        "is_active": rows[0].is_active,
+        "roles": list(roles),
+        "permissions": frozenset(row.permission_name for row in rows if row.permission_name is not None),
+    }
+    _auth_cache[tg_id] = (now + AUTH_CACHE_TTL, auth)
+    return auth
+
+
+async def get_tg_ids_by_role(session: AsyncSession, role_name: str) -> List[int]:
+    """Telegram ID активных пользователей с указанной ролью (без загрузки ORM-объектов)"""
+    result = await session.execute(
+        select(User.tg_id)
+        .join(user_roles, User.id == user_roles.c.user_id)
+        .join(Role, user_roles.c.role_id == Role.id)
+        .where(Role.name == role_name, User.is_active == True)
+    )
+    return result.scalars().all()
+
+
+async def get_cached_tg_ids_by_role(session: AsyncSession, role_name: str) -> List[int]:
+    """get_tg_ids_by_role с кэшированием на ROLE_USERS_CACHE_TTL секунд"""
+    now = time.monotonic()
+    cached = _role_users_cache.get(role_name)
+    if cached and cached[0] > now:
+        return cached[1]
+    tg_ids = await get_tg_ids_by_role(session, role_name)
+    _role_users_cache[role_name] = (now + ROLE_USERS_CACHE_TTL, tg_ids)
+    return tg_ids
+
+
+async def update_user_profile(session: AsyncSession, user_id: int, update_data: dict) -> bool:
+    """Обновление профиля пользователя"""
+
+    try:
         stmt = update(User).where(User.id == user_id)
         
         valid_fields = ['full_name', 'phone_number', 'username', 'is_active']
@@ -592,20 +1167,16 @@ async def update_user_profile(session: AsyncSession, user_id: int, update_data:
 
 async def get_users_by_role(session: AsyncSession, role_name: str) -> List[User]:
     """Получение всех пользователей с указанной ролью """
-    try:
-        stmt = select(User).join(
-            user_roles, User.id == user_roles.c.user_id
-        ).join(
-            Role, user_roles.c.role_id == Role.id
-        ).where(
-            Role.name == role_name
-        ).order_by(User.full_name)
-        
-        result = await session.execute(stmt)
-        return result.scalars().all()
-    except Exception as e:
-        logger.error(f"Ошибка получения пользователей с ролью {role_name}: {e}")
-        return []
+    stmt = select(User).join(
+        user_roles, User.id == user_roles.c.user_id
+    ).join(
+        Role, user_roles.c.role_id == Role.id
+    ).where(
+        Role.name == role_name
+    ).order_by(User.full_name)
+    
+    result = await session.execute(stmt)
+    return result.scalars().all()
 
 # ========== ФУНКЦИИ ДЛЯ АКТИВАЦИИ ПОЛЬЗОВАТЕЛЕЙ ==========
 
@@ -638,16 +1209,13 @@ async def activate_user(session: AsyncSession, user_id: int, role_name: str,
             return False
         
         # Назначаем роль
-        role_result = await session.execute(
-            select(Role).where(Role.name == role_name)
-        )
-        role = role_result.scalar_one_or_none()
-        if not role:
+        role_id = await get_role_id(session, role_name)
+        if role_id is None:
             logger.error(f"Роль {role_name} не найдена")
             return False
         
         # Добавляем роль пользователю
-        stmt = insert(user_roles).values(user_id=user.id, role_id=role.id)
+        stmt = insert(user_roles).values(user_id=user.id, role_id=role_id)
         await session.execute(stmt)
         
         # Добавляем в группу
@@ -683,7 +1251,7 @@ async def activate_user(session: AsyncSession, user_id: int, role_name: str,
 async def get_user_with_details(session: AsyncSession, user_id: int) -> Optional[User]:
     """Получение пользователя с загрузкой всех связанных данных"""
     try:
-        result = await session.execute(
+        return await session.scalar(
             select(User)
             .options(
                 selectinload(User.roles),
@@ -693,7 +1261,6 @@ async def get_user_with_details(session: AsyncSession, user_id: int) -> Optional
             )
             .where(User.id == user_id)
         )
-        return result.scalar_one_or_none()
     except Exception as e:
         logger.error(f"Ошибка получения пользователя с деталями {user_id}: {e}")
         return None
@@ -702,67 +1269,51 @@ async def get_user_with_details(session: AsyncSession, user_id: int) -> Optional
 async def get_all_roles(session: AsyncSession) -> List[Role]:
     """Получение списка всех ролей"""
 
-    try:
-        result = await session.execute(select(Role).order_by(Role.name))
-        return result.scalars().all()
-    except Exception as e:
-        logger.error(f"Ошибка получения всех ролей: {e}")
-        return []
+    result = await session.execute(select(Role).order_by(Role.name))
+    return result.scalars().all()
 
 
 async def get_all_permissions(session: AsyncSession) -> List[Permission]:
     """Получение списка всех прав доступа """
 
-    try:
-        result = await session.execute(select(Permission).order_by(Permission.name))
-        return result.scalars().all()
-    except Exception as e:
-        logger.error(f"Ошибка получения всех прав: {e}")
-        return []
+    result = await session.execute(select(Permission).order_by(Permission.name))
+    return result.scalars().all()
 
 async def get_role_permissions(session: AsyncSession, role_id: int) -> List[Permission]:
     """Получение всех прав для указанной роли"""
 
-    try:
-        stmt = select(Permission).join(
-            role_permissions, Permission.id == role_permissions.c.permission_id
-        ).where(
-            role_permissions.c.role_id == role_id
-        ).order_by(Permission.name)
-        
-        result = await session.execute(stmt)
-        return result.scalars().all()
-    except Exception as e:
-        logger.error(f"Ошибка получения прав для роли {role_id}: {e}")
-        return []
+    stmt = select(Permission).join(
+        role_permissions, Permission.id == role_permissions.c.permission_id
+    ).where(
+        role_permissions.c.role_id == role_id
+    ).order_by(Permission.name)
+    
+    result = await session.execute(stmt)
+    return result.scalars().all()
 
 async def add_permission_to_role(session: AsyncSession, role_id: int, permission_name: str) -> bool:
     """Добавление права роли"""
 
     try:
-        perm_result = await session.execute(
-            select(Permission).where(Permission.name == permission_name)
-        )
-        permission = perm_result.scalar_one_or_none()
+        permission_id = await get_permission_id(session, permission_name)
         
-        if not permission:
+        if permission_id is None:
             logger.error(f"Право {permission_name} не найдено")
             return False
         
-        check_stmt = select(func.count()).select_from(role_permissions).where(
+        check_stmt = select(exists().where(
             role_permissions.c.role_id == role_id,
-            role_permissions.c.permission_id == permission.id
-        )
+            role_permissions.c.permission_id == permission_id
+        ))
         check_result = await session.execute(check_stmt)
         
-        has_permission = check_result.scalar()
-        if has_permission > 0:
+        if check_result.scalar():
             logger.info(f"Роль {role_id} уже имеет право {permission_name}")
             return True
         
         stmt = insert(role_permissions).values(
             role_id=role_id,
-            permission_id=permission.id
+            permission_id=permission_id
         )
         await session.execute(stmt)
         
@@ -778,18 +1329,15 @@ async def remove_permission_from_role(session: AsyncSession, role_id: int, permi
     """Удаление права у роли"""
 
     try:
-        perm_result = await session.execute(
-            select(Permission).where(Permission.name == permission_name)
-        )
-        permission = perm_result.scalar_one_or_none()
+        permission_id = await get_permission_id(session, permission_name)
         
-        if not permission:
+        if permission_id is None:
             logger.error(f"Право {permission_name} не найдено")
             return False
         
         stmt = delete(role_permissions).where(
             role_permissions.c.role_id == role_id,
-            role_permissions.c.permission_id == permission.id
+            role_permissions.c.permission_id == permission_id
         )
         await session.execute(stmt)
         
@@ -804,11 +1352,10 @@ async def remove_permission_from_role(session: AsyncSession, role_id: int, permi
 async def create_new_permission(session: AsyncSession, name: str, description: str) -> Optional[Permission]:
     """Создание нового права доступа"""
     try:
-        check_stmt = select(func.count()).select_from(Permission).where(Permission.name == name)
+        check_stmt = select(exists().where(Permission.name == name))
         check_result = await session.execute(check_stmt)
         
-        exists = check_result.scalar()
-        if exists > 0:
+        if check_result.scalar():
             logger.error(f"Право с именем {name} уже существует")
             return None
         
@@ -818,6 +1365,7 @@ async def create_new_permission(session: AsyncSession, name: str, description: s
         )
         session.add(permission)
         await session.commit()
+        invalidate_role_permission_cache()
         
         logger.info(f"Создано новое право: {name}")
         return permission
@@ -829,22 +1377,44 @@ async def create_new_permission(session: AsyncSession, name: str, description: s
 async def get_role_by_name(session: AsyncSession, role_name: str) -> Optional[Role]:
     """Получение роли по имени"""
 
-    try:
-        result = await session.execute(select(Role).where(Role.name == role_name))
-        return result.scalar_one_or_none()
-    except Exception as e:
-        logger.error(f"Ошибка получения роли по имени {role_name}: {e}")
-        return None
+    return await session.scalar(select(Role).where(Role.name == role_name))
 
 async def get_permission_by_name(session: AsyncSession, permission_name: str) -> Optional[Permission]:
     """Получение права по имени"""
 
-    try:
-        result = await session.execute(select(Permission).where(Permission.name == permission_name))
-        return result.scalar_one_or_none()
-    except Exception as e:
-        logger.error(f"Ошибка получения права по имени {permission_name}: {e}")
-        return None
+    return await session.scalar(select(Permission).where(Permission.name == permission_name))
+
+
+# Справочники ролей и прав почти не меняются, поэтому соответствие имя -> ID
+# кэшируется на уровне процесса и не запрашивается при каждой операции
+_role_id_cache: dict = {}
+_permission_id_cache: dict = {}
+
+
+def invalidate_role_permission_cache():
+    """Сброс кэша ID ролей и прав (вызывается при изменении справочников)"""
+    _role_id_cache.clear()
+    _permission_id_cache.clear()
+
+
+async def get_role_id(session: AsyncSession, role_name: str) -> Optional[int]:
+    """Получение ID роли по имени с кэшированием"""
+    role_id = _role_id_cache.get(role_name)
+    if role_id is None:
+        role_id = await session.scalar(select(Role.id).where(Role.name == role_name))
+        if role_id is not None:
+            _role_id_cache[role_name] = role_id
+    return role_id
+
+
+async def get_permission_id(session: AsyncSession, permission_name: str) -> Optional[int]:
+    """Получение ID права по имени с кэшированием"""
+    permission_id = _permission_id_cache.get(permission_name)
+    if permission_id is None:
+        permission_id = await session.scalar(select(Permission.id).where(Permission.name == permission_name))
+        if permission_id is not None:
+            _permission_id_cache[permission_name] = permission_id
+    return permission_id
 
 
 # =================================
@@ -893,8 +1463,7 @@ async def get_all_groups(session: AsyncSession) -> List[Group]:
 async def get_group_by_id(session: AsyncSession, group_id: int) -> Optional[Group]:
     """Получение группы по ID"""
     try:
-        result = await session.execute(select(Group).where(Group.id == group_id))
-        return result.scalar_one_or_none()
+        return await session.scalar(select(Group).where(Group.id == group_id))
     except Exception as e:
         logger.error(f"Ошибка получения группы по ID {group_id}: {e}")
         return None
@@ -998,9 +1567,9 @@ async def delete_group(session: AsyncSession, group_id: int, deleted_by_id: int)
 
 
 async def get_group_users(session: AsyncSession, group_id: int) -> List[User]:
-    """Получение всех пользователей группы"""
+    """Получение всех пользователей группы (с ролями)"""
     try:
-        stmt = select(User).join(
+        stmt = select(User).options(selectinload(User.roles)).join(
             user_groups, User.id == user_groups.c.user_id
         ).where(
             user_groups.c.group_id == group_id
@@ -1038,8 +1607,8 @@ async def get_employees_in_group(session: AsyncSession, group_id: int) -> List[U
     """Получение только сотрудников из группы (для массовой рассылки Task 8)"""
     try:
         # Получаем роль сотрудника
-        employee_role = await get_role_by_name(session, "Сотрудник")
-        if not employee_role:
+        employee_role_id = await get_role_id(session, "Сотрудник")
+        if employee_role_id is None:
             return []
         
         stmt = select(User).join(
@@ -1048,7 +1617,7 @@ async def get_employees_in_group(session: AsyncSession, group_id: int) -> List[U
             user_roles, User.id == user_roles.c.user_id
         ).where(
             user_groups.c.group_id == group_id,
-            user_roles.c.role_id == employee_role.id,
+            user_roles.c.role_id == employee_role_id,
             User.is_activated == True,
             User.is_active == True
         ).order_by(User.full_name)
@@ -1064,8 +1633,8 @@ async def get_trainees_in_group(session: AsyncSession, group_id: int) -> List[Us
     """Получение только стажеров из группы (для массовой рассылки)"""
     try:
         # Получаем роль стажера
-        trainee_role = await get_role_by_name(session, "Стажер")
-        if not trainee_role:
+        trainee_role_id = await get_role_id(session, "Стажер")
+        if trainee_role_id is None:
             return []
         
         stmt = select(User).join(
@@ -1074,7 +1643,7 @@ async def get_trainees_in_group(session: AsyncSession, group_id: int) -> List[Us
             user_roles, User.id == user_roles.c.user_id
         ).where(
             user_groups.c.group_id == group_id,
-            user_roles.c.role_id == trainee_role.id,
+            user_roles.c.role_id == trainee_role_id,
             User.is_activated == True,
             User.is_active == True
         ).order_by(User.full_name)
@@ -1089,8 +1658,8 @@ async def get_mentors_in_group(session: AsyncSession, group_id: int) -> List[Use
     """Получение только наставников из группы (для массовой рассылки)"""
     try:
         # Получаем роль наставника
-        mentor_role = await get_role_by_name(session, "Наставник")
-        if not mentor_role:
+        mentor_role_id = await get_role_id(session, "Наставник")
+        if mentor_role_id is None:
             return []
         
         stmt = select(User).join(
@@ -1099,7 +1668,7 @@ async def get_mentors_in_group(session: AsyncSession, group_id: int) -> List[Use
             user_roles, User.id == user_roles.c.user_id
         ).where(
             user_groups.c.group_id == group_id,
-            user_roles.c.role_id == mentor_role.id,
+            user_roles.c.role_id == mentor_role_id,
             User.is_activated == True,
             User.is_active == True
         ).order_by(User.full_name)
@@ -1219,10 +1788,9 @@ async def get_all_objects(session: AsyncSession) -> List[Object]:
 async def get_object_by_id(session: AsyncSession, object_id: int) -> Optional[Object]:
     """Получение объекта по ID"""
     try:
-        result = await session.execute(
+        return await session.scalar(
             select(Object).where(Object.id == object_id, Object.is_active == True)
         )
-        return result.scalar_one_or_none()
     except Exception as e:
         logger.error(f"Ошибка получения объекта {object_id}: {e}")
         return None
@@ -1403,9 +1971,9 @@ async def create_test(session: AsyncSession, test_data: dict) -> Optional[Test]:
         
         # Проверка существования создателя
         creator_exists = await session.execute(
-            select(User).where(User.id == test_data['creator_id'])
+            select(exists().where(User.id == test_data['creator_id']))
         )
-        if not creator_exists.scalar_one_or_none():
+        if not creator_exists.scalar():
             logger.error(f"Создатель с ID {test_data['creator_id']} не найден")
             return None
         
@@ -1426,51 +1994,38 @@ async def create_test(session: AsyncSession, test_data: dict) -> Optional[Test]:
             creator_id=test_data['creator_id']
         )
         session.add(test)
-        await session.flush()
         await session.commit()
         logger.info(f"Тест '{test.name}' создан успешно (ID: {test.id})")
         return test
-    except Exception as e:
-        logger.error(f"Ошибка создания теста: {e}")
+    except Exception:
+        logger.exception("Ошибка создания теста")
         await session.rollback()
         return None
 
+@request_scoped_cache("get_test_by_id")
 async def get_test_by_id(session: AsyncSession, test_id: int) -> Optional[Test]:
-    """Получение теста по ID с загрузкой связанных вопросов"""
-    try:
-        result = await session.execute(
-            select(Test)
-            .options(selectinload(Test.questions))
-            .where(Test.id == test_id)
-        )
-        return result.scalar_one_or_none()
-    except Exception as e:
-        logger.error(f"Ошибка получения теста {test_id}: {e}")
-        return None
+    """Получение теста по ID с загрузкой связанных вопросов и этапа"""
+    return await session.scalar(
+        select(Test)
+        .options(selectinload(Test.questions), joinedload(Test.stage))
+        .where(Test.id == test_id)
+    )
 
 async def get_tests_by_creator(session: AsyncSession, creator_id: int) -> List[Test]:
     """Получение всех тестов, созданных пользователем"""
-    try:
-        result = await session.execute(
-            select(Test).where(Test.creator_id == creator_id, Test.is_active == True)
-            .order_by(Test.created_date.desc())
-        )
-        return result.scalars().all()
-    except Exception as e:
-        logger.error(f"Ошибка получения тестов пользователя {creator_id}: {e}")
-        return []
+    result = await session.execute(
+        select(Test).where(Test.creator_id == creator_id, Test.is_active == True)
+        .order_by(Test.created_date.desc())
+    )
+    return result.scalars().all()
 
 async def get_all_active_tests(session: AsyncSession) -> List[Test]:
     """Получение всех активных тестов"""
-    try:
-        result = await session.execute(
-            select(Test).where(Test.is_active == True)
-            .order_by(Test.created_date.desc())
-        )
-        return result.scalars().all()
-    except Exception as e:
-        logger.error(f"Ошибка получения всех тестов: {e}")
-        return []
+    result = await session.execute(
+        select(Test).where(Test.is_active == True)
+        .order_by(Test.created_date.desc())
+    )
+    return result.scalars().all()
 
 async def update_test(session: AsyncSession, test_id: int, update_data: dict) -> bool:
     """Обновление теста"""
@@ -1487,8 +2042,8 @@ async def update_test(session: AsyncSession, test_id: int, update_data: dict) ->
         await session.execute(stmt)
         await session.commit()
         return True
-    except Exception as e:
-        logger.error(f"Ошибка обновления теста {test_id}: {e}")
+    except Exception:
+        logger.exception("Ошибка обновления теста %s", test_id)
         await session.rollback()
         return False
 
@@ -1499,8 +2054,8 @@ async def delete_test(session: AsyncSession, test_id: int) -> bool:
         await session.execute(stmt)
         await session.commit()
         return True
-    except Exception as e:
-        logger.error(f"Ошибка удаления теста {test_id}: {e}")
+    except SQLAlchemyError:
+        logger.exception("Ошибка удаления теста %s", test_id)
         await session.rollback()
         return False
 
@@ -1508,54 +2063,88 @@ async def delete_test(session: AsyncSession, test_id: int) -> bool:
 # ФУНКЦИИ ДЛЯ РАБОТЫ С ВОПРОСАМИ
 # =================================
 
-async def add_question_to_test(session: AsyncSession, question_data: dict) -> Optional[TestQuestion]:
-    """Добавление вопроса к тесту с проверкой на уникальность"""
+async def add_questions_to_test_bulk(session: AsyncSession, questions_data: List[dict]) -> List[TestQuestion]:
+    """Добавление нескольких вопросов к тестам одним INSERT ... RETURNING
+    
+    Вопросы с текстом, который уже есть в тесте (или повторяется в самом списке),
+    пропускаются. Максимальный балл пересчитывается один раз для каждого теста.
+    """
+    if not questions_data:
+        return []
     try:
-        # Проверка на уникальность текста вопроса в рамках теста
-        existing_question = await session.execute(
-            select(TestQuestion).where(
-                TestQuestion.test_id == question_data['test_id'],
-                TestQuestion.question_text == question_data['question_text']
+        test_ids = {q['test_id'] for q in questions_data}
+        existing = await session.execute(
+            select(TestQuestion.test_id, TestQuestion.question_text).where(
+                TestQuestion.test_id.in_(test_ids),
+                TestQuestion.question_text.in_({q['question_text'] for q in questions_data})
             )
         )
-        if existing_question.scalar_one_or_none():
-            logger.warning(f"Попытка добавить дублирующийся вопрос в тест {question_data['test_id']}")
-            return None # или можно вернуть ошибку
-
-        question = TestQuestion(
-            test_id=question_data['test_id'],
-            question_number=question_data['question_number'],
-            question_type=question_data['question_type'],
-            question_text=question_data['question_text'],
-            options=question_data.get('options'),
-            correct_answer=json.dumps(question_data['correct_answer']) if isinstance(question_data['correct_answer'], list) else question_data['correct_answer'],
-            points=question_data.get('points', 1),
-            penalty_points=question_data.get('penalty_points', 0)
-        )
-        session.add(question)
-        await session.flush()
+        seen = set(existing.all())
+        
+        rows = []
+        for question_data in questions_data:
+            key = (question_data['test_id'], question_data['question_text'])
+            if key in seen:
+                logger.warning(f"Попытка добавить дублирующийся вопрос в тест {question_data['test_id']}")
+                continue
+            seen.add(key)
+            rows.append({
+                "test_id": question_data['test_id'],
+                "question_number": question_data['question_number'],
+                "question_type": question_data['question_type'],
+                "question_text": question_data['question_text'],
+                "options": question_data.get('options'),
+                "correct_answer": json.dumps(question_data['correct_answer']) if isinstance(question_data['correct_answer'], list) else question_data['correct_answer'],
+                "points": question_data.get('points', 1),
+                "penalty_points": question_data.get('penalty_points', 0),
+                "created_date": datetime.now()
+            })
+        
+        if not rows:
+            return []
         
-        # Обновляем максимальный балл теста
-        await update_test_max_score(session, question_data['test_id'])
+        result = await session.scalars(insert(TestQuestion).returning(TestQuestion), rows)
+        questions = result.all()
+        
+        # Обновляем максимальный балл затронутых тестов
+        for test_id in {row["test_id"] for row in rows}:
+            await update_test_max_score(session, test_id)
         
         await session.commit()
-        return question
-    except Exception as e:
-        logger.error(f"Ошибка добавления вопроса: {e}")
+        return questions
+    except Exception:
+        logger.exception("Ошибка добавления вопросов")
         await session.rollback()
-        return None
+        return []
+
+async def add_question_to_test(session: AsyncSession, question_data: dict) -> Optional[TestQuestion]:
+    """Добавление вопроса к тесту с проверкой на уникальность"""
+    questions = await add_questions_to_test_bulk(session, [question_data])
+    return questions[0] if questions else None
+
+# Выражения для самых частых запросов собираются один раз при импорте модуля:
+# при вызове меняются только параметры, а скомпилированный SQL берётся из кэша
+_STMT_QUESTIONS_BY_TEST = (
+    select(TestQuestion)
+    .where(TestQuestion.test_id == bindparam("tid"))
+    .order_by(TestQuestion.question_number)
+)
+
+_STMT_ACTIVE_TEST_ACCESS = select(TraineeTestAccess).where(
+    TraineeTestAccess.trainee_id == bindparam("uid"),
+    TraineeTestAccess.test_id == bindparam("tid"),
+    TraineeTestAccess.is_active == True
+)
+
+_STMT_TEST_ATTEMPTS_COUNT = select(func.count()).select_from(TestResult).where(
+    TestResult.user_id == bindparam("uid"),
+    TestResult.test_id == bindparam("tid")
+)
 
 async def get_test_questions(session: AsyncSession, test_id: int) -> List[TestQuestion]:
     """Получение всех вопросов теста"""
-    try:
-        result = await session.execute(
-            select(TestQuestion).where(TestQuestion.test_id == test_id)
-            .order_by(TestQuestion.question_number)
-        )
-        return result.scalars().all()
-    except Exception as e:
-        logger.error(f"Ошибка получения вопросов теста {test_id}: {e}")
-        return []
+    result = await session.execute(_STMT_QUESTIONS_BY_TEST, {"tid": test_id})
+    return result.scalars().all()
 
 async def update_question(session: AsyncSession, question_id: int, update_data: dict) -> bool:
     """Обновление вопроса"""
@@ -1566,66 +2155,86 @@ async def update_question(session: AsyncSession, question_id: int, update_data:
         if not update_values:
             return False
         
-        # Получаем старую информацию о вопросе для обновления максимального балла
-        old_question = await session.execute(
-            select(TestQuestion).where(TestQuestion.id == question_id)
-        )
-        old_question = old_question.scalar_one_or_none()
-        
-        if not old_question:
+        # Старые баллы читаются в локальные переменные до UPDATE: ORM-объект вопроса
+        # в сессии синхронизировался бы с новыми значениями и разница стала бы нулевой.
+        # Строка блокируется до коммита, чтобы параллельная правка того же вопроса
+        # не прочитала те же старые баллы и не сдвинула max_score дважды
+        old_row = (await session.execute(
+            select(TestQuestion.test_id, TestQuestion.points)
+            .where(TestQuestion.id == question_id)
+            .with_for_update()
+        )).first()
+        
+        if not old_row:
             return False
+        test_id, old_points = old_row
         
-        stmt = update(TestQuestion).where(TestQuestion.id == question_id).values(**update_values)
-        await session.execute(stmt)
+        new_points = (await session.execute(
+            update(TestQuestion)
+            .where(TestQuestion.id == question_id)
+            .values(**update_values)
+            .returning(TestQuestion.points)
+        )).scalar_one()
         
-        # Обновляем максимальный балл теста
-        await update_test_max_score(session, old_question.test_id)
+        # Сдвигаем максимальный балл теста на разницу баллов вопроса без пересчёта суммы
+        await shift_test_max_score(session, test_id, new_points - old_points)
         
         await session.commit()
         return True
-    except Exception as e:
-        logger.error(f"Ошибка обновления вопроса {question_id}: {e}")
+    except Exception:
+        logger.exception("Ошибка обновления вопроса %s", question_id)
         await session.rollback()
         return False
 
 async def delete_question(session: AsyncSession, question_id: int) -> bool:
     """Удаление вопроса"""
     try:
-        # Получаем информацию о вопросе для обновления максимального балла
-        question = await session.execute(
-            select(TestQuestion).where(TestQuestion.id == question_id)
+        result = await session.execute(
+            delete(TestQuestion)
+            .where(TestQuestion.id == question_id)
+            .returning(TestQuestion.test_id, TestQuestion.points)
         )
-        question = question.scalar_one_or_none()
+        row = result.first()
         
-        if not question:
+        if not row:
             return False
+        test_id, points = row
         
-        test_id = question.test_id
-        
-        await session.execute(delete(TestQuestion).where(TestQuestion.id == question_id))
-        
-        # Обновляем максимальный балл теста
-        await update_test_max_score(session, test_id)
+        # Уменьшаем максимальный балл теста на баллы удалённого вопроса
+        await shift_test_max_score(session, test_id, -points)
         
         await session.commit()
         return True
-    except Exception as e:
-        logger.error(f"Ошибка удаления вопроса {question_id}: {e}")
+    except SQLAlchemyError:
+        logger.exception("Ошибка удаления вопроса %s", question_id)
         await session.rollback()
         return False
 
 async def update_test_max_score(session: AsyncSession, test_id: int):
-    """Обновление максимального балла теста на основе вопросов"""
+    """Обновление максимального балла теста на основе вопросов
+    
+    Сумма баллов считается подзапросом внутри того же UPDATE, в транзакции
+    вызывающей функции (без отдельного commit).
+    """
     try:
-        result = await session.execute(
-            select(func.sum(TestQuestion.points)).where(TestQuestion.test_id == test_id)
+        points_sum = (
+            select(func.coalesce(func.sum(TestQuestion.points), 0))
+            .where(TestQuestion.test_id == test_id)
+            .scalar_subquery()
         )
-        max_score = result.scalar() or 0
-        
-        stmt = update(Test).where(Test.id == test_id).values(max_score=max_score)
-        await session.execute(stmt)
-    except Exception as e:
-        logger.error(f"Ошибка обновления максимального балла теста {test_id}: {e}")
+        await session.execute(
+            update(Test).where(Test.id == test_id).values(max_score=points_sum)
+        )
+    except SQLAlchemyError:
+        logger.exception("Ошибка обновления максимального балла теста %s", test_id)
+
+async def shift_test_max_score(session: AsyncSession, test_id: int, delta: float):
+    """Изменение максимального балла теста на delta одним UPDATE без пересчёта суммы"""
+    if not delta:
+        return
+    await session.execute(
+        update(Test).where(Test.id == test_id).values(max_score=Test.max_score + delta)
+    )
 
 # =================================
 # ФУНКЦИИ ДЛЯ РАБОТЫ С ЭТАПАМИ СТАЖИРОВКИ
@@ -1633,24 +2242,16 @@ async def update_test_max_score(session: AsyncSession, test_id: int):
 
 async def get_all_stages(session: AsyncSession) -> List[InternshipStage]:
     """Получение всех этапов стажировки"""
-    try:
-        result = await session.execute(
-            select(InternshipStage).where(InternshipStage.is_active == True)
-            .order_by(InternshipStage.order_number)
-        )
-        return result.scalars().all()
-    except Exception as e:
-        logger.error(f"Ошибка получения этапов стажировки: {e}")
-        return []
+    result = await session.execute(
+        select(InternshipStage).where(InternshipStage.is_active == True)
+        .order_by(InternshipStage.order_number)
+    )
+    return result.scalars().all()
 
+@request_scoped_cache("get_stage_by_id")
 async def get_stage_by_id(session: AsyncSession, stage_id: int) -> Optional[InternshipStage]:
     """Получение этапа по ID"""
-    try:
-        result = await session.execute(select(InternshipStage).where(InternshipStage.id == stage_id))
-        return result.scalar_one_or_none()
-    except Exception as e:
-        logger.error(f"Ошибка получения этапа {stage_id}: {e}")
-        return None
+    return await session.scalar(select(InternshipStage).where(InternshipStage.id == stage_id))
 
 # =================================
 # ФУНКЦИИ ДЛЯ РАБОТЫ С НАСТАВНИЧЕСТВОМ
@@ -1668,52 +2269,49 @@ async def assign_mentor(session: AsyncSession, mentor_id: int, trainee_id: int,
             logger.error("Наставник не может быть наставником самому себе")
             return None
         
+        # Загружаем наставника, стажера и назначающего вместе с названиями их ролей одним запросом
+        result = await session.execute(
+            select(User, func.array_remove(func.array_agg(Role.name), None))
+            .outerjoin(user_roles, User.id == user_roles.c.user_id)
+            .outerjoin(Role, user_roles.c.role_id == Role.id)
+            .where(User.id.in_([mentor_id, trainee_id, assigned_by_id]), User.is_active == True)
+            .group_by(User.id)
+        )
+        users = {user.id: (user, set(role_names)) for user, role_names in result.all()}
+        
         # Проверяем существование пользователей
-        mentor = await session.execute(select(User).where(User.id == mentor_id, User.is_active == True))
-        mentor = mentor.scalar_one_or_none()
-        if not mentor:
+        if mentor_id not in users:
             logger.error(f"Наставник с ID {mentor_id} не найден или неактивен")
             return None
+        mentor, role_names = users[mentor_id]
         
-        trainee = await session.execute(select(User).where(User.id == trainee_id, User.is_active == True))
-        trainee = trainee.scalar_one_or_none()
-        if not trainee:
+        if trainee_id not in users:
             logger.error(f"Стажер с ID {trainee_id} не найден или неактивен")
             return None
+        trainee, trainee_role_names = users[trainee_id]
         
-        assigned_by = await session.execute(select(User).where(User.id == assigned_by_id, User.is_active == True))
-        if not assigned_by.scalar_one_or_none():
+        if assigned_by_id not in users:
             logger.error(f"Пользователь назначающий с ID {assigned_by_id} не найден")
             return None
         
         # Проверяем, что наставник имеет подходящую роль
-        mentor_roles = await get_user_roles(session, mentor_id)
-        role_names = [role.name for role in mentor_roles]
         if not any(role in ["Наставник", "Сотрудник", "Руководитель"] for role in role_names):
             logger.error(f"Пользователь {mentor_id} не может быть наставником (неподходящая роль)")
             return None
         
         # Проверяем, что стажер имеет роль стажера
-        trainee_roles = await get_user_roles(session, trainee_id)
-        trainee_role_names = [role.name for role in trainee_roles]
         if "Стажер" not in trainee_role_names:
             logger.error(f"Пользователь {trainee_id} не является стажером")
             return None
         
-        # Проверяем, нет ли уже активного наставничества
-        existing = await session.execute(
-            select(Mentorship).where(
-                Mentorship.trainee_id == trainee_id,
-                Mentorship.is_active == True
-            )
+        # Деактивируем текущее наставничество, если оно есть, без предварительного SELECT
+        deactivated = await session.execute(
+            update(Mentorship)
+            .where(Mentorship.trainee_id == trainee_id, Mentorship.is_active == True)
+            .values(is_active=False)
         )
-        existing_mentorship = existing.scalar_one_or_none()
-        
-        if existing_mentorship:
+        if deactivated.rowcount:
             logger.warning(f"Стажер {trainee.full_name} уже имеет наставника. Переназначение...")
-            # Деактивируем старое наставничество
-            stmt = update(Mentorship).where(Mentorship.id == existing_mentorship.id).values(is_active=False)
-            await session.execute(stmt)
         
         mentorship = Mentorship(
             mentor_id=mentor_id,
@@ -1724,65 +2322,78 @@ async def assign_mentor(session: AsyncSession, mentor_id: int, trainee_id: int,
         await session.commit()
         logger.info(f"Наставник {mentor.full_name} назначен стажеру {trainee.full_name}")
         
-        # Отправляем уведомление стажёру о назначении наставника
-        if bot:
-            await send_notification_about_mentor_assignment(
-                session, bot, trainee_id, mentor_id, assigned_by_id
-            )
-        
-        # Отправляем уведомление наставнику о назначении стажёра
+        # Уведомления стажёру и наставнику отправляются в фоне
         if bot:
-            await send_notification_about_new_trainee(
-                session, bot, mentor_id, trainee_id, assigned_by_id
-            )
+            enqueue_notification(_notify_mentor_assignment, bot, trainee_id, mentor_id, assigned_by_id)
         
         return mentorship
-    except Exception as e:
-        logger.error(f"Ошибка назначения наставника: {e}")
+    except Exception:
+        logger.exception("Ошибка назначения наставника")
         await session.rollback()
         return None
 
 async def get_mentor_trainees(session: AsyncSession, mentor_id: int) -> List[User]:
     """Получение списка стажеров у наставника (только с ролью Стажер)"""
-    try:
-        result = await session.execute(
-            select(User)
-            .options(
-                selectinload(User.work_object),  # Загружаем объект работы
-                selectinload(User.internship_object),  # Загружаем объект стажировки
-                selectinload(User.roles),  # Загружаем роли пользователя
-                selectinload(User.groups)  # Загружаем группы пользователя
-            )
-            .join(Mentorship, User.id == Mentorship.trainee_id)
-            .join(user_roles, User.id == user_roles.c.user_id)
-            .join(Role, user_roles.c.role_id == Role.id)
-            .where(
-                Mentorship.mentor_id == mentor_id,
-                Mentorship.is_active == True,
-                User.is_active == True,
-                Role.name == "Стажер"
-            ).order_by(User.full_name)
-        )
-        return result.scalars().all()
-    except Exception as e:
-        logger.error(f"Ошибка получения стажеров наставника {mentor_id}: {e}")
-        return []
+    result = await session.execute(
+        select(User)
+        .options(
+            selectinload(User.work_object),  # Загружаем объект работы
+            selectinload(User.internship_object),  # Загружаем объект стажировки
+            selectinload(User.roles),  # Загружаем роли пользователя
+            selectinload(User.groups)  # Загружаем группы пользователя
+        )
+        .join(Mentorship, User.id == Mentorship.trainee_id)
+        .join(user_roles, User.id == user_roles.c.user_id)
+        .join(Role, user_roles.c.role_id == Role.id)
+        .where(
+            Mentorship.mentor_id == mentor_id,
+            Mentorship.is_active == True,
+            User.is_active == True,
+            Role.name == "Стажер"
+        ).order_by(User.full_name)
+    )
+    return result.scalars().all()
 
 async def get_trainee_mentor(session: AsyncSession, trainee_id: int) -> Optional[User]:
     """Получение наставника стажера"""
-    try:
-        result = await session.execute(
-            select(User).join(
-                Mentorship, User.id == Mentorship.mentor_id
-            ).where(
-                Mentorship.trainee_id == trainee_id,
-                Mentorship.is_active == True
-            )
+    result = await session.execute(
+        select(User).join(
+            Mentorship, User.id == Mentorship.mentor_id
+        ).where(
+            Mentorship.trainee_id == trainee_id,
+            Mentorship.is_active == True
         )
-        return result.scalar_one_or_none()
-    except Exception as e:
-        logger.error(f"Ошибка получения наставника стажера {trainee_id}: {e}")
-        return None
+    )
+    return result.scalars().first()
+
+
+async def get_trainees_with_mentors(session: AsyncSession) -> List[User]:
+    """Получение стажеров, у которых активный наставник с ролью Наставник или Руководитель
+    
+    Один запрос вместо get_mentor_trainees по каждому наставнику; порядок тот же:
+    по ФИО наставника, затем по ФИО стажера.
+    """
+    mentor = aliased(User)
+    mentor_link = user_roles.alias()
+    mentor_role = aliased(Role)
+    result = await session.execute(
+        select(User)
+        .join(Mentorship, and_(Mentorship.trainee_id == User.id, Mentorship.is_active == True))
+        .join(mentor, mentor.id == Mentorship.mentor_id)
+        .join(user_roles, User.id == user_roles.c.user_id)
+        .join(Role, user_roles.c.role_id == Role.id)
+        .where(
+            User.is_active == True,
+            Role.name == "Стажер",
+            exists()
+            .where(
+                mentor_link.c.user_id == mentor.id,
+                mentor_role.id == mentor_link.c.role_id,
+                mentor_role.name.in_(["Наставник", "Руководитель"])
+            )
+        ).order_by(mentor.full_name, mentor.id, User.full_name)
+    )
+    return result.scalars().all()
 
 
 async def get_user_mentor(session: AsyncSession, user_id: int) -> Optional[User]:
@@ -1791,87 +2402,109 @@ async def get_user_mentor(session: AsyncSession, user_id: int) -> Optional[User]
 
 async def get_unassigned_trainees(session: AsyncSession) -> List[User]:
     """Получение списка активированных стажеров без наставника"""
-    try:
-        result = await session.execute(
-            select(User).join(
-                user_roles, User.id == user_roles.c.user_id
-            ).join(
-                Role, user_roles.c.role_id == Role.id
-            ).where(
-                Role.name == "Стажер",
-                User.is_activated == True,  # Только активированные пользователи
-                ~User.id.in_(
-                    select(Mentorship.trainee_id).where(Mentorship.is_active == True)
-                )
-            ).order_by(User.full_name)
-        )
-        return result.scalars().all()
-    except Exception as e:
-        logger.error(f"Ошибка получения стажеров без наставника: {e}")
-        return []
+    result = await session.execute(
+        select(User).join(
+            user_roles, User.id == user_roles.c.user_id
+        ).join(
+            Role, user_roles.c.role_id == Role.id
+        ).outerjoin(
+            Mentorship, and_(Mentorship.trainee_id == User.id, Mentorship.is_active == True)
+        ).where(
+            Role.name == "Стажер",
+            User.is_activated == True,  # Только активированные пользователи
+            Mentorship.id.is_(None)  # Нет активного наставничества (anti-join)
+        ).order_by(User.full_name)
+    )
+    return result.scalars().all()
 
 async def get_available_mentors(session: AsyncSession) -> List[User]:
     """Получение списка пользователей, которые могут быть наставниками"""
-    try:
-        result = await session.execute(
-            select(User)
-            .options(
-                selectinload(User.work_object),  # Загружаем объект работы
-                selectinload(User.internship_object)  # Загружаем объект стажировки
-            )
-            .join(
-                user_roles, User.id == user_roles.c.user_id
-            ).join(
-                Role, user_roles.c.role_id == Role.id
-            ).where(
-                Role.name.in_(["Наставник", "Руководитель"])
-            ).order_by(User.full_name)
+    result = await session.execute(
+        select(User)
+        .options(
+            selectinload(User.work_object),  # Загружаем объект работы
+            selectinload(User.internship_object)  # Загружаем объект стажировки
         )
-        return result.scalars().all()
-    except Exception as e:
-        logger.error(f"Ошибка получения доступных наставников: {e}")
-        return []
+        .join(
+            user_roles, User.id == user_roles.c.user_id
+        ).join(
+            Role, user_roles.c.role_id == Role.id
+        ).where(
+            Role.name.in_(["Наставник", "Руководитель"])
+        ).order_by(User.full_name)
+    )
+    return result.scalars().all()
 
 # =================================
 # ФУНКЦИИ ДЛЯ РАБОТЫ С ДОСТУПОМ К ТЕСТАМ
 # =================================
 
-async def grant_test_access(session: AsyncSession, trainee_id: int, test_id: int, granted_by_id: int, bot=None) -> bool:
-    """Предоставление доступа к тесту стажеру"""
+async def grant_test_access_bulk(session: AsyncSession, trainee_ids: List[int], test_id: int, granted_by_id: int, bot=None) -> bool:
+    """Предоставление доступа к тесту нескольким стажерам одной вставкой
+    
+    Выдача идёт одним INSERT ... ON CONFLICT DO NOTHING по частичному
+    уникальному индексу активных доступов, без предварительного SELECT. Большие
+    выдачи (от COPY_THRESHOLD стажеров) сначала загружаются через COPY во
+    временную таблицу и вставляются из неё тем же INSERT ... SELECT.
+    """
+    trainee_ids = list(dict.fromkeys(trainee_ids))
+    if not trainee_ids:
+        return True
     try:
-        # Проверяем, нет ли уже доступа
-        existing = await session.execute(
-            select(TraineeTestAccess).where(
-                TraineeTestAccess.trainee_id == trainee_id,
-                TraineeTestAccess.test_id == test_id,
-                TraineeTestAccess.is_active == True
+        now = datetime.now()
+        await set_async_commit(session)
+        
+        columns = ["trainee_id", "test_id", "granted_by_id", "granted_date", "is_active"]
+        if len(trainee_ids) >= COPY_THRESHOLD:
+            # Строки загружаются COPY во временную таблицу и переносятся одним
+            # INSERT ... SELECT ... ON CONFLICT: параллельная выдача того же доступа
+            # не приводит к нарушению уникальности, как при COPY прямо в таблицу
+            await session.execute(text(
+                "CREATE TEMP TABLE trainee_test_access_stage "
+                "(LIKE trainee_test_access INCLUDING DEFAULTS) ON COMMIT DROP"
+            ))
+            stage = table("trainee_test_access_stage", *(column(name) for name in columns))
+            await bulk_insert_copy(
+                session, stage, columns,
+                [(tid, test_id, granted_by_id, now, True) for tid in trainee_ids]
             )
+            stmt = pg_insert(TraineeTestAccess).from_select(columns, select(*stage.c))
+        else:
+            stmt = pg_insert(TraineeTestAccess).values([
+                {"trainee_id": tid, "test_id": test_id, "granted_by_id": granted_by_id,
+                 "granted_date": now, "is_active": True}
+                for tid in trainee_ids
+            ])
+        result = await session.execute(
+            stmt.on_conflict_do_nothing(
+                index_elements=["trainee_id", "test_id"],
+                index_where=TraineeTestAccess.is_active == True
+            )
+            .returning(TraineeTestAccess.trainee_id)
         )
-        existing_access = existing.scalar_one_or_none()
+        created_count = len(result.all())
         
-        # Если доступа еще нет - создаем новый
-        if not existing_access:
-            access = TraineeTestAccess(
-                trainee_id=trainee_id,
-                test_id=test_id,
-                granted_by_id=granted_by_id
-            )
-            session.add(access)
-            await session.commit()
-            logger.info(f"Создан новый доступ к тесту {test_id} для стажёра {trainee_id}")
-        else:
-            logger.info(f"Доступ к тесту {test_id} для стажёра {trainee_id} уже существует - отправляем повторное уведомление")
+        await session.commit()
+        if created_count:
+            logger.info(f"Создан доступ к тесту {test_id} для {created_count} стажёров")
+        if created_count < len(trainee_ids):
+            logger.info(f"Доступ к тесту {test_id} уже существует для {len(trainee_ids) - created_count} стажёров - повторное уведомление, если оно не отправлялось в последние {NOTIFICATION_DEDUP_TTL} с")
         
-        # Отправляем уведомление стажеру ВСЕГДА (и при новом доступе, и при повторном назначении)
+        # Уведомление отправляется и при новом доступе, и при повторном назначении, но
+        # повторное назначение в течение NOTIFICATION_DEDUP_TTL не дублирует сообщение
         if bot:
-            await send_notification_about_new_test(session, bot, trainee_id, test_id, granted_by_id)
+            enqueue_notification(_notify_test_access, bot, trainee_ids, test_id, granted_by_id)
         
         return True
-    except Exception as e:
-        logger.error(f"Ошибка предоставления доступа к тесту: {e}")
+    except Exception:
+        logger.exception("Ошибка предоставления доступа к тесту")
         await session.rollback()
         return False
 
+async def grant_test_access(session: AsyncSession, trainee_id: int, test_id: int, granted_by_id: int, bot=None) -> bool:
+    """Предоставление доступа к тесту стажеру"""
+    return await grant_test_access_bulk(session, [trainee_id], test_id, granted_by_id, bot)
+
 async def get_trainee_available_tests(session: AsyncSession, trainee_id: int) -> List[Test]:
     """
     Получение доступных тестов ТРАЕКТОРИИ для стажера
@@ -1880,44 +2513,40 @@ async def get_trainee_available_tests(session: AsyncSession, trainee_id: int) ->
     Тесты от наставника ВНЕ траектории идут в get_trainee_additional_tests_from_mentor()
     Тесты от рекрутера через рассылку - используй get_employee_tests_from_recruiter()
     """
-    try:
-        from database.models import LearningSession, TraineeSessionProgress, TraineeStageProgress, TraineeLearningPath
-        
-        # Получаем траекторию стажера
-        trainee_path_result = await session.execute(
-            select(TraineeLearningPath)
-            .options(selectinload(TraineeLearningPath.learning_path))
-            .where(
-                TraineeLearningPath.trainee_id == trainee_id,
-                TraineeLearningPath.is_active == True
-            )
-        )
-        trainee_path = trainee_path_result.scalar_one_or_none()
-        
-        if not trainee_path:
-            return []
-        
-        # Получаем все тесты из сессий траектории ТОЛЬКО из ОТКРЫТЫХ этапов
-        result = await session.execute(
-            select(Test).join(
-                session_tests, Test.id == session_tests.c.test_id
-            ).join(
-                LearningSession, LearningSession.id == session_tests.c.session_id
-            ).join(
-                TraineeSessionProgress, TraineeSessionProgress.session_id == LearningSession.id
-            ).join(
-                TraineeStageProgress, TraineeSessionProgress.stage_progress_id == TraineeStageProgress.id
-            ).where(
-                TraineeStageProgress.trainee_path_id == trainee_path.id,
-                TraineeStageProgress.is_opened == True,  # КРИТИЧЕСКОЕ ИСПРАВЛЕНИЕ: только открытые этапы
-                Test.is_active == True
-            ).order_by(Test.created_date)
+    from database.models import LearningSession, TraineeSessionProgress, TraineeStageProgress, TraineeLearningPath
+
+    # Получаем траекторию стажера
+    trainee_path_result = await session.execute(
+        select(TraineeLearningPath)
+        .options(selectinload(TraineeLearningPath.learning_path))
+        .where(
+            TraineeLearningPath.trainee_id == trainee_id,
+            TraineeLearningPath.is_active == True
         )
-        return result.scalars().all()
-    except Exception as e:
-        logger.error(f"Ошибка получения тестов траектории для стажера {trainee_id}: {e}")
+    )
+    trainee_path = trainee_path_result.scalars().first()
+
+    if not trainee_path:
         return []
 
+    # Получаем все тесты из сессий траектории ТОЛЬКО из ОТКРЫТЫХ этапов
+    result = await session.execute(
+        select(Test).join(
+            session_tests, Test.id == session_tests.c.test_id
+        ).join(
+            LearningSession, LearningSession.id == session_tests.c.session_id
+        ).join(
+            TraineeSessionProgress, TraineeSessionProgress.session_id == LearningSession.id
+        ).join(
+            TraineeStageProgress, TraineeSessionProgress.stage_progress_id == TraineeStageProgress.id
+        ).where(
+            TraineeStageProgress.trainee_path_id == trainee_path.id,
+            TraineeStageProgress.is_opened == True,  # КРИТИЧЕСКОЕ ИСПРАВЛЕНИЕ: только открытые этапы
+            Test.is_active == True
+        ).order_by(Test.created_date)
+    )
+    return result.scalars().all()
+
 
 async def get_user_available_tests(session: AsyncSession, user_id: int, exclude_completed: bool = True) -> List[Test]:
     """
@@ -1930,34 +2559,30 @@ async def get_user_available_tests(session: AsyncSession, user_id: int, exclude_
     Returns:
         List[Test]: Список доступных тестов
     """
-    try:
-        # Получаем все тесты, к которым у пользователя есть доступ
-        result = await session.execute(
-            select(Test).join(
-                TraineeTestAccess, Test.id == TraineeTestAccess.test_id
-            ).where(
-                TraineeTestAccess.trainee_id == user_id,  # Используем существующую таблицу для всех пользователей
-                TraineeTestAccess.is_active == True,
-                Test.is_active == True
-            ).order_by(Test.created_date)
-        )
-        available_tests = result.scalars().all()
-        
-        # Если нужно исключить пройденные тесты
-        if exclude_completed:
-            filtered_tests = []
-            for test in available_tests:
-                # Проверяем, есть ли успешный результат прохождения
-                test_result = await get_user_test_result(session, user_id, test.id)
-                if not (test_result and test_result.is_passed):
-                    filtered_tests.append(test)
-            return filtered_tests
-        
-        return available_tests
-        
-    except Exception as e:
-        logger.error(f"Ошибка получения доступных тестов для пользователя {user_id}: {e}")
-        return []
+    # Получаем все тесты, к которым у пользователя есть доступ
+    result = await session.execute(
+        select(Test).join(
+            TraineeTestAccess, Test.id == TraineeTestAccess.test_id
+        ).where(
+            TraineeTestAccess.trainee_id == user_id,  # Используем существующую таблицу для всех пользователей
+            TraineeTestAccess.is_active == True,
+            Test.is_active == True
+        ).order_by(Test.created_date)
+    )
+    available_tests = result.scalars().all()
+
+    # Если нужно исключить пройденные тесты
+    if exclude_completed:
+        filtered_tests = []
+        for test in available_tests:
+            # Проверяем, есть ли успешный результат прохождения
+            test_result = await get_user_test_result(session, user_id, test.id)
+            if not (test_result and test_result.is_passed):
+                filtered_tests.append(test)
+        return filtered_tests
+
+    return available_tests
+
 
 
 async def get_user_broadcast_tests(session: AsyncSession, user_id: int, exclude_completed: bool = False) -> List[Test]:
@@ -1972,65 +2597,61 @@ async def get_user_broadcast_tests(session: AsyncSession, user_id: int, exclude_
     Returns:
         List[Test]: Список тестов доступных пользователю через рассылку (исключая тесты траектории)
     """
-    try:
-        from database.models import LearningSession, TraineeSessionProgress, TraineeStageProgress, TraineeLearningPath
-        
-        # Получаем все тесты, доступные пользователю через TraineeTestAccess
-        all_tests_result = await session.execute(
-            select(Test).join(
-                TraineeTestAccess, Test.id == TraineeTestAccess.test_id
-            ).where(
-                TraineeTestAccess.trainee_id == user_id,
-                TraineeTestAccess.is_active == True,
-                Test.is_active == True
-            ).order_by(Test.created_date)
+    from database.models import LearningSession, TraineeSessionProgress, TraineeStageProgress, TraineeLearningPath
+
+    # Получаем все тесты, доступные пользователю через TraineeTestAccess
+    all_tests_result = await session.execute(
+        select(Test).join(
+            TraineeTestAccess, Test.id == TraineeTestAccess.test_id
+        ).where(
+            TraineeTestAccess.trainee_id == user_id,
+            TraineeTestAccess.is_active == True,
+            Test.is_active == True
+        ).order_by(Test.created_date)
+    )
+    all_tests = all_tests_result.scalars().all()
+
+    # Получаем ID тестов из траектории (если пользователь - стажер с траекторией)
+    trajectory_test_ids = set()
+    trainee_path_result = await session.execute(
+        select(TraineeLearningPath)
+        .where(
+            TraineeLearningPath.trainee_id == user_id,
+            TraineeLearningPath.is_active == True
         )
-        all_tests = all_tests_result.scalars().all()
-        
-        # Получаем ID тестов из траектории (если пользователь - стажер с траекторией)
-        trajectory_test_ids = set()
-        trainee_path_result = await session.execute(
-            select(TraineeLearningPath)
-            .where(
-                TraineeLearningPath.trainee_id == user_id,
-                TraineeLearningPath.is_active == True
+    )
+    trainee_path = trainee_path_result.scalars().first()
+
+    if trainee_path:
+        # Исключаем тесты траектории (только из открытых этапов)
+        trajectory_tests_result = await session.execute(
+            select(session_tests.c.test_id).join(
+                LearningSession, LearningSession.id == session_tests.c.session_id
+            ).join(
+                TraineeSessionProgress, TraineeSessionProgress.session_id == LearningSession.id
+            ).join(
+                TraineeStageProgress, TraineeSessionProgress.stage_progress_id == TraineeStageProgress.id
+            ).where(
+                TraineeStageProgress.trainee_path_id == trainee_path.id,
+                TraineeStageProgress.is_opened == True
             )
         )
-        trainee_path = trainee_path_result.scalar_one_or_none()
-        
-        if trainee_path:
-            # Исключаем тесты траектории (только из открытых этапов)
-            trajectory_tests_result = await session.execute(
-                select(session_tests.c.test_id).join(
-                    LearningSession, LearningSession.id == session_tests.c.session_id
-                ).join(
-                    TraineeSessionProgress, TraineeSessionProgress.session_id == LearningSession.id
-                ).join(
-                    TraineeStageProgress, TraineeSessionProgress.stage_progress_id == TraineeStageProgress.id
-                ).where(
-                    TraineeStageProgress.trainee_path_id == trainee_path.id,
-                    TraineeStageProgress.is_opened == True
-                )
-            )
-            trajectory_test_ids = set(row[0] for row in trajectory_tests_result.all())
-        
-        # Фильтруем: исключаем тесты траектории
-        available_tests = [test for test in all_tests if test.id not in trajectory_test_ids]
-        
-        # Опционально исключаем пройденные тесты
-        if exclude_completed:
-            filtered_tests = []
-            for test in available_tests:
-                test_result = await get_user_test_result(session, user_id, test.id)
-                if not (test_result and test_result.is_passed):
-                    filtered_tests.append(test)
-            return filtered_tests
-        
-        return available_tests
-        
-    except Exception as e:
-        logger.error(f"Ошибка получения тестов рассылки для пользователя {user_id}: {e}")
-        return []
+        trajectory_test_ids = set(row[0] for row in trajectory_tests_result.all())
+
+    # Фильтруем: исключаем тесты траектории
+    available_tests = [test for test in all_tests if test.id not in trajectory_test_ids]
+
+    # Опционально исключаем пройденные тесты
+    if exclude_completed:
+        filtered_tests = []
+        for test in available_tests:
+            test_result = await get_user_test_result(session, user_id, test.id)
+            if not (test_result and test_result.is_passed):
+                filtered_tests.append(test)
+        return filtered_tests
+
+    return available_tests
+
 
 
 async def get_employee_tests_from_recruiter(session: AsyncSession, user_id: int, exclude_completed: bool = True) -> List[Test]:
@@ -2045,6 +2666,7 @@ async def get_employee_tests_from_recruiter(session: AsyncSession, user_id: int,
 async def revoke_test_access(session: AsyncSession, trainee_id: int, test_id: int) -> bool:
     """Отзыв доступа к тесту"""
     try:
+        await set_async_commit(session)
         stmt = update(TraineeTestAccess).where(
             TraineeTestAccess.trainee_id == trainee_id,
             TraineeTestAccess.test_id == test_id
@@ -2052,8 +2674,8 @@ async def revoke_test_access(session: AsyncSession, trainee_id: int, test_id: in
         await session.execute(stmt)
         await session.commit()
         return True
-    except Exception as e:
-        logger.error(f"Ошибка отзыва доступа к тесту: {e}")
+    except SQLAlchemyError:
+        logger.exception("Ошибка отзыва доступа к тесту")
         await session.rollback()
         return False
 
@@ -2061,6 +2683,80 @@ async def revoke_test_access(session: AsyncSession, trainee_id: int, test_id: in
 # ФУНКЦИИ ДЛЯ РАБОТЫ С РЕЗУЛЬТАТАМИ ТЕСТОВ
 # =================================
 
+def _aggregate_answers_details(details_lists) -> List[dict]:
+    """Свертка answers_details нескольких результатов в строки для question_stats"""
+    stats = {}
+    for details in details_lists:
+        for detail in details or []:
+            question_id = detail.get('question_id')
+            if question_id is None:
+                continue
+            row = stats.setdefault(question_id, {"qid": question_id, "d_total": 0, "d_correct": 0, "d_time": 0.0})
+            row["d_total"] += 1
+            row["d_correct"] += 1 if detail.get('is_correct') else 0
+            row["d_time"] += detail.get('time_spent') or 0
+    return list(stats.values())
+
+async def add_question_stats(session: AsyncSession, answers_details: List[dict]):
+    """Учет ответов нового результата в question_stats одним INSERT ... ON CONFLICT DO UPDATE
+    
+    Вопросы, удалённые во время прохождения теста, пропускаются: иначе внешний
+    ключ question_stats -> test_questions откатил бы весь save_test_result.
+    Оставшиеся вопросы блокируются FOR KEY SHARE до конца транзакции, чтобы их
+    нельзя было удалить между проверкой и вставкой.
+    """
+    rows = _aggregate_answers_details([answers_details])
+    if not rows:
+        return
+    existing_ids = set((await session.execute(
+        select(TestQuestion.id)
+        .where(TestQuestion.id.in_([r["qid"] for r in rows]))
+        .with_for_update(read=True, key_share=True)
+    )).scalars().all())
+    rows = [r for r in rows if r["qid"] in existing_ids]
+    if not rows:
+        return
+    stmt = pg_insert(QuestionStats).values([
+        {"question_id": r["qid"], "total": r["d_total"], "correct": r["d_correct"], "total_time": r["d_time"]}
+        for r in rows
+    ])
+    await session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[QuestionStats.question_id],
+            set_={
+                "total": QuestionStats.total + stmt.excluded.total,
+                "correct": QuestionStats.correct + stmt.excluded.correct,
+                "total_time": QuestionStats.total_time + stmt.excluded.total_time,
+            }
+        )
+    )
+
+
+async def delete_test_results(session: AsyncSession, *conditions) -> int:
+    """Удаление результатов тестов с вычитанием их ответов из question_stats (без commit)
+    
+    Возвращает количество удаленных результатов.
+    """
+    result = await session.execute(
+        delete(TestResult).where(*conditions).returning(TestResult.answers_details)
+    )
+    details_lists = result.scalars().all()
+    rows = _aggregate_answers_details(details_lists)
+    if rows:
+        # Строки вопросов, удаленных вместе со статистикой, просто не найдутся
+        stats_table = QuestionStats.__table__
+        await session.execute(
+            update(stats_table)
+            .where(stats_table.c.question_id == bindparam("qid"))
+            .values(
+                total=stats_table.c.total - bindparam("d_total"),
+                correct=stats_table.c.correct - bindparam("d_correct"),
+                total_time=stats_table.c.total_time - bindparam("d_time"),
+            ),
+            rows
+        )
+    return len(details_lists)
+
 async def save_test_result(session: AsyncSession, result_data: dict) -> Optional[TestResult]:
     """Сохранение результата прохождения теста"""
     try:
@@ -2072,42 +2768,47 @@ async def save_test_result(session: AsyncSession, result_data: dict) -> Optional
             is_passed=result_data['is_passed'],
             start_time=result_data['start_time'],
             end_time=result_data['end_time'],
-            answers=json.dumps(result_data.get('answers', {}), ensure_ascii=False),
-            answers_details=result_data.get('answers_details', []),
-            wrong_answers=result_data.get('wrong_answers', [])
+            answers_details=result_data.get('answers_details', [])
         )
         session.add(test_result)
+        await add_question_stats(session, test_result.answers_details)
         await session.commit()
         logger.info(f"Результат теста сохранен для пользователя {result_data['user_id']}, тест {result_data['test_id']}")
         return test_result
-    except Exception as e:
-        logger.error(f"Ошибка сохранения результата теста: {e}")
+    except Exception:
+        logger.exception("Ошибка сохранения результата теста")
         await session.rollback()
         return None
 
 async def get_user_test_results(session: AsyncSession, user_id: int) -> List[TestResult]:
     """Получение результатов тестов пользователя"""
-    try:
-        result = await session.execute(
-            select(TestResult).where(TestResult.user_id == user_id)
-            .order_by(TestResult.created_date.desc())
-        )
-        return result.scalars().all()
-    except Exception as e:
-        logger.error(f"Ошибка получения результатов тестов пользователя {user_id}: {e}")
-        return []
+    result = await session.execute(
+        select(TestResult).where(TestResult.user_id == user_id)
+        .order_by(TestResult.created_date.desc())
+    )
+    return result.scalars().all()
 
-async def get_test_results_summary(session: AsyncSession, test_id: int) -> List[TestResult]:
-    """Получение сводки результатов по тесту"""
-    try:
-        result = await session.execute(
-            select(TestResult).where(TestResult.test_id == test_id)
-            .order_by(TestResult.score.desc())
-        )
-        return result.scalars().all()
-    except Exception as e:
-        logger.error(f"Ошибка получения сводки результатов теста {test_id}: {e}")
-        return []
+async def get_user_test_stats(session: AsyncSession, user_id: int) -> Tuple[int, int, float]:
+    """Сводка результатов тестов пользователя одним агрегатом: (всего, пройдено, средний балл)"""
+    result = await session.execute(
+        select(
+            func.count(TestResult.id),
+            func.count(TestResult.id).filter(TestResult.is_passed == True),
+            func.coalesce(func.avg(TestResult.score), 0.0)
+        ).where(TestResult.user_id == user_id)
+    )
+    total, passed, avg_score = result.one()
+    return total, passed, float(avg_score)
+
+async def iter_test_results(session: AsyncSession, test_id: int) -> AsyncIterator[TestResult]:
+    """Потоковое чтение результатов теста (по убыванию балла) порциями по 100 строк"""
+    result = await session.stream(
+        select(TestResult).where(TestResult.test_id == test_id)
+        .order_by(TestResult.score.desc())
+        .execution_options(yield_per=100)
+    )
+    async for test_result in result.scalars():
+        yield test_result
 
 
 async def delete_trajectory_test_results(session: AsyncSession, trainee_id: int, learning_path_id: int) -> bool:
@@ -2134,74 +2835,79 @@ async def delete_trajectory_test_results(session: AsyncSession, trainee_id: int,
         test_ids = [test.id for test in trajectory_tests]
         
         # Удаляем результаты тестов стажера по этим тестам
-        deleted_count = await session.execute(
-            delete(TestResult).where(
-                TestResult.user_id == trainee_id,
-                TestResult.test_id.in_(test_ids)
-            )
+        deleted_count = await delete_test_results(
+            session,
+            TestResult.user_id == trainee_id,
+            TestResult.test_id.in_(test_ids)
         )
         
         await session.commit()
-        logger.info(f"Удалено {deleted_count.rowcount} результатов тестов для стажера {trainee_id} в траектории {learning_path_id}")
+        logger.info(f"Удалено {deleted_count} результатов тестов для стажера {trainee_id} в траектории {learning_path_id}")
         return True
         
-    except Exception as e:
+    except SQLAlchemyError:
         await session.rollback()
-        logger.error(f"Ошибка удаления результатов тестов для стажера {trainee_id} в траектории {learning_path_id}: {e}")
+        logger.exception("Ошибка удаления результатов тестов для стажера %s в траектории %s", trainee_id, learning_path_id)
         return False
 
 async def check_test_already_passed(session: AsyncSession, user_id: int, test_id: int) -> bool:
     """Проверка, проходил ли пользователь тест"""
-    try:
-        result = await session.execute(
-            select(func.count()).select_from(TestResult).where(
-                TestResult.user_id == user_id,
-                TestResult.test_id == test_id
-            )
-        )
-        count = result.scalar()
-        return count > 0
-    except Exception as e:
-        logger.error(f"Ошибка проверки прохождения теста: {e}")
-        return False
+    # EXISTS останавливается на первой найденной строке, в отличие от COUNT
+    return await session.scalar(
+        select(exists().where(
+            TestResult.user_id == user_id,
+            TestResult.test_id == test_id
+        ))
+    )
 
 async def check_test_access(session: AsyncSession, user_id: int, test_id: int) -> bool:
     """Проверка доступа пользователя к тесту"""
-    try:
-        # Получаем роли пользователя
-        user_roles = await get_user_roles(session, user_id)
-        role_names = [role.name for role in user_roles]
+    # Получаем роли пользователя
+    user_roles = await get_user_roles(session, user_id)
+    role_names = [role.name for role in user_roles]
+
+    # Для стажеров - проверяем доступ через TraineeTestAccess И открытость этапов
+    if "Стажер" in role_names:
+        # Сначала проверяем базовый доступ через TraineeTestAccess
+        result = await session.execute(_STMT_ACTIVE_TEST_ACCESS, {"uid": user_id, "tid": test_id})
+        access = result.scalars().first()
+        if not access:
+            return False
         
-        # Для стажеров - проверяем доступ через TraineeTestAccess И открытость этапов
-        if "Стажер" in role_names:
-            # Сначала проверяем базовый доступ через TraineeTestAccess
-            result = await session.execute(
-                select(TraineeTestAccess).where(
-                    TraineeTestAccess.trainee_id == user_id,
-                    TraineeTestAccess.test_id == test_id,
-                    TraineeTestAccess.is_active == True
-                )
+        # ДОПОЛНИТЕЛЬНАЯ ПРОВЕРКА: Если тест из траектории, проверяем открытость этапа
+        from database.models import LearningSession, TraineeSessionProgress, TraineeStageProgress, TraineeLearningPath, session_tests
+
+        # Проверяем, входит ли тест в траекторию
+        trainee_path_result = await session.execute(
+            select(TraineeLearningPath)
+            .where(
+                TraineeLearningPath.trainee_id == user_id,
+                TraineeLearningPath.is_active == True
             )
-            access = result.scalar_one_or_none()
-            if not access:
-                return False
-            
-            # ДОПОЛНИТЕЛЬНАЯ ПРОВЕРКА: Если тест из траектории, проверяем открытость этапа
-            from database.models import LearningSession, TraineeSessionProgress, TraineeStageProgress, TraineeLearningPath, session_tests
-            
-            # Проверяем, входит ли тест в траекторию
-            trainee_path_result = await session.execute(
-                select(TraineeLearningPath)
-                .where(
-                    TraineeLearningPath.trainee_id == user_id,
-                    TraineeLearningPath.is_active == True
+        )
+        trainee_path = trainee_path_result.scalars().first()
+
+        if trainee_path:
+            # Проверяем, входит ли тест в сессии траектории И этап открыт
+            trajectory_test_result = await session.execute(
+                select(session_tests.c.test_id).join(
+                    LearningSession, LearningSession.id == session_tests.c.session_id
+                ).join(
+                    TraineeSessionProgress, TraineeSessionProgress.session_id == LearningSession.id
+                ).join(
+                    TraineeStageProgress, TraineeSessionProgress.stage_progress_id == TraineeStageProgress.id
+                ).where(
+                    TraineeStageProgress.trainee_path_id == trainee_path.id,
+                    TraineeStageProgress.is_opened == True,  # КРИТИЧЕСКОЕ ИСПРАВЛЕНИЕ: только открытые этапы
+                    session_tests.c.test_id == test_id
                 )
             )
-            trainee_path = trainee_path_result.scalar_one_or_none()
+            trajectory_test = trajectory_test_result.first()
             
-            if trainee_path:
-                # Проверяем, входит ли тест в сессии траектории И этап открыт
-                trajectory_test_result = await session.execute(
+            # Если тест из траектории, но этап закрыт - проверяем источник доступа
+            if trajectory_test is None:
+                # Проверяем, входит ли тест в траекторию вообще (для диагностики)
+                all_trajectory_test_result = await session.execute(
                     select(session_tests.c.test_id).join(
                         LearningSession, LearningSession.id == session_tests.c.session_id
                     ).join(
@@ -2210,174 +2916,132 @@ async def check_test_access(session: AsyncSession, user_id: int, test_id: int) -
                         TraineeStageProgress, TraineeSessionProgress.stage_progress_id == TraineeStageProgress.id
                     ).where(
                         TraineeStageProgress.trainee_path_id == trainee_path.id,
-                        TraineeStageProgress.is_opened == True,  # КРИТИЧЕСКОЕ ИСПРАВЛЕНИЕ: только открытые этапы
                         session_tests.c.test_id == test_id
                     )
                 )
-                trajectory_test = trajectory_test_result.first()
+                all_trajectory_test = all_trajectory_test_result.first()
                 
-                # Если тест из траектории, но этап закрыт - проверяем источник доступа
-                if trajectory_test is None:
-                    # Проверяем, входит ли тест в траекторию вообще (для диагностики)
-                    all_trajectory_test_result = await session.execute(
-                        select(session_tests.c.test_id).join(
-                            LearningSession, LearningSession.id == session_tests.c.session_id
-                        ).join(
-                            TraineeSessionProgress, TraineeSessionProgress.session_id == LearningSession.id
-                        ).join(
-                            TraineeStageProgress, TraineeSessionProgress.stage_progress_id == TraineeStageProgress.id
-                        ).where(
-                            TraineeStageProgress.trainee_path_id == trainee_path.id,
-                            session_tests.c.test_id == test_id
-                        )
-                    )
-                    all_trajectory_test = all_trajectory_test_result.first()
-                    
-                    if all_trajectory_test is not None:
-                        # Тест из траектории, но этап закрыт
-                        # Проверяем источник доступа: если доступ через рассылку - разрешаем
-                        if access.granted_by_id:  # Доступ через рассылку от рекрутера
-                            logger.info(f"Доступ к траекторному тесту {test_id} разрешен через рассылку для стажера {user_id}")
-                            return True
-                        else:
-                            # Доступ через наставника, но этап закрыт - запрещаем
-                            logger.warning(f"Доступ к тесту {test_id} запрещен: этап закрыт для стажера {user_id}")
-                            return False
-            
-            return True
+                if all_trajectory_test is not None:
+                    # Тест из траектории, но этап закрыт
+                    # Проверяем источник доступа: если доступ через рассылку - разрешаем
+                    if access.granted_by_id:  # Доступ через рассылку от рекрутера
+                        logger.info(f"Доступ к траекторному тесту {test_id} разрешен через рассылку для стажера {user_id}")
+                        return True
+                    else:
+                        # Доступ через наставника, но этап закрыт - запрещаем
+                        logger.warning(f"Доступ к тесту {test_id} запрещен: этап закрыт для стажера {user_id}")
+                        return False
         
-        # Для сотрудников - проверяем доступ через тесты от рекрутера
-        elif "Сотрудник" in role_names:
-            # Проверяем, что тест создан рекрутером
-            test = await get_test_by_id(session, test_id)
-            if not test:
-                return False
-                
-            # Получаем создателя теста
-            creator = await get_user_by_id(session, test.creator_id)
-            if not creator:
-                return False
-                
-            creator_roles = await get_user_roles(session, creator.id)
-            creator_role_names = [role.name for role in creator_roles]
+        return True
+
+    # Для сотрудников - проверяем доступ через тесты от рекрутера
+    elif "Сотрудник" in role_names:
+        # Проверяем, что тест создан рекрутером
+        test = await get_test_by_id(session, test_id)
+        if not test:
+            return False
             
-            # Доступ есть, если тест создан рекрутером
-            return "Рекрутер" in creator_role_names
-        
-        # Для других ролей (наставники, рекрутеры) - полный доступ
-        else:
-            return True
+        # Получаем создателя теста
+        creator = await get_user_by_id(session, test.creator_id)
+        if not creator:
+            return False
             
-    except Exception as e:
-        logger.error(f"Ошибка проверки доступа к тесту: {e}")
-        return False
+        creator_roles = await get_user_roles(session, creator.id)
+        creator_role_names = [role.name for role in creator_roles]
+
+        # Доступ есть, если тест создан рекрутером
+        return "Рекрутер" in creator_role_names
+
+    # Для других ролей (наставники, рекрутеры) - полный доступ
+    else:
+        return True
+
 
 async def get_user_test_result(session: AsyncSession, user_id: int, test_id: int) -> Optional[TestResult]:
     """Получение последнего результата конкретного теста пользователя"""
-    try:
-        result = await session.execute(
-            select(TestResult).where(
-                TestResult.user_id == user_id,
-                TestResult.test_id == test_id
-            ).order_by(TestResult.created_date.desc())
-        )
-        return result.scalars().first()  # Возвращаем первый (самый новый) результат
-    except Exception as e:
-        logger.error(f"Ошибка получения результата теста пользователя: {e}")
-        return None
+    result = await session.execute(
+        select(TestResult).where(
+            TestResult.user_id == user_id,
+            TestResult.test_id == test_id
+        ).order_by(TestResult.created_date.desc())
+    )
+    return result.scalars().first()  # Возвращаем первый (самый новый) результат
 
 async def get_user_test_attempts_count(session: AsyncSession, user_id: int, test_id: int) -> int:
     """Подсчет количества попыток прохождения теста пользователем"""
-    try:
-        result = await session.execute(
-            select(func.count()).select_from(TestResult).where(
-                TestResult.user_id == user_id,
-                TestResult.test_id == test_id
-            )
-        )
-        return result.scalar() or 0
-    except Exception as e:
-        logger.error(f"Ошибка подсчета попыток теста: {e}")
-        return 0
+    result = await session.execute(_STMT_TEST_ATTEMPTS_COUNT, {"uid": user_id, "tid": test_id})
+    return result.scalar() or 0
 
 async def can_user_take_test(session: AsyncSession, user_id: int, test_id: int) -> tuple[bool, str]:
     """
     Проверяет, может ли пользователь пройти тест с учетом лимитов и пройденных тестов
     Возвращает: (можно_ли_проходить, сообщение_об_ошибке)
     """
-    try:
-        # Получаем тест
-        test = await get_test_by_id(session, test_id)
-        if not test:
-            return False, "Тест не найден"
-        
-        # Проверяем лимит попыток, если он установлен (max_attempts > 0)
-        # По умолчанию max_attempts = 0 (бесконечные попытки)
-        if test.max_attempts > 0:
-            attempts_count = await get_user_test_attempts_count(session, user_id, test_id)
-            if attempts_count >= test.max_attempts:
-                return False, f"Превышен лимит попыток ({attempts_count}/{test.max_attempts})"
-        
-        # Для бесконечных попыток (max_attempts = 0) всегда разрешаем прохождение
-        # Пользователь может пересдавать тест для улучшения результата
-        return True, ""
-    except Exception as e:
-        logger.error(f"Ошибка проверки возможности прохождения теста: {e}")
-        return False, "Ошибка проверки доступа"
+    # Лимит попыток теста и число попыток пользователя одним запросом
+    attempts_subquery = (
+        select(func.count())
+        .select_from(TestResult)
+        .where(TestResult.user_id == user_id, TestResult.test_id == Test.id)
+        .scalar_subquery()
+    )
+    result = await session.execute(
+        select(Test.max_attempts, attempts_subquery).where(Test.id == test_id)
+    )
+    row = result.first()
+    if not row:
+        return False, "Тест не найден"
+    max_attempts, attempts_count = row
+
+    # Проверяем лимит попыток, если он установлен (max_attempts > 0)
+    # По умолчанию max_attempts = 0 (бесконечные попытки)
+    if (max_attempts or 0) > 0 and attempts_count >= max_attempts:
+        return False, f"Превышен лимит попыток ({attempts_count}/{max_attempts})"
+
+    # Для бесконечных попыток (max_attempts = 0) всегда разрешаем прохождение
+    # Пользователь может пересдавать тест для улучшения результата
+    return True, ""
 
 async def get_question_analytics(session: AsyncSession, question_id: int) -> dict:
-    """Собирает и возвращает реальную аналитику по конкретному вопросу."""
+    """Собирает и возвращает реальную аналитику по конкретному вопросу.
     
-    # Находим все результаты, где есть информация по данному вопросу
-    all_results_query = await session.execute(
-        select(TestResult).where(TestResult.answers_details.isnot(None))
-    )
-    all_results = all_results_query.scalars().all()
+    Счетчики ведутся в question_stats при сохранении и удалении результатов,
+    поэтому чтение сводится к одной строке по первичному ключу.
+    """
+    row = (await session.execute(
+        select(QuestionStats.total, QuestionStats.correct, QuestionStats.total_time)
+        .where(QuestionStats.question_id == question_id)
+    )).first()
     
-    relevant_answers = []
-    for result in all_results:
-        # answers_details - это список словарей
-        for answer_detail in result.answers_details:
-            if answer_detail.get('question_id') == question_id:
-                relevant_answers.append(answer_detail)
-
-    if not relevant_answers:
+    if row is None or row.total <= 0:
         return {"total_answers": 0, "correct_answers": 0, "avg_time_seconds": 0}
-
-    total_answers = len(relevant_answers)
-    correct_answers = sum(1 for ans in relevant_answers if ans.get('is_correct'))
-    total_time = sum(ans.get('time_spent', 0) for ans in relevant_answers)
     
     return {
-        "total_answers": total_answers,
-        "correct_answers": correct_answers,
-        "avg_time_seconds": total_time / total_answers if total_answers > 0 else 0
+        "total_answers": row.total,
+        "correct_answers": row.correct,
+        "avg_time_seconds": row.total_time / row.total
     }
 
 async def validate_admin_token(session: AsyncSession, init_token: str) -> bool:
     """Проверка токена администратора без создания пользователя"""
-    import os
-
-    # Поддержка множественных токенов через запятую
-    admin_tokens_str = os.getenv("ADMIN_INIT_TOKENS", os.getenv("ADMIN_INIT_TOKEN", ""))
-
-    if not admin_tokens_str:
+    # Токены и лимит разбираются один раз при загрузке config
+    if not ADMIN_INIT_TOKENS:
         logger.error("Не настроены токены инициализации администратора")
         return False
 
-    # Разбираем токены
-    valid_tokens = [token.strip() for token in admin_tokens_str.split(",") if token.strip()]
-
-    if init_token not in valid_tokens:
-        logger.error(f"Неверный токен инициализации администратора. Ожидался один из: {valid_tokens}")
+    if init_token not in ADMIN_INIT_TOKENS:
+        logger.error("Неверный токен инициализации администратора")
+        logger.debug("Настроено токенов инициализации: %d", len(ADMIN_INIT_TOKENS))
         return False
 
     # Проверяем лимит администраторов (по умолчанию максимум 5)
-    max_admins = int(os.getenv("MAX_ADMINS", "5"))
-    existing_managers = await get_users_by_role(session, "Руководитель")
-    existing_recruiters = await get_users_by_role(session, "Рекрутер")
-
-    total_admins = len(existing_managers) + len(existing_recruiters)
+    max_admins = MAX_ADMINS
+    # Руководители и рекрутеры считаются одним COUNT без загрузки пользователей
+    total_admins = await session.scalar(
+        select(func.count())
+        .select_from(user_roles)
+        .join(Role, user_roles.c.role_id == Role.id)
+        .where(Role.name.in_(["Руководитель", "Рекрутер"]))
+    )
 
     if total_admins >= max_admins:
         logger.error(f"Достигнут лимит администраторов ({max_admins})")
@@ -2389,36 +3053,32 @@ async def validate_admin_token(session: AsyncSession, init_token: str) -> bool:
 async def create_admin_with_role(session: AsyncSession, admin_data: dict, role_name: str) -> bool:
     """Создание администратора с выбранной ролью"""
     try:
-        user = User(
-            tg_id=admin_data['tg_id'],
-            username=admin_data.get('username'),
-            full_name=admin_data['full_name'],
-            phone_number=admin_data['phone_number'],
-            is_active=True,  # Администраторы автоматически активны
-            is_activated=True  # Администраторы автоматически активированы
-        )
-        session.add(user)
-        await session.flush()
+        # Роль проверяется до вставки пользователя (ID роли обычно уже в кэше)
+        role_id = await get_role_id(session, role_name)
+        if role_id is None:
+            raise ValueError(f"Роль {role_name} не найдена")
 
-        role_result = await session.execute(
-            select(Role).where(Role.name == role_name)
+        user_id = await session.scalar(
+            insert(User).values(
+                tg_id=admin_data['tg_id'],
+                username=admin_data.get('username'),
+                full_name=admin_data['full_name'],
+                phone_number=admin_data['phone_number'],
+                is_active=True,  # Администраторы автоматически активны
+                is_activated=True  # Администраторы автоматически активированы
+            ).returning(User.id)
         )
-        role = role_result.scalar_one()
 
-        stmt = insert(user_roles).values(
-            user_id=user.id,
-            role_id=role.id
-        )
-        await session.execute(stmt)
+        await session.execute(insert(user_roles).values(user_id=user_id, role_id=role_id))
 
         await session.commit()
 
-        logger.info(f"Администратор {user.id} создан с ролью {role_name} и автоматически активирован")
+        logger.info(f"Администратор {user_id} создан с ролью {role_name} и автоматически активирован")
         return True
 
-    except Exception as e:
+    except Exception:
         await session.rollback()
-        logger.error(f"Ошибка создания администратора: {e}")
+        logger.exception("Ошибка создания администратора")
         return False
 
 
@@ -2435,35 +3095,45 @@ async def create_initial_admin_with_token(session: AsyncSession, admin_data: dic
 # ФУНКЦИИ ДЛЯ УВЕДОМЛЕНИЙ
 # =================================
 
-async def send_notification_about_new_test(session: AsyncSession, bot, trainee_id: int, test_id: int, granted_by_id: int):
-    """Отправка уведомления стажеру о назначении нового теста"""
+async def _load_test_notification_data(trainee_ids, test_id: int, granted_by_id: int) -> tuple:
+    """Пользователи (одним запросом) и тест для уведомлений о тесте: (users, test)"""
+    return await gather_in_sessions(
+        lambda s: get_cached_users_by_ids(s, {*trainee_ids, granted_by_id}),
+        lambda s: get_test_by_id(s, test_id),
+    )
+
+
+async def _notify_test_access(bot, trainee_ids: List[int], test_id: int, granted_by_id: int):
+    """Фоновая отправка уведомлений о доступе к тесту
+    
+    Тест и все пользователи загружаются один раз на всю выдачу.
+    """
+    users, test = await _load_test_notification_data(trainee_ids, test_id, granted_by_id)
+    with bulk_sending():
+        for trainee_id in trainee_ids:
+            await send_notification_about_new_test(bot, trainee_id, test_id, granted_by_id, users=users, test=test)
+
+
+@deduplicated_notification("test", "trainee_id", "test_id")
+async def send_notification_about_new_test(bot, trainee_id: int, test_id: int, granted_by_id: int,
+                                           users: dict = None, test: Optional[Test] = None):
+    """Отправка уведомления стажеру о назначении нового теста
+    
+    users ({id: User}) и test можно передать заранее загруженными при массовой
+    отправке; иначе они загружаются здесь.
+    """
     try:
-        # Получаем данные о стажере
-        trainee = await get_user_by_id(session, trainee_id)
-        if not trainee:
-            logger.error(f"Стажер с ID {trainee_id} не найден")
-            return False
-            
-        # Получаем данные о тесте
-        test = await get_test_by_id(session, test_id)
-        if not test:
-            logger.error(f"Тест с ID {test_id} не найден")
-            return False
-            
-        # Получаем данные о наставнике
-        mentor = await get_user_by_id(session, granted_by_id)
-        if not mentor:
-            logger.error(f"Наставник с ID {granted_by_id} не найден")
+        if users is None or test is None:
+            users, test = await _load_test_notification_data([trainee_id], test_id, granted_by_id)
+        trainee, mentor = users.get(trainee_id), users.get(granted_by_id)
+        if not all((trainee, test, mentor)):
+            logger.error(f"Не найдены данные для уведомления о тесте: стажер {trainee_id}, тест {test_id}, наставник {granted_by_id}")
             return False
             
-        # Получаем название этапа, если есть
-        stage_name = None
-        if test.stage_id:
-            stage = await get_stage_by_id(session, test.stage_id)
-            if stage:
-                stage_name = stage.name
-        
-        await send_test_notification(
+        # Этап загружается вместе с тестом
+        stage_name = test.stage.name if test.stage else None
+        
+        return await send_test_notification(
             bot=bot,
             trainee_tg_id=trainee.tg_id,
             test_name=test.name,
@@ -2472,77 +3142,177 @@ async def send_notification_about_new_test(session: AsyncSession, bot, trainee_i
             stage_name=stage_name,
             test_id=test_id
         )
-        return True
     except Exception as e:
         logger.error(f"Ошибка при отправке уведомления о новом тесте: {e}")
         return False
 
-async def send_notification_about_mentor_assignment(session: AsyncSession, bot, trainee_id: int, mentor_id: int, assigned_by_id: int):
-    """Отправка уведомления стажеру о назначении наставника"""
-    try:
-        # Получаем данные о стажере
-        trainee = await get_user_by_id(session, trainee_id)
-        if not trainee:
-            logger.error(f"Стажер с ID {trainee_id} не найден")
-            return False
-            
-        # Получаем данные о наставнике
-        mentor = await get_user_by_id(session, mentor_id)
-        if not mentor:
-            logger.error(f"Наставник с ID {mentor_id} не найден")
-            return False
-            
-        # Получаем данные о том, кто назначил
-        assigned_by = await get_user_by_id(session, assigned_by_id)
-        if not assigned_by:
-            logger.error(f"Пользователь назначивший с ID {assigned_by_id} не найден")
-            return False
-        
-        await send_mentor_assignment_notification(
-            bot=bot,
-            trainee_tg_id=trainee.tg_id,
-            mentor_tg_id=mentor.tg_id,
-            mentor_name=mentor.full_name,
-            mentor_phone=mentor.phone_number,
-            mentor_username=mentor.username,
-            assigned_by_name=assigned_by.full_name,
-            trainee_internship_object=trainee.internship_object.name if trainee.internship_object else None,
-            trainee_work_object=trainee.work_object.name if trainee.work_object else None,
-            mentor_work_object=mentor.work_object.name if mentor.work_object else None
-        )
-        return True
-    except Exception as e:
-        logger.error(f"Ошибка при отправке уведомления о назначении наставника: {e}")
-        return False
+async def _notify_mentor_assignment(bot, trainee_id: int, mentor_id: int, assigned_by_id: int):
+    """Фоновая параллельная отправка уведомлений стажёру и наставнику
+    
+    Каждое уведомление работает в своей сессии, так как одну AsyncSession
+    нельзя использовать из нескольких корутин одновременно.
+    """
+    async def notify_trainee():
+        await send_notification_about_mentor_assignment(bot, trainee_id, mentor_id, assigned_by_id)
+    
+    async def notify_mentor():
+        async with async_session() as session:
+            await send_notification_about_new_trainee(session, bot, mentor_id, trainee_id, assigned_by_id)
+    
+    results = await asyncio.gather(notify_trainee(), notify_mentor(), return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error(f"Ошибка уведомления о назначении наставника стажёру {trainee_id}: {result}")
+
+
+@deduplicated_notification("mentor", "trainee_id", "mentor_id")
+async def send_notification_about_mentor_assignment(bot, trainee_id: int, mentor_id: int, assigned_by_id: int):
+    """Отправка уведомления стажеру о назначении наставника"""
+    try:
+        # Стажер, наставник и назначивший загружаются одним запросом в короткой
+        # собственной сессии, чтобы не держать соединение во время запроса к Telegram
+        async with async_session() as session:
+            users = await get_cached_users_by_ids(session, {trainee_id, mentor_id, assigned_by_id})
+        trainee, mentor, assigned_by = users.get(trainee_id), users.get(mentor_id), users.get(assigned_by_id)
+        if not all((trainee, mentor, assigned_by)):
+            logger.error(f"Не найдены участники назначения наставника: стажер {trainee_id}, наставник {mentor_id}, назначивший {assigned_by_id}")
+            return False
+        
+        return await send_mentor_assignment_notification(
+            bot=bot,
+            trainee_tg_id=trainee.tg_id,
+            mentor_tg_id=mentor.tg_id,
+            mentor_name=mentor.full_name,
+            mentor_phone=mentor.phone_number,
+            mentor_username=mentor.username,
+            assigned_by_name=assigned_by.full_name,
+            trainee_internship_object=trainee.internship_object.name if trainee.internship_object else None,
+            trainee_work_object=trainee.work_object.name if trainee.work_object else None,
+            mentor_work_object=mentor.work_object.name if mentor.work_object else None
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при отправке уведомления о назначении наставника: {e}")
+        return False
+
+# Шаблоны текстов уведомлений разбираются один раз; при отправке подставляются
+# только изменяемые части через str.format
+_NEW_TEST_TEXT = """🚨Появился новый тест для прохождения!
+Можно открыть его из раздела «Мои тесты» и начать, когда тебе будет удобно."""
+
+_MENTOR_ASSIGNED_TEXT = """🎯 <b>Тебе назначен наставник!</b>
+
+👨‍🏫 <b>Твой наставник:</b> {mentor_name}
+
+📋 <b>Контактная информация:</b>
+{contact_info}{assigned_info}{objects_info}
+
+💡 <b>Что дальше?</b>
+• Свяжитесь с наставником для знакомства
+• Обсудите план обучения и цели стажировки
+• Задавайте вопросы и просите помощь при необходимости
+• Наставник поможет тебе с тестами и заданиями
+
+🎯 <b>Удачи в обучении!</b>"""
+
+_NEW_TRAINEE_FOR_MENTOR_TEXT = """‼️<b>Тебе назначен новый стажёр!</b>
+
+
+<b>{trainee_name}</b>
+
+
+<b>Телефон:</b> {trainee_phone}
+<b>Username:</b> {username_text}
+<b>Номер:</b> #{trainee_number}
+<b>Дата регистрации:</b> {trainee_registration_date}
+
+
+━━━━━━━━━━━━
+
+
+🗂️ <b>Статус:</b>
+<b>Группа:</b> {group_name}
+<b>Роль:</b> {role_name}
+
+
+━━━━━━━━━━━━
+
+
+📍 <b>Объект:</b>
+{objects_info}
+
+
+Теперь свяжись со стажером, согласуй план обучение, выдай доступ к тестам, помогай и отслеживай прогресс. Успехов в наставничестве!"""
+
+_NEW_TRAINEE_FOR_RECRUITER_TEXT = """🎉 <b>Новый стажёр зарегистрировался!</b>
+
+👤 <b>Стажёр:</b> {trainee_name}
+
+📋 <b>Контактная информация:</b>
+{contact_info}
+
+💡 <b>Рекомендуемые действия:</b>
+• Свяжитесь со стажёром для знакомства
+• Назначьте подходящего наставника
+• Предоставьте доступ к начальным тестам
+• Проведите вводный инструктаж
 
-async def send_test_notification(bot, trainee_tg_id: int, test_name: str, mentor_name: str, test_description: str = None, stage_name: str = None, test_id: int = None):
-    """Отправка уведомления стажеру о назначении нового теста"""
-    try:
-        notification_text = """🚨Появился новый тест для прохождения!
-Можно открыть его из раздела «Мои тесты» и начать, когда тебе будет удобно."""
+⚡ <b>Быстрые действия:</b>"""
 
-        from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-        
-        # Создаем клавиатуру с кнопками
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="🚀 Перейти к тесту", callback_data=f"take_test:{test_id}")],
-            [InlineKeyboardButton(text="📋 Мои тесты", callback_data="my_broadcast_tests_shortcut")],
-            [InlineKeyboardButton(text="🏠 Главное меню", callback_data="main_menu")]
-        ]) if test_id else None
-        
+# Постоянные строки клавиатур уведомлений создаются один раз при импорте модуля
+_MY_TESTS_ROW = [InlineKeyboardButton(text="📋 Мои тесты", callback_data="my_broadcast_tests_shortcut")]
+_MAIN_MENU_ROW = [InlineKeyboardButton(text="🏠 Главное меню", callback_data="main_menu")]
+_TRAJECTORY_TESTS_ROW = [InlineKeyboardButton(text="🗺️ Тесты траектории", callback_data="trajectory_tests_shortcut")]
+_MY_MENTOR_INFO_ROW = [InlineKeyboardButton(text="👨‍🏫 Информация о наставнике", callback_data="my_mentor_info")]
+_MY_TRAINEES_ROW = [InlineKeyboardButton(text="👥 Мои стажёры", callback_data="my_trainees")]
+_ASSIGN_TRAJECTORY_ROW = [InlineKeyboardButton(text="🗺️ Назначить траекторию", callback_data="assign_trajectory")]
+_RECRUITER_NEW_TRAINEE_ROWS = [
+    [InlineKeyboardButton(text="👨‍🏫 Назначить наставника", callback_data="assign_mentor")],
+    [InlineKeyboardButton(text="👥 Список новых стажёров", callback_data="new_trainees_list")],
+    [InlineKeyboardButton(text="📊 Предоставить доступ к тестам", callback_data="grant_test_access")]
+]
+
+
+def _contact_info(phone: str, username: str = None) -> str:
+    """Блок контактов (телефон и Telegram) для текстов уведомлений"""
+    telegram = f"@{username}" if username else "не указан"
+    return f"📞 <b>Телефон:</b> {phone}\n📧 <b>Telegram:</b> {telegram}"
+
+
+def _write_to_row(text: str, tg_id: int = None, username: str = None) -> list:
+    """Строка клавиатуры с кнопкой «написать»: по tg_id, иначе по username"""
+    if tg_id:
+        return [[InlineKeyboardButton(text=text, url=f"tg://user?id={tg_id}")]]
+    if username:
+        return [[InlineKeyboardButton(text=text, url=f"https://t.me/{username}")]]
+    return []
+
+
+async def _send_notification(bot, chat_id: int, text: str, keyboard_rows: list, description: str) -> bool:
+    """Общая отправка уведомления: HTML-текст, клавиатура и журналирование результата"""
+    try:
         await bot.send_message(
-            chat_id=trainee_tg_id,
-            text=notification_text,
+            chat_id=chat_id,
+            text=text,
             parse_mode="HTML",
-            reply_markup=keyboard
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard_rows) if keyboard_rows else None
         )
-        logger.info(f"Уведомление о тесте '{test_name}' отправлено стажеру {trainee_tg_id}")
+        logger.info(f"Уведомление ({description}) отправлено {chat_id}")
         return True
     except Exception as e:
-        logger.error(f"Ошибка отправки уведомления стажеру {trainee_tg_id}: {e}")
+        logger.error(f"Ошибка отправки уведомления ({description}) пользователю {chat_id}: {e}")
         return False
 
 
+async def send_test_notification(bot, trainee_tg_id: int, test_name: str, mentor_name: str, test_description: str = None, stage_name: str = None, test_id: int = None):
+    """Отправка уведомления стажеру о назначении нового теста"""
+    keyboard_rows = [
+        [InlineKeyboardButton(text="🚀 Перейти к тесту", callback_data=f"take_test:{test_id}")],
+        _MY_TESTS_ROW,
+        _MAIN_MENU_ROW
+    ] if test_id else []
+    return await _send_notification(bot, trainee_tg_id, _NEW_TEST_TEXT, keyboard_rows, f"тест '{test_name}'")
+
+
 async def send_broadcast_notification(bot, user_tg_id: int, broadcast_script: str, 
                                      broadcast_photos: list, broadcast_material_id: int = None, 
                                      test_id: int = None, broadcast_docs: list | None = None) -> bool:
@@ -2561,8 +3331,6 @@ async def send_broadcast_notification(bot, user_tg_id: int, broadcast_script: st
         bool: True если успешно, False если ошибка
     """
     try:
-        from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, InputMediaPhoto, InputMediaDocument
-        
         # 1. Если есть фото/документы-превью - отправляем медиагруппы
         photos = []
         docs = []
@@ -2614,113 +3382,62 @@ async def send_broadcast_notification(bot, user_tg_id: int, broadcast_script: st
 
 async def send_mentor_assignment_notification(bot, trainee_tg_id: int, mentor_tg_id: int, mentor_name: str, mentor_phone: str, mentor_username: str = None, assigned_by_name: str = None, trainee_internship_object: str = None, trainee_work_object: str = None, mentor_work_object: str = None):
     """Отправка уведомления стажеру о назначении наставника"""
-    try:
-        # Формируем контактную информацию наставника
-        contact_info = f"📞 <b>Телефон:</b> {mentor_phone}"
-        if mentor_username:
-            contact_info += f"\n📧 <b>Telegram:</b> @{mentor_username}"
-        else:
-            contact_info += f"\n📧 <b>Telegram:</b> не указан"
-
-        assigned_info = f"\n👤 <b>Назначил:</b> {assigned_by_name}" if assigned_by_name else ""
-
-        # Формируем информацию об объектах
-        objects_info = ""
-        if trainee_internship_object or trainee_work_object:
-            objects_info = "\n🏢 <b>Информация об объектах:</b>\n"
-            if trainee_internship_object:
-                objects_info += f"📍<b>1️⃣Объект стажировки:</b> {trainee_internship_object}\n"
-            if trainee_work_object:
-                objects_info += f"📍<b>2️⃣Объект работы:</b> {trainee_work_object}\n"
-            if mentor_work_object:
-                objects_info += f"📍<b>Объект работы наставника:</b> {mentor_work_object}"
-
-        notification_text = f"""🎯 <b>Тебе назначен наставник!</b>
-
-👨‍🏫 <b>Твой наставник:</b> {mentor_name}
-
-📋 <b>Контактная информация:</b>
-{contact_info}{assigned_info}{objects_info}
-
-💡 <b>Что дальше?</b>
-• Свяжитесь с наставником для знакомства
-• Обсудите план обучения и цели стажировки
-• Задавайте вопросы и просите помощь при необходимости
-• Наставник поможет тебе с тестами и заданиями
+    assigned_info = f"\n👤 <b>Назначил:</b> {assigned_by_name}" if assigned_by_name else ""
 
-🎯 <b>Удачи в обучении!</b>"""
+    # Формируем информацию об объектах: части собираются в список и склеиваются один раз
+    objects_parts = []
+    if trainee_internship_object or trainee_work_object:
+        objects_parts.append("\n🏢 <b>Информация об объектах:</b>\n")
+        if trainee_internship_object:
+            objects_parts.append(f"📍<b>1️⃣Объект стажировки:</b> {trainee_internship_object}\n")
+        if trainee_work_object:
+            objects_parts.append(f"📍<b>2️⃣Объект работы:</b> {trainee_work_object}\n")
+        if mentor_work_object:
+            objects_parts.append(f"📍<b>Объект работы наставника:</b> {mentor_work_object}")
+
+    notification_text = _MENTOR_ASSIGNED_TEXT.format(
+        mentor_name=mentor_name,
+        contact_info=_contact_info(mentor_phone, mentor_username),
+        assigned_info=assigned_info,
+        objects_info="".join(objects_parts)
+    )
 
-        # Создаем клавиатуру с полезными кнопками
-        keyboard_buttons = []
-        
-        # Кнопка для связи с наставником (всегда показываем)
-        keyboard_buttons.append([
-            InlineKeyboardButton(
-                text="💬 Написать наставнику", 
-                url=f"tg://user?id={mentor_tg_id}"  # Используем tg://user для прямого сообщения
-            )
-        ])
-        
-        keyboard_buttons.extend([
-            [InlineKeyboardButton(text="🗺️ Тесты траектории", callback_data="trajectory_tests_shortcut")],
-            [InlineKeyboardButton(text="👨‍🏫 Информация о наставнике", callback_data="my_mentor_info")]
-        ])
-        
-        keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
-        
-        await bot.send_message(
-            chat_id=trainee_tg_id,
-            text=notification_text,
-            parse_mode="HTML",
-            reply_markup=keyboard
-        )
-        logger.info(f"Уведомление о назначении наставника '{mentor_name}' отправлено стажеру {trainee_tg_id}")
-        return True
-    except Exception as e:
-        logger.error(f"Ошибка отправки уведомления о наставнике стажеру {trainee_tg_id}: {e}")
-        return False 
+    # Кнопка для связи с наставником показывается всегда
+    keyboard_rows = _write_to_row("💬 Написать наставнику", tg_id=mentor_tg_id)
+    keyboard_rows += [_TRAJECTORY_TESTS_ROW, _MY_MENTOR_INFO_ROW]
+    return await _send_notification(bot, trainee_tg_id, notification_text, keyboard_rows, f"наставник '{mentor_name}'")
 
+@deduplicated_notification("trainee", "mentor_id", "trainee_id")
 async def send_notification_about_new_trainee(session: AsyncSession, bot, mentor_id: int, trainee_id: int, assigned_by_id: int):
     """Отправка уведомления наставнику о назначении ему нового стажёра"""
     try:
-        # Получаем данные о наставнике
-        mentor = await get_user_by_id(session, mentor_id)
-        if not mentor:
-            logger.error(f"Наставник с ID {mentor_id} не найден")
-            return False
-            
-        # Получаем данные о стажере
-        trainee = await get_user_by_id(session, trainee_id)
-        if not trainee:
-            logger.error(f"Стажер с ID {trainee_id} не найден")
-            return False
-            
-        # Получаем данные о том, кто назначил
-        assigned_by = await get_user_by_id(session, assigned_by_id)
-        if not assigned_by:
-            logger.error(f"Пользователь назначивший с ID {assigned_by_id} не найден")
+        # Все независимые чтения выполняются параллельно
+        users, trainee_roles, trainee_groups, all_trainees = await gather_in_sessions(
+            lambda s: get_cached_users_by_ids(s, {mentor_id, trainee_id, assigned_by_id}),
+            lambda s: get_user_roles(s, trainee_id),
+            lambda s: get_user_groups(s, trainee_id),
+            get_all_trainees_lite,
+        )
+        mentor, trainee, assigned_by = users.get(mentor_id), users.get(trainee_id), users.get(assigned_by_id)
+        if not all((mentor, trainee, assigned_by)):
+            logger.error(f"Не найдены участники назначения наставника: стажер {trainee_id}, наставник {mentor_id}, назначивший {assigned_by_id}")
             return False
         
-        # Получаем дополнительные данные о стажере
-        trainee_roles = await get_user_roles(session, trainee_id)
-        trainee_groups = await get_user_groups(session, trainee_id)
-        
         # Получаем номер стажера (порядковый номер среди стажеров)
-        all_trainees = await get_all_trainees(session)
         trainee_number = None
         for i, t in enumerate(all_trainees, 1):
             if t.id == trainee_id:
                 trainee_number = i
                 break
         
-        await send_trainee_assignment_notification(
+        return await send_trainee_assignment_notification(
             bot=bot,
             mentor_tg_id=mentor.tg_id,
             trainee_name=trainee.full_name,
             trainee_phone=trainee.phone_number,
             trainee_tg_id=trainee.tg_id,
             trainee_username=trainee.username,
-            trainee_registration_date=trainee.registration_date.strftime('%d.%m.%Y %H:%M'),
+            trainee_registration_date=trainee.registration_date_str,
             assigned_by_name=assigned_by.full_name,
             trainee_roles=trainee_roles,
             trainee_groups=trainee_groups,
@@ -2728,195 +3445,139 @@ async def send_notification_about_new_trainee(session: AsyncSession, bot, mentor
             trainee_internship_object=trainee.internship_object.name if trainee.internship_object else None,
             trainee_work_object=trainee.work_object.name if trainee.work_object else None
         )
-        return True
     except Exception as e:
         logger.error(f"Ошибка при отправке уведомления о назначении стажёра: {e}")
         return False
 
 async def send_trainee_assignment_notification(bot, mentor_tg_id: int, trainee_name: str, trainee_phone: str, trainee_tg_id: int = None, trainee_username: str = None, trainee_registration_date: str = None, assigned_by_name: str = None, trainee_roles: list = None, trainee_groups: list = None, trainee_number: int = None, trainee_internship_object: str = None, trainee_work_object: str = None):
     """Отправка уведомления наставнику о назначении ему нового стажёра"""
-    try:
-        # Формируем основную информацию
-        role_name = trainee_roles[0].name if trainee_roles else "Стажёр"
-        group_name = trainee_groups[0].name if trainee_groups else "Не назначена"
-        
-        # Формируем username с экранированием
-        username_text = f"@{trainee_username}" if trainee_username else "не указан"
-        if trainee_username and "_" in trainee_username:
-            username_text = f"@{trainee_username.replace('_', '_')}"
-        
-        # Формируем информацию об объектах
-        objects_info = ""
-        if trainee_internship_object:
-            objects_info += f"<b>Стажировки:</b> {trainee_internship_object}\n"
-        if trainee_work_object:
-            objects_info += f"<b>Работы:</b> {trainee_work_object}"
-        
-        notification_text = f"""‼️<b>Тебе назначен новый стажёр!</b>
-
-
-<b>{trainee_name}</b>
-
-
-<b>Телефон:</b> {trainee_phone}
-<b>Username:</b> {username_text}
-<b>Номер:</b> #{trainee_number or 'N/A'}
-<b>Дата регистрации:</b> {trainee_registration_date or 'Не указана'}
-
-
-━━━━━━━━━━━━
-
-
-🗂️ <b>Статус:</b>
-<b>Группа:</b> {group_name}
-<b>Роль:</b> {role_name}
-
-
-━━━━━━━━━━━━
-
-
-📍 <b>Объект:</b>
-{objects_info}
+    # Формируем основную информацию
+    role_name = trainee_roles[0].name if trainee_roles else "Стажёр"
+    group_name = trainee_groups[0].name if trainee_groups else "Не назначена"
+
+    # Формируем информацию об объектах
+    objects_parts = []
+    if trainee_internship_object:
+        objects_parts.append(f"<b>Стажировки:</b> {trainee_internship_object}\n")
+    if trainee_work_object:
+        objects_parts.append(f"<b>Работы:</b> {trainee_work_object}")
+
+    notification_text = _NEW_TRAINEE_FOR_MENTOR_TEXT.format(
+        trainee_name=trainee_name,
+        trainee_phone=trainee_phone,
+        username_text=f"@{trainee_username}" if trainee_username else "не указан",
+        trainee_number=trainee_number or 'N/A',
+        trainee_registration_date=trainee_registration_date or 'Не указана',
+        group_name=group_name,
+        role_name=role_name,
+        objects_info="".join(objects_parts)
+    )
 
+    keyboard_rows = _write_to_row("💬 Написать стажёру", tg_id=trainee_tg_id, username=trainee_username)
+    keyboard_rows += [_MY_TRAINEES_ROW, _ASSIGN_TRAJECTORY_ROW]
+    return await _send_notification(bot, mentor_tg_id, notification_text, keyboard_rows, f"стажёр '{trainee_name}'")
 
-Теперь свяжись со стажером, согласуй план обучение, выдай доступ к тестам, помогай и отслеживай прогресс. Успехов в наставничестве!"""
+async def _notify_new_trainee_registration(bot, trainee_id: int):
+    """Фоновая отправка уведомлений о новом стажёре в собственной сессии"""
+    async with async_session() as session:
+        await send_notification_about_new_trainee_registration(session, bot, trainee_id)
 
-        # Создаем клавиатуру с полезными кнопками
-        keyboard_buttons = []
-        
-        # Кнопка для связи со стажёром (всегда показываем)
-        if trainee_tg_id:
-            keyboard_buttons.append([
-                InlineKeyboardButton(
-                    text="💬 Написать стажёру", 
-                    url=f"tg://user?id={trainee_tg_id}"
-                )
-            ])
-        elif trainee_username:
-            keyboard_buttons.append([
-                InlineKeyboardButton(
-                    text="💬 Написать стажёру", 
-                    url=f"https://t.me/{trainee_username}"
-                )
-            ])
-        
-        keyboard_buttons.extend([
-            [InlineKeyboardButton(text="👥 Мои стажёры", callback_data="my_trainees")],
-            [InlineKeyboardButton(text="🗺️ Назначить траекторию", callback_data="assign_trajectory")]
-        ])
-        
-        keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
-        
-        await bot.send_message(
-            chat_id=mentor_tg_id,
-            text=notification_text,
-            parse_mode="HTML",
-            reply_markup=keyboard
-        )
-        logger.info(f"Уведомление о назначении стажёра '{trainee_name}' отправлено наставнику {mentor_tg_id}")
-        return True
-    except Exception as e:
-        logger.error(f"Ошибка отправки уведомления о стажёре наставнику {mentor_tg_id}: {e}")
-        return False 
 
+@deduplicated_notification("registration", "trainee_id")
 async def send_notification_about_new_trainee_registration(session: AsyncSession, bot, trainee_id: int):
-    """Отправка уведомления всем рекрутерам о регистрации нового стажёра"""
+    """Отправка уведомления всем рекрутерам о регистрации нового стажёра
+
+    Текст и клавиатура одинаковы для всех рекрутеров, поэтому сообщение
+    формируется и отправляется один раз, а остальным рекрутерам копируется
+    через copy_message без повторного разбора HTML.
+    """
     try:
-        # Получаем данные о стажере
-        trainee = await get_user_by_id(session, trainee_id)
+        # Стажер и все рекрутеры загружаются параллельно
+        trainee, recruiter_tg_ids = await gather_in_sessions(
+            lambda s: get_user_by_id(s, trainee_id),
+            lambda s: get_cached_tg_ids_by_role(s, "Рекрутер"),
+        )
         if not trainee:
             logger.error(f"Стажер с ID {trainee_id} не найден")
             return False
-            
-        # Получаем всех рекрутеров
-        recruiters = await get_users_by_role(session, "Рекрутер")
-        
-        if not recruiters:
+
+        if not recruiter_tg_ids:
             logger.info("Нет рекрутеров в системе для отправки уведомлений")
             return True
-        
-        # Отправляем уведомления каждому рекрутеру
-        success_count = 0
-        for recruiter in recruiters:
+
+        notification_text, keyboard_rows = _new_trainee_registration_message(
+            trainee_name=trainee.full_name,
+            trainee_phone=trainee.phone_number,
+            trainee_username=trainee.username,
+            trainee_registration_date=trainee.registration_date_str
+        )
+        keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_rows)
+
+        # Отправляем исходное сообщение первому доступному рекрутеру
+        source_message = None
+        remaining = list(recruiter_tg_ids)
+        while remaining and source_message is None:
+            recruiter_tg_id = remaining.pop(0)
             try:
-                await send_new_trainee_registration_notification(
-                    bot=bot,
-                    recruiter_tg_id=recruiter.tg_id,
-                    trainee_name=trainee.full_name,
-                    trainee_phone=trainee.phone_number,
-                    trainee_username=trainee.username,
-                    trainee_registration_date=trainee.registration_date.strftime('%d.%m.%Y %H:%M')
+                source_message = await bot.send_message(
+                    chat_id=recruiter_tg_id,
+                    text=notification_text,
+                    parse_mode="HTML",
+                    reply_markup=keyboard
                 )
-                success_count += 1
             except Exception as e:
-                logger.error(f"Ошибка отправки уведомления рекрутеру {recruiter.tg_id}: {e}")
-        
-        logger.info(f"Уведомления о новом стажёре отправлены {success_count}/{len(recruiters)} рекрутерам")
-        return success_count > 0
-    except Exception as e:
-        logger.error(f"Ошибка при отправке уведомлений о новом стажёре: {e}")
-        return False
-
-async def send_new_trainee_registration_notification(bot, recruiter_tg_id: int, trainee_name: str, trainee_phone: str, trainee_username: str = None, trainee_registration_date: str = None):
-    """Отправка уведомления рекрутеру о регистрации нового стажёра"""
-    try:
-        # Формируем контактную информацию стажёра
-        contact_info = f"📞 <b>Телефон:</b> {trainee_phone}"
-        if trainee_username:
-            contact_info += f"\n📧 <b>Telegram:</b> @{trainee_username}"
-        else:
-            contact_info += f"\n📧 <b>Telegram:</b> не указан"
-        
-        if trainee_registration_date:
-            contact_info += f"\n📅 <b>Дата регистрации:</b> {trainee_registration_date}"
-        
-        notification_text = f"""🎉 <b>Новый стажёр зарегистрировался!</b>
-
-👤 <b>Стажёр:</b> {trainee_name}
-
-📋 <b>Контактная информация:</b>
-{contact_info}
-
-💡 <b>Рекомендуемые действия:</b>
-• Свяжитесь со стажёром для знакомства
-• Назначьте подходящего наставника
-• Предоставьте доступ к начальным тестам
-• Проведите вводный инструктаж
+                logger.error(f"Ошибка отправки уведомления рекрутеру {recruiter_tg_id}: {e}")
 
-⚡ <b>Быстрые действия:</b>"""
+        if source_message is None:
+            logger.info(f"Уведомления о новом стажёре отправлены 0/{len(recruiter_tg_ids)} рекрутерам")
+            return False
 
-        # Создаем клавиатуру с полезными кнопками
-        keyboard_buttons = []
-        
-        # Кнопка для связи со стажёром (если есть username)
-        if trainee_username:
-            keyboard_buttons.append([
-                InlineKeyboardButton(
-                    text="💬 Написать стажёру", 
-                    url=f"https://t.me/{trainee_username}"
+        async def copy_to(recruiter_tg_id: int) -> bool:
+            try:
+                await bot.copy_message(
+                    chat_id=recruiter_tg_id,
+                    from_chat_id=source_message.chat.id,
+                    message_id=source_message.message_id,
+                    reply_markup=keyboard
                 )
-            ])
-        
-        keyboard_buttons.extend([
-            [InlineKeyboardButton(text="👨‍🏫 Назначить наставника", callback_data="assign_mentor")],
-            [InlineKeyboardButton(text="👥 Список новых стажёров", callback_data="new_trainees_list")],
-            [InlineKeyboardButton(text="📊 Предоставить доступ к тестам", callback_data="grant_test_access")]
-        ])
-        
-        keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
+                return True
+            except Exception as e:
+                logger.error(f"Ошибка отправки уведомления рекрутеру {recruiter_tg_id}: {e}")
+                return False
         
-        await bot.send_message(
-            chat_id=recruiter_tg_id,
-            text=notification_text,
-            parse_mode="HTML",
-            reply_markup=keyboard
-        )
-        logger.info(f"Уведомление о новом стажёре '{trainee_name}' отправлено рекрутеру {recruiter_tg_id}")
+        # Остальным рекрутерам копируем его параллельно; число одновременных
+        # запросов, частоту и повтор после 429 обеспечивает RateLimitMiddleware
+        with bulk_sending():
+            async with asyncio.TaskGroup() as task_group:
+                tasks = [task_group.create_task(copy_to(recruiter_tg_id)) for recruiter_tg_id in remaining]
+        success_count = 1 + sum(1 for task in tasks if task.result())
+
+        logger.info(f"Уведомления о новом стажёре отправлены {success_count}/{len(recruiter_tg_ids)} рекрутерам")
         return True
     except Exception as e:
-        logger.error(f"Ошибка отправки уведомления о новом стажёре рекрутеру {recruiter_tg_id}: {e}")
+        logger.error(f"Ошибка при отправке уведомлений о новом стажёре: {e}")
         return False
 
+def _new_trainee_registration_message(trainee_name: str, trainee_phone: str, trainee_username: str = None, trainee_registration_date: str = None):
+    """Текст и клавиатура уведомления рекрутера о новом стажёре"""
+    registration_info = f"\n📅 <b>Дата регистрации:</b> {trainee_registration_date}" if trainee_registration_date else ""
+    notification_text = _NEW_TRAINEE_FOR_RECRUITER_TEXT.format(
+        trainee_name=trainee_name,
+        contact_info=_contact_info(trainee_phone, trainee_username) + registration_info
+    )
+
+    # Кнопка для связи со стажёром (если есть username)
+    keyboard_rows = _write_to_row("💬 Написать стажёру", username=trainee_username)
+    keyboard_rows += _RECRUITER_NEW_TRAINEE_ROWS
+    return notification_text, keyboard_rows
+
+async def send_new_trainee_registration_notification(bot, recruiter_tg_id: int, trainee_name: str, trainee_phone: str, trainee_username: str = None, trainee_registration_date: str = None):
+    """Отправка уведомления рекрутеру о регистрации нового стажёра"""
+    notification_text, keyboard_rows = _new_trainee_registration_message(
+        trainee_name, trainee_phone, trainee_username, trainee_registration_date
+    )
+    return await _send_notification(bot, recruiter_tg_id, notification_text, keyboard_rows, f"новый стажёр '{trainee_name}'")
+
 
 async def get_unactivated_users(session: AsyncSession) -> List[User]:
     """Получение списка неактивированных пользователей (исключая администраторов)"""
@@ -2946,12 +3607,11 @@ async def create_user_without_role(session: AsyncSession, user_data: dict, bot=N
             is_activated=False  # Пользователь неактивирован до обработки рекрутером
         )
         session.add(user)
-        await session.flush()
         await session.commit()
         
-        # Отправляем уведомления рекрутерам о новом пользователе
+        # Уведомляем рекрутеров в фоне: регистрация не ждёт ответа Telegram
         if bot:
-            await send_notification_about_new_user_registration(session, bot, user.id)
+            enqueue_notification(send_notification_about_new_user_registration, bot, user.id)
         
         logger.info(f"Пользователь {user.id} создан без роли для последующей активации")
         return user
@@ -3004,10 +3664,7 @@ async def send_notification_about_activation(session: AsyncSession, bot, user_id
 📍2️⃣Твой Объект работы: {work_object_name}"""
 
         # Создаем клавиатуру с кнопкой "Главное меню"
-        from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="🏠 Главное меню", callback_data="main_menu")]
-        ])
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[_MAIN_MENU_ROW])
 
         await bot.send_message(chat_id=user.tg_id, text=notification_text, parse_mode="HTML", reply_markup=keyboard)
         logger.info(f"Уведомление об активации отправлено пользователю {user.tg_id}")
@@ -3018,24 +3675,24 @@ async def send_notification_about_activation(session: AsyncSession, bot, user_id
         return False
 
 
-async def send_notification_about_new_user_registration(session: AsyncSession, bot, user_id: int):
+async def send_notification_about_new_user_registration(bot, user_id: int):
     """Отправка уведомления всем рекрутерам о регистрации нового пользователя"""
     try:
-        # Получаем данные о пользователе
-        user = await get_user_by_id(session, user_id)
+        # Пользователь и Telegram ID рекрутеров читаются в короткой собственной
+        # сессии, которая закрывается до начала рассылки
+        async with async_session() as session:
+            user = await get_user_by_id(session, user_id)
+            recruiter_tg_ids = await get_cached_tg_ids_by_role(session, "Рекрутер") if user else None
         if not user:
             logger.error(f"Пользователь с ID {user_id} не найден")
             return False
-            
-        # Получаем всех рекрутеров
-        recruiters = await get_users_by_role(session, "Рекрутер")
         
-        if not recruiters:
+        if not recruiter_tg_ids:
             logger.info("Нет рекрутеров в системе для отправки уведомлений")
             return True
             
         # Формируем текст уведомления
-        registration_date = user.registration_date.strftime('%d.%m.%Y %H:%M') if user.registration_date else "Не указана"
+        registration_date = user.registration_date_str or "Не указана"
         
         notification_text = f"""‼️<b>Новый пользователь</b>
 
@@ -3046,23 +3703,22 @@ async def send_notification_about_new_user_registration(session: AsyncSession, b
 ⚠️<b>Требует активации!</b> Используй список "Новые пользователи" для назначения роли, группы и объектов"""
 
         # Создаем инлайн клавиатуру с кнопкой "Новые пользователи"
-        from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="Новые пользователи", callback_data="show_new_users")]
         ])
 
         # Отправляем уведомления всем рекрутерам
-        for recruiter in recruiters:
+        for recruiter_tg_id in recruiter_tg_ids:
             try:
                 await bot.send_message(
-                    chat_id=recruiter.tg_id,
+                    chat_id=recruiter_tg_id,
                     text=notification_text,
                     parse_mode="HTML",
                     reply_markup=keyboard
                 )
-                logger.info(f"Уведомление о новом пользователе отправлено рекрутеру {recruiter.tg_id}")
+                logger.info(f"Уведомление о новом пользователе отправлено рекрутеру {recruiter_tg_id}")
             except Exception as e:
-                logger.error(f"Ошибка отправки уведомления рекрутеру {recruiter.tg_id}: {e}")
+                logger.error(f"Ошибка отправки уведомления рекрутеру {recruiter_tg_id}: {e}")
                 continue
                 
         return True
@@ -3328,11 +3984,8 @@ async def update_user_role(session: AsyncSession, user_id: int, new_role_name: s
             return True
         
         # Получаем новую роль
-        role_result = await session.execute(
-            select(Role).where(Role.name == new_role_name)
-        )
-        new_role = role_result.scalar_one_or_none()
-        if not new_role:
+        new_role_id = await get_role_id(session, new_role_name)
+        if new_role_id is None:
             logger.error(f"Роль {new_role_name} не найдена")
             return False
         
@@ -3415,11 +4068,9 @@ async def update_user_role(session: AsyncSession, user_id: int, new_role_name: s
             
             # КРИТИЧЕСКОЕ ИСПРАВЛЕНИЕ: Очищаем все результаты тестов при становлении стажером
             # Это необходимо, чтобы при назначении траектории индикация была правильной
-            deleted_results = await session.execute(
-                delete(TestResult).where(TestResult.user_id == user_id)
-            )
-            if deleted_results.rowcount > 0:
-                logger.info(f"Очищено {deleted_results.rowcount} результатов тестов при смене роли на Стажер")
+            deleted_results = await delete_test_results(session, TestResult.user_id == user_id)
+            if deleted_results > 0:
+                logger.info(f"Очищено {deleted_results} результатов тестов при смене роли на Стажер")
             
         # Удаляем старую роль
         if user.roles:
@@ -3427,7 +4078,7 @@ async def update_user_role(session: AsyncSession, user_id: int, new_role_name: s
             await session.execute(delete_stmt)
             
         # Добавляем новую роль
-        insert_stmt = insert(user_roles).values(user_id=user_id, role_id=new_role.id)
+        insert_stmt = insert(user_roles).values(user_id=user_id, role_id=new_role_id)
         await session.execute(insert_stmt)
         
         # Обновляем дату назначения роли
@@ -3976,7 +4627,6 @@ async def send_notification_about_data_change(session: AsyncSession, bot, user_i
 ⚠️{new_value}"""
 
         # Создаем клавиатуру с кнопкой "Перезагрузка" для ролевых уведомлений
-        from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
         if field_name in ["РОЛЬ", "ГРУППА", "ОБЪЕКТ СТАЖИРОВКИ", "ОБЪЕКТ РАБОТЫ"]:
             keyboard = InlineKeyboardMarkup(inline_keyboard=[
                 [InlineKeyboardButton(text="🔄 Перезагрузка", callback_data="reload_menu")]
@@ -3998,9 +4648,7 @@ async def migrate_new_tables():
     try:
         logger.info("Начинаем миграцию новых таблиц для траекторий...")
         async with engine.begin() as conn:
-            # Создаем новые таблицы если их нет
-            await conn.run_sync(Base.metadata.create_all)
-            
+            # Новые таблицы к этому моменту уже созданы в init_db
             # Добавляем столбец role_assigned_date если его нет
             try:
                 await conn.execute(text("""
@@ -4060,6 +4708,15 @@ async def migrate_new_tables():
                 # logger.info("✅ tests.material_type добавлен")  # Миграция применена
             except Exception as e:
                 logger.info(f"tests.material_type уже существует или ошибка: {e}")
+            
+            # Индексы из моделей: create_all не добавляет их в уже существующие таблицы
+            for table in Base.metadata.tables.values():
+                for index in table.indexes:
+                    try:
+                        async with conn.begin_nested():
+                            await conn.execute(CreateIndex(index, if_not_exists=True))
+                    except Exception as e:
+                        logger.warning(f"Не удалось создать индекс {index.name}: {e}")
                 
         # logger.info("✅ Миграция новых таблиц для траекторий ЗАВЕРШЕНА УСПЕШНО")  # Миграции выполнены
     except Exception as e:
@@ -4372,7 +5029,7 @@ async def get_all_learning_paths(session: AsyncSession) -> List[LearningPath]:
 async def get_learning_path_by_id(session: AsyncSession, path_id: int) -> Optional[LearningPath]:
     """Получение траектории по ID с полными данными"""
     try:
-        result = await session.execute(
+        return await session.scalar(
             select(LearningPath)
             .options(
                 selectinload(LearningPath.stages)
@@ -4384,7 +5041,6 @@ async def get_learning_path_by_id(session: AsyncSession, path_id: int) -> Option
             )
             .where(LearningPath.id == path_id)
         )
-        return result.scalar_one_or_none()
         
     except Exception as e:
         logger.error(f"Ошибка получения траектории {path_id}: {e}")
@@ -4435,12 +5091,11 @@ async def deactivate_learning_path(session: AsyncSession, path_id: int) -> bool:
 async def get_attestation_by_id(session: AsyncSession, attestation_id: int) -> Optional[Attestation]:
     """Получение аттестации по ID с вопросами"""
     try:
-        result = await session.execute(
+        return await session.scalar(
             select(Attestation)
             .options(selectinload(Attestation.questions))
             .where(Attestation.id == attestation_id)
         )
-        return result.scalar_one_or_none()
 
     except Exception as e:
         logger.error(f"Ошибка получения аттестации {attestation_id}: {e}")
@@ -5032,31 +5687,24 @@ async def open_stage_for_trainee(session: AsyncSession, trainee_id: int, stage_i
             mentor_id = trainee_path.assigned_by_id
             logger.info(f"ДЕБАГ: Наставник ID = {mentor_id}")
 
-            # Для каждого теста в каждой сессии создаем доступ
+            # Для всех тестов всех сессий этапа создаем доступ одним upsert-запросом
             tests_granted = 0
-            for session_obj in sessions:
-                logger.info(f"ДЕБАГ: Обрабатываем сессию {session_obj.id} с {len(session_obj.tests)} тестами")
-                for test in session_obj.tests:
-                    # Проверяем, нет ли уже доступа
-                    existing_access = await session.execute(
-                        select(TraineeTestAccess).where(
-                            TraineeTestAccess.trainee_id == trainee_id,
-                            TraineeTestAccess.test_id == test.id,
-                            TraineeTestAccess.is_active == True
-                        )
+            stage_test_ids = list(dict.fromkeys(test.id for session_obj in sessions for test in session_obj.tests))
+            if stage_test_ids:
+                granted_result = await session.execute(
+                    pg_insert(TraineeTestAccess)
+                    .values([
+                        {"trainee_id": trainee_id, "test_id": test_id, "granted_by_id": mentor_id,
+                         "granted_date": datetime.now(), "is_active": True}
+                        for test_id in stage_test_ids
+                    ])
+                    .on_conflict_do_nothing(
+                        index_elements=["trainee_id", "test_id"],
+                        index_where=TraineeTestAccess.is_active == True
                     )
-                    if not existing_access.scalar_one_or_none():
-                        # Создаем новый доступ к тесту
-                        access = TraineeTestAccess(
-                            trainee_id=trainee_id,
-                            test_id=test.id,
-                            granted_by_id=mentor_id
-                        )
-                        session.add(access)
-                        tests_granted += 1
-                        logger.info(f"ДЕБАГ: Создан доступ к тесту {test.id} для стажера {trainee_id} при открытии этапа {stage_id}")
-                    else:
-                        logger.info(f"ДЕБАГ: Доступ к тесту {test.id} уже существует для стажера {trainee_id}")
+                    .returning(TraineeTestAccess.test_id)
+                )
+                tests_granted = len(granted_result.all())
             
             logger.info(f"ДЕБАГ: Предоставлен доступ к {tests_granted} тестам")
 
@@ -5096,7 +5744,6 @@ async def send_stage_opened_notification(session: AsyncSession, trainee_id: int,
         )
 
         # Создаем клавиатуру с кнопкой траектории
-        from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="Траектория обучения ⬜", callback_data="trajectory_command")]
         ])
@@ -5410,15 +6057,13 @@ async def get_session_with_tests(session: AsyncSession, session_id: int) -> Opti
     try:
         from database.models import LearningSession
 
-        result = await session.execute(
+        return await session.scalar(
             select(LearningSession)
             .options(
                 selectinload(LearningSession.tests)  # Загружаем тесты сессии
             )
             .where(LearningSession.id == session_id)
         )
-
-        return result.scalar_one_or_none()
     except Exception as e:
         logger.error(f"Ошибка получения сессии {session_id}: {e}")
         return None
@@ -5762,11 +6407,9 @@ async def change_trainee_to_employee(session: AsyncSession, trainee_id: int, att
 
         # КРИТИЧЕСКОЕ ИСПРАВЛЕНИЕ: Очищаем все результаты тестов при переходе в сотрудники
         # Это необходимо, чтобы при возможном возврате в стажеры индикация была правильной
-        deleted_results = await session.execute(
-            delete(TestResult).where(TestResult.user_id == trainee_id)
-        )
-        if deleted_results.rowcount > 0:
-            logger.info(f"Очищено {deleted_results.rowcount} результатов тестов при переходе в сотрудники")
+        deleted_results = await delete_test_results(session, TestResult.user_id == trainee_id)
+        if deleted_results > 0:
+            logger.info(f"Очищено {deleted_results} результатов тестов при переходе в сотрудники")
 
         await session.commit()
         logger.info(f"Роль стажера изменена на сотрудника для пользователя {trainee.full_name}. Траектории, наставничество и результаты тестов деактивированы.")
@@ -6041,7 +6684,7 @@ async def complete_attestation_session(session: AsyncSession, attestation_id: in
 async def get_trainee_attestation_by_id(session: AsyncSession, attestation_id: int) -> Optional[TraineeAttestation]:
     """Получение назначенной аттестации по ID"""
     try:
-        result = await session.execute(
+        return await session.scalar(
             select(TraineeAttestation)
             .options(
                 selectinload(TraineeAttestation.trainee).selectinload(User.work_object),
@@ -6052,7 +6695,6 @@ async def get_trainee_attestation_by_id(session: AsyncSession, attestation_id: i
             .where(TraineeAttestation.id == attestation_id)
             .where(TraineeAttestation.is_active == True)
         )
-        return result.scalar_one_or_none()
         
     except Exception as e:
         logger.error(f"Ошибка получения аттестации {attestation_id}: {e}")
@@ -6194,7 +6836,7 @@ async def broadcast_test_to_groups(session: AsyncSession, test_id: int, group_id
         target_roles: Список названий ролей для фильтрации получателей (опционально)
     
     Returns:
-        dict: Статистика рассылки
+        dict: Статистика рассылки, загруженный тест (test) и названия групп (group_names)
     """
     try:
         # Получаем тест (опционально)
@@ -6249,16 +6891,18 @@ async def broadcast_test_to_groups(session: AsyncSession, test_id: int, group_id
         total_sent = 0
         failed_sends = 0
         
-        # Отправляем уведомления каждому пользователю
-        for user in final_users:
-            try:
-                # Если есть тест - предоставляем доступ
-                if test_id:
-                    await grant_test_access(session, user.id, test_id, sent_by_id, bot=None)
-                
-                # Отправляем расширенное уведомление
-                if broadcast_script and bot:
-                    success = await send_broadcast_notification(
+        # Если есть тест - предоставляем доступ всем получателям одной вставкой
+        if test_id:
+            await grant_test_access_bulk(session, [user.id for user in final_users], test_id, sent_by_id)
+        
+        if broadcast_script and bot:
+            # Расширенные уведомления отправляются всем получателям параллельно:
+            # частоту запросов и паузы после 429 (retry_after) обеспечивает
+            # RateLimitMiddleware сессии бота, а сообщения одному получателю
+            # по-прежнему уходят по порядку внутри send_broadcast_notification
+            with bulk_sending():
+                results = await asyncio.gather(*(
+                    send_broadcast_notification(
                         bot=bot,
                         user_tg_id=user.tg_id,
                         broadcast_script=broadcast_script,
@@ -6267,20 +6911,29 @@ async def broadcast_test_to_groups(session: AsyncSession, test_id: int, group_id
                         test_id=test_id,
                         broadcast_docs=broadcast_docs or []
                     )
-                    if success:
-                        total_sent += 1
-                    else:
-                        failed_sends += 1
-                elif test_id and bot:
-                    # Старая логика для обратной совместимости
-                    await send_notification_about_new_test(session, bot, user.id, test_id, sent_by_id)
+                    for user in final_users
+                ), return_exceptions=True)
+            for user, result in zip(final_users, results):
+                if result is True:
                     total_sent += 1
                 else:
+                    if isinstance(result, Exception):
+                        logger.error(f"Ошибка отправки уведомления пользователю {user.id}: {result}")
                     failed_sends += 1
-                    
-            except Exception as e:
-                logger.error(f"Ошибка отправки уведомления пользователю {user.id}: {e}")
-                failed_sends += 1
+        elif test_id and bot:
+            # Старая логика для обратной совместимости: тест уже загружен выше,
+            # пользователи загружаются одним запросом, уведомления уходят последовательно
+            users = await get_cached_users_by_ids(session, {*(user.id for user in final_users), sent_by_id})
+            with bulk_sending():
+                for user in final_users:
+                    try:
+                        await send_notification_about_new_test(bot, user.id, test_id, sent_by_id, users=users, test=test)
+                        total_sent += 1
+                    except Exception as e:
+                        logger.error(f"Ошибка отправки уведомления пользователю {user.id}: {e}")
+                        failed_sends += 1
+        else:
+            failed_sends = len(final_users)
         
         # Логируем результат рассылки
         test_name = test.name if test else "без теста"
@@ -6288,6 +6941,7 @@ async def broadcast_test_to_groups(session: AsyncSession, test_id: int, group_id
         
         return {
             "success": True,
+            "test": test,
             "test_name": test.name if test else None,
             "group_names": group_names,
             "total_users": len(final_users),
@@ -6360,7 +7014,7 @@ async def get_all_knowledge_folders(session: AsyncSession) -> List[KnowledgeFold
 async def get_knowledge_folder_by_id(session: AsyncSession, folder_id: int) -> Optional[KnowledgeFolder]:
     """Получение папки базы знаний по ID"""
     try:
-        result = await session.execute(
+        folder = await session.scalar(
             select(KnowledgeFolder)
             .where(KnowledgeFolder.id == folder_id, KnowledgeFolder.is_active == True)
             .options(
@@ -6368,7 +7022,6 @@ async def get_knowledge_folder_by_id(session: AsyncSession, folder_id: int) -> O
                 selectinload(KnowledgeFolder.accessible_groups)
             )
         )
-        folder = result.scalar_one_or_none()
         
         if folder:
             logger.info(f"Найдена папка: {folder.name} (ID: {folder.id})")
@@ -6485,12 +7138,11 @@ async def create_knowledge_material(session: AsyncSession, folder_id: int, name:
 async def get_knowledge_material_by_id(session: AsyncSession, material_id: int) -> Optional[KnowledgeMaterial]:
     """Получение материала базы знаний по ID"""
     try:
-        result = await session.execute(
+        material = await session.scalar(
             select(KnowledgeMaterial)
             .where(KnowledgeMaterial.id == material_id, KnowledgeMaterial.is_active == True)
             .options(selectinload(KnowledgeMaterial.folder))
         )
-        material = result.scalar_one_or_none()
         
         if material:
             logger.info(f"Найден материал: {material.name} (ID: {material.id})")
@@ -6874,15 +7526,15 @@ async def delete_learning_path(session: AsyncSession, trajectory_id: int) -> boo
         )
         
         # 4. Удаляем только результаты тестов траектории (тесты остаются в системе)
-        await session.execute(
-            delete(TestResult)
-            .where(TestResult.test_id.in_(
+        await delete_test_results(
+            session,
+            TestResult.test_id.in_(
                 select(Test.id)
                 .select_from(Test)
                 .join(LearningSession, Test.id == LearningSession.id)
                 .join(LearningStage, LearningSession.stage_id == LearningStage.id)
                 .where(LearningStage.learning_path_id == trajectory_id)
-            ))
+            )
         )
         
         # 5. Удаляем доступы к тестам траектории (тесты остаются в системе)
@@ -6991,8 +7643,7 @@ async def delete_user(session: AsyncSession, user_id: int) -> bool:
             TraineeSessionProgress, AttestationResult, AttestationQuestionResult,
             TraineeAttestation, TraineeManager, TraineeTestAccess, Test, TestQuestion,
             Attestation, AttestationQuestion, LearningPath, LearningStage, LearningSession,
-            KnowledgeFolder, KnowledgeMaterial, Group, Object, user_roles, user_groups,
-            user_objects, session_tests
+            KnowledgeFolder, KnowledgeMaterial, Group, Object, session_tests
         )
         
         # Проверяем существование пользователя
@@ -7099,10 +7750,7 @@ async def delete_user(session: AsyncSession, user_id: int) -> bool:
         logger.info(f"Удалены TraineeTestAccess для пользователя {user_id}")
         
         # 9. Удаляем TestResult
-        await session.execute(
-            delete(TestResult)
-            .where(TestResult.user_id == user_id)
-        )
+        await delete_test_results(session, TestResult.user_id == user_id)
         logger.info(f"Удалены TestResult для пользователя {user_id}")
         
         # 10. Удаляем Mentorship
@@ -7172,26 +7820,8 @@ async def delete_user(session: AsyncSession, user_id: int) -> bool:
         )
         logger.info(f"Обнулен created_by_id для групп пользователя {user_id}")
         
-        # 18. Удаляем many-to-many связи
-        await session.execute(
-            delete(user_roles)
-            .where(user_roles.c.user_id == user_id)
-        )
-        logger.info(f"Удалены user_roles для пользователя {user_id}")
-        
-        await session.execute(
-            delete(user_groups)
-            .where(user_groups.c.user_id == user_id)
-        )
-        logger.info(f"Удалены user_groups для пользователя {user_id}")
-        
-        await session.execute(
-            delete(user_objects)
-            .where(user_objects.c.user_id == user_id)
-        )
-        logger.info(f"Удалены user_objects для пользователя {user_id}")
-        
-        # 19. Удаляем самого пользователя
+        # 18. Удаляем самого пользователя; связи user_roles, user_groups и
+        # user_objects удаляются каскадно (ON DELETE CASCADE)
         await session.execute(
             delete(User)
             .where(User.id == user_id)
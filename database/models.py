@@ -1,32 +1,39 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, BigInteger, String, Boolean, DateTime, ForeignKey, Table, Text, Float
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from typing import Optional
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, DateTime, ForeignKey, Table, Text, Float, Index
+from sqlalchemy.orm import DeclarativeBase, relationship
 from sqlalchemy.dialects.postgresql import JSONB
 
-Base = declarative_base()
+class Base(DeclarativeBase):
+    """Базовый класс моделей"""
 
 
 user_roles = Table(
     'user_roles',
     Base.metadata,
-    Column('user_id', Integer, ForeignKey('users.id'), primary_key=True),
-    Column('role_id', Integer, ForeignKey('roles.id'), primary_key=True)
+    Column('user_id', Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+    Column('role_id', Integer, ForeignKey('roles.id'), primary_key=True),
+    # PK покрывает поиск по user_id, этот индекс - выборку пользователей по роли
+    Index('ix_user_roles_role_user', 'role_id', 'user_id')
 )
 
 user_groups = Table(
     'user_groups',
     Base.metadata,
-    Column('user_id', Integer, ForeignKey('users.id'), primary_key=True),
-    Column('group_id', Integer, ForeignKey('groups.id'), primary_key=True)
+    Column('user_id', Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+    Column('group_id', Integer, ForeignKey('groups.id'), primary_key=True),
+    # PK покрывает поиск по user_id, этот индекс - выборку пользователей группы
+    Index('ix_user_groups_group_user', 'group_id', 'user_id')
 )
 
 # Ассоциативная таблица для связи many-to-many между пользователями и объектами
 user_objects = Table(
     'user_objects',
     Base.metadata,
-    Column('user_id', Integer, ForeignKey('users.id'), primary_key=True),
-    Column('object_id', Integer, ForeignKey('objects.id'), primary_key=True)
+    Column('user_id', Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+    Column('object_id', Integer, ForeignKey('objects.id'), primary_key=True),
+    # PK покрывает поиск по user_id, этот индекс - выборку пользователей объекта
+    Index('ix_user_objects_object_user', 'object_id', 'user_id')
 )
 
 class User(Base):
@@ -65,6 +72,26 @@ class User(Base):
     created_tests = relationship("Test", back_populates="creator")
     test_results = relationship("TestResult", back_populates="user")
     
+    @property
+    def primary_role(self) -> Optional[str]:
+        """Основная роль - роль с наименьшим ID (как в get_cached_user_auth); роли должны быть загружены"""
+        if not self.roles:
+            return None
+        return min(self.roles, key=lambda role: role.id).name
+    
+    @property
+    def roles_display(self) -> str:
+        """Названия ролей через запятую (роли должны быть загружены заранее)"""
+        return ", ".join(role.name for role in self.roles)
+    
+    @property
+    def registration_date_str(self) -> Optional[str]:
+        """Дата регистрации в формате ДД.ММ.ГГГГ ЧЧ:ММ (без strftime и локали)"""
+        d = self.registration_date
+        if d is None:
+            return None
+        return f"{d.day:02d}.{d.month:02d}.{d.year} {d.hour:02d}:{d.minute:02d}"
+    
     def __repr__(self):
         return f"<User(id={self.id}, tg_id={self.tg_id}, username={self.username})>"
 
@@ -88,7 +115,9 @@ role_permissions = Table(
     'role_permissions',
     Base.metadata,
     Column('role_id', Integer, ForeignKey('roles.id'), primary_key=True),
-    Column('permission_id', Integer, ForeignKey('permissions.id'), primary_key=True)
+    Column('permission_id', Integer, ForeignKey('permissions.id'), primary_key=True),
+    # PK покрывает поиск по role_id, этот индекс - выборку ролей по праву
+    Index('ix_role_permissions_permission_role', 'permission_id', 'role_id')
 )
 
 class Permission(Base):
@@ -165,6 +194,11 @@ class InternshipStage(Base):
     order_number = Column(Integer, nullable=False)
     is_active = Column(Boolean, default=True)
     created_date = Column(DateTime, default=datetime.now)
+
+    __table_args__ = (
+        # Список активных этапов по порядку номеров
+        Index('ix_internship_stages_active_order', 'order_number', postgresql_where=(is_active == True)),
+    )
     
     # Связи
     tests = relationship("Test", back_populates="stage")
@@ -225,9 +259,27 @@ class TestQuestion(Base):
     # Связи
     test = relationship("Test", back_populates="questions")
     
+    __table_args__ = (
+        # Вопросы теста по порядку номеров
+        Index('ix_test_questions_test_number', 'test_id', 'question_number'),
+    )
+    
     def __repr__(self):
         return f"<TestQuestion(id={self.id}, test_id={self.test_id}, number={self.question_number})>"
 
+class QuestionStats(Base):
+    """Накопленная статистика ответов на вопрос (обновляется при сохранении и удалении результатов)"""
+    
+    __tablename__ = 'question_stats'
+    
+    question_id = Column(Integer, ForeignKey('test_questions.id', ondelete='CASCADE'), primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
+    correct = Column(Integer, nullable=False, default=0)
+    total_time = Column(Float, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f"<QuestionStats(question_id={self.question_id}, total={self.total}, correct={self.correct})>"
+
 
 class TestResult(Base):
     """Модель результатов прохождения тестов"""
@@ -242,15 +294,28 @@ class TestResult(Base):
     is_passed = Column(Boolean, nullable=False)
     start_time = Column(DateTime, nullable=False)
     end_time = Column(DateTime, nullable=False)
-    answers = Column(Text, nullable=True)  # JSON строка с ответами пользователя
-    answers_details = Column(JSONB, nullable=True) # Детальная информация по ответам (время, правильность)
-    wrong_answers = Column(JSONB, nullable=True) # Сохранение неверных ответов
+    # Детальная информация по ответам (вопрос, ответ, время, правильность); неверные
+    # ответы и сводка ответов выводятся из неё и отдельно не хранятся
+    answers_details = Column(JSONB, nullable=True)
     created_date = Column(DateTime, default=datetime.now)
     
     # Связи
     user = relationship("User", back_populates="test_results")
     test = relationship("Test", back_populates="results")
     
+    __table_args__ = (
+        # Проверки прохождения и подсчёт попыток теста пользователем
+        Index('ix_test_results_user_test', 'user_id', 'test_id'),
+        # Список результатов пользователя (новые сверху) без обращения к таблице
+        Index('ix_test_results_user_created', user_id, created_date.desc(),
+              postgresql_include=['test_id', 'score']),
+        # Сводка результатов теста по убыванию балла
+        Index('ix_test_results_test_score', test_id, score.desc()),
+        # GIN-индекс для поиска ответов по question_id в аналитике вопросов
+        Index('ix_test_results_answers_details', 'answers_details',
+              postgresql_using='gin', postgresql_ops={'answers_details': 'jsonb_path_ops'}),
+    )
+    
     def __repr__(self):
         return f"<TestResult(id={self.id}, user_id={self.user_id}, test_id={self.test_id}, score={self.score})>"
 
@@ -273,6 +338,13 @@ class Mentorship(Base):
     trainee = relationship("User", foreign_keys=[trainee_id], back_populates="trainee_relationships")
     assigned_by = relationship("User", foreign_keys=[assigned_by_id])
 
+    __table_args__ = (
+        # Частичный индекс активных наставничеств для поиска стажеров без наставника
+        Index('ix_mentorships_active_trainee', 'trainee_id', postgresql_where=(is_active == True)),
+        # Частичный индекс активных наставничеств для списка стажеров наставника
+        Index('ix_mentorships_active_mentor', 'mentor_id', postgresql_where=(is_active == True)),
+    )
+
     def __repr__(self):
         return f"<Mentorship(id={self.id}, mentor_id={self.mentor_id}, trainee_id={self.trainee_id})>"
 
@@ -294,6 +366,12 @@ class TraineeTestAccess(Base):
     test = relationship("Test")
     granted_by = relationship("User", foreign_keys=[granted_by_id])
     
+    __table_args__ = (
+        # Не более одного активного доступа стажера к тесту (цель ON CONFLICT при выдаче)
+        Index('ux_trainee_test_access_active', 'trainee_id', 'test_id',
+              unique=True, postgresql_where=(is_active == True)),
+    )
+    
     def __repr__(self):
         return f"<TraineeTestAccess(id={self.id}, trainee_id={self.trainee_id}, test_id={self.test_id})>"
 
@@ -445,6 +523,12 @@ class TraineeManager(Base):
     assigned_date = Column(DateTime, default=datetime.now)
     is_active = Column(Boolean, default=True)
 
+    __table_args__ = (
+        # Частичные индексы активных связей для поиска руководителя стажера и стажеров руководителя
+        Index('ix_trainee_managers_active_trainee', 'trainee_id', postgresql_where=(is_active == True)),
+        Index('ix_trainee_managers_active_manager', 'manager_id', postgresql_where=(is_active == True)),
+    )
+
     # Связи
     trainee = relationship("User", foreign_keys=[trainee_id])
     manager = relationship("User", foreign_keys=[manager_id])
@@ -470,6 +554,12 @@ class TraineeAttestation(Base):
     status = Column(String, nullable=False, default='assigned')  # assigned, in_progress, completed, failed
     is_active = Column(Boolean, default=True)
 
+    __table_args__ = (
+        # Частичный индекс активных аттестаций стажера
+        Index('ix_trainee_attestations_active_trainee', 'trainee_id', 'attestation_id',
+              postgresql_where=(is_active == True)),
+    )
+
     # Связи
     trainee = relationship("User", foreign_keys=[trainee_id])
     manager = relationship("User", foreign_keys=[manager_id])
@@ -513,6 +603,11 @@ class TraineeLearningPath(Base):
     is_active = Column(Boolean, default=True)
     attestation_completed = Column(Boolean, default=False)  # Прошел ли стажер аттестацию
 
+    __table_args__ = (
+        # Частичный индекс активной траектории стажера
+        Index('ix_trainee_learning_paths_active_trainee', 'trainee_id', postgresql_where=(is_active == True)),
+    )
+
     # Связи
     trainee = relationship("User", foreign_keys=[trainee_id], back_populates="assigned_learning_paths")
     learning_path = relationship("LearningPath", back_populates="assigned_trainees")
@@ -622,4 +717,14 @@ class KnowledgeMaterial(Base):
     created_by = relationship("User", foreign_keys=[created_by_id])
     
     def __repr__(self):
-        return f"<KnowledgeMaterial(id={self.id}, name={self.name}, type={self.material_type})>" 
\ No newline at end of file
+        return f"<KnowledgeMaterial(id={self.id}, name={self.name}, type={self.material_type})>" 
+
+class SchemaVersion(Base):
+    """Версия схемы БД (одна строка) для однократных миграций данных при запуске"""
+    __tablename__ = 'schema_version'
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<SchemaVersion(version={self.version})>"
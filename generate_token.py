@@ -11,10 +11,21 @@ def generate_secure_token(length=32):
     """Генерирует безопасный токен"""
     return secrets.token_urlsafe(length)
 
+READABLE_ALPHABET = (string.ascii_letters + string.digits).encode()
+# Байты от 248 (= 62 * 4) отбрасываются, чтобы остаток от деления на 62 был равномерным
+_UNBIASED_LIMIT = len(READABLE_ALPHABET) * (256 // len(READABLE_ALPHABET))
+
 def generate_readable_token(length=24):
     """Генерирует читаемый токен (только буквы и цифры)"""
-    alphabet = string.ascii_letters + string.digits
-    return ''.join(secrets.choice(alphabet) for _ in range(length))
+    token = bytearray()
+    while len(token) < length:
+        # Случайные байты берутся одним вызовом с запасом на отброшенные значения
+        for byte in secrets.token_bytes(length * 2):
+            if byte < _UNBIASED_LIMIT:
+                token.append(READABLE_ALPHABET[byte % len(READABLE_ALPHABET)])
+                if len(token) == length:
+                    break
+    return token.decode()
 
 if __name__ == "__main__":
     import sys
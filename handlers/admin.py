@@ -1,3 +1,5 @@
+import re
+
 from aiogram import Router, F
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
@@ -6,13 +8,13 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 
 from database.db import (
-    get_all_users, get_user_by_id, get_all_roles, 
-    add_user_role, remove_user_role, get_user_roles, get_all_trainees,
-    get_user_by_tg_id, check_user_permission, get_trainee_mentor,
-    get_user_test_results, get_test_by_id
+    get_user_by_id, get_all_roles, 
+    add_user_role, remove_user_role, get_all_trainees_lite,
+    get_trainee_mentor, get_user_test_stats, get_test_by_id, get_cached_user_auth,
+    gather_in_sessions, get_cached_user_list
 )
 from keyboards.keyboards import (
-    get_user_selection_keyboard, get_user_action_keyboard, 
+    get_cached_user_selection_keyboard, get_user_action_keyboard, 
     get_role_change_keyboard, get_confirmation_keyboard
 )
 from states.states import AdminStates
@@ -21,6 +23,42 @@ from handlers.auth import check_auth
 
 router = Router()
 
+# Схемы callback_data выбора и подтверждения роли разбираются одним проходом регулярного выражения
+_SET_ROLE_RE = re.compile(r"set_role:(\d+):(.+)")
+_CONFIRM_RE = re.compile(r"confirm:(add|remove):(\d+):(.+)")
+
+# Шаблоны карточки пользователя без отступов строк: лишние пробелы не уходят в Telegram
+_USER_INFO_TEXT = """👤 <b>{title}</b>
+
+🧑 ФИО: {full_name}
+📞 Телефон: {phone_number}
+🆔 Telegram ID: {tg_id}
+👤 Username: @{username}
+📅 Дата регистрации: {registration_date}
+👑 Роли: {roles}{extra_info}"""
+
+_TRAINEE_STATS_TEXT = """
+
+<b>Статистика стажера:</b>
+👨‍🏫 Наставник: {mentor_name}
+✅ Пройдено тестов: {passed_count}/{total_count}
+📊 Средний балл: {avg_score:.2f}"""
+
+
+def _user_card(user, title: str = "Информация о пользователе", extra_info: str = "", roles: str = None):
+    """Текст и клавиатура карточки пользователя (роли должны быть загружены или переданы в roles)"""
+    user_info = _USER_INFO_TEXT.format(
+        title=title,
+        full_name=user.full_name,
+        phone_number=user.phone_number,
+        tg_id=user.tg_id,
+        username=user.username or "не указан",
+        registration_date=user.registration_date_str,
+        roles=roles if roles is not None else user.roles_display,
+        extra_info=extra_info
+    )
+    return user_info, get_user_action_keyboard(user.id)
+
 
 async def check_admin_permission(message: Message, state: FSMContext, session: AsyncSession, permission: str = "manage_users") -> bool:
     """Проверяет, имеет ли пользователь указанное право доступа """
@@ -29,14 +67,13 @@ async def check_admin_permission(message: Message, state: FSMContext, session: A
     if not is_auth:
         return False
     
-    user = await get_user_by_tg_id(session, message.from_user.id)
-    if not user:
+    # Права берутся из того же кэша, что заполнила check_auth
+    auth = await get_cached_user_auth(session, message.from_user.id)
+    if not auth:
         await message.answer("Ты не зарегистрирован в системе.")
         return False
     
-    has_permission = await check_user_permission(session, user.id, permission)
-    
-    if not has_permission:
+    if permission not in auth["permissions"]:
         await message.answer("У тебя нет прав для выполнения этой команды.")
         return False
     
@@ -52,22 +89,17 @@ async def cmd_manage_users(message: Message, state: FSMContext, session: AsyncSe
     await show_user_list(message, state, session)
 
 
-@router.message(F.text == "Управление пользователями")
-async def button_manage_users(message: Message, state: FSMContext, session: AsyncSession):
-    """Обработчик кнопки управления пользователями"""
-    await cmd_manage_users(message, state, session)
-
-
 async def show_user_list(message: Message, state: FSMContext, session: AsyncSession):
     """Отображает список пользователей с возможностью выбора"""
-    users = await get_all_users(session)
+    # Список и клавиатура кэшируются, пока пользователи не менялись
+    users = await get_cached_user_list(session)
     
     if not users:
         await message.answer("В системе пока нет зарегистрированных пользователей.")
         return
     
 
-    keyboard = get_user_selection_keyboard(users)
+    keyboard = get_cached_user_selection_keyboard(users)
     
     await message.answer(
         "Выбери пользователя для управления:",
@@ -79,6 +111,19 @@ async def show_user_list(message: Message, state: FSMContext, session: AsyncSess
     log_user_action(message.from_user.id, message.from_user.username, "opened user management panel")
 
 
+@router.callback_query(AdminStates.waiting_for_user_selection, F.data.startswith("admin_users_page:"))
+async def process_users_page(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+    """Обработчик пагинации списка пользователей"""
+    page = int(callback.data.split(':')[1])
+    
+    users = await get_cached_user_list(session)
+    
+    await callback.message.edit_reply_markup(
+        reply_markup=get_cached_user_selection_keyboard(users, page)
+    )
+    await callback.answer()
+
+
 @router.callback_query(AdminStates.waiting_for_user_selection, F.data.startswith("user:"))
 async def process_user_selection(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Обработчик выбора пользователя из списка"""
@@ -91,36 +136,23 @@ async def process_user_selection(callback: CallbackQuery, state: FSMContext, ses
         await callback.answer()
         return
     
-    user_roles = await get_user_roles(session, user.id)
-    roles_str = ", ".join([role.name for role in user_roles])
-    
+    # Роли загружаются вместе с пользователем в get_user_by_id
     extra_info = ""
-    if "Стажер" in roles_str:
-        mentor = await get_trainee_mentor(session, user.id)
-        results = await get_user_test_results(session, user.id)
-        passed_count = sum(1 for r in results if r.is_passed)
-        avg_score = sum(r.score for r in results) / len(results) if results else 0
+    if any(role.name == "Стажер" for role in user.roles):
+        # Наставник и сводка результатов (агрегат в БД) читаются параллельно
+        mentor, (total_count, passed_count, avg_score) = await gather_in_sessions(
+            lambda s: get_trainee_mentor(s, user.id),
+            lambda s: get_user_test_stats(s, user.id),
+        )
         
-        extra_info = f"""
-    <b>Статистика стажера:</b>
-    👨‍🏫 Наставник: {mentor.full_name if mentor else 'Не назначен'}
-    ✅ Пройдено тестов: {passed_count}/{len(results)}
-    📊 Средний балл: {avg_score:.2f}
-    """
-
-    user_info = f"""
-    👤 <b>Информация о пользователе</b>
-    
-    🧑 ФИО: {user.full_name}
-    📞 Телефон: {user.phone_number}
-    🆔 Telegram ID: {user.tg_id}
-    👤 Username: @{user.username or "не указан"}
-    📅 Дата регистрации: {user.registration_date.strftime('%d.%m.%Y %H:%M')}
-    👑 Роли: {roles_str}
-    {extra_info}
-    """
-
-    keyboard = get_user_action_keyboard(user.id)
+        extra_info = _TRAINEE_STATS_TEXT.format(
+            mentor_name=mentor.full_name if mentor else 'Не назначен',
+            passed_count=passed_count,
+            total_count=total_count,
+            avg_score=avg_score
+        )
+
+    user_info, keyboard = _user_card(user, extra_info=extra_info)
 
     await callback.message.edit_text(
         user_info,
@@ -182,9 +214,12 @@ async def process_change_role(callback: CallbackQuery, state: FSMContext, sessio
 async def process_set_role(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Обработчик выбора новой роли для пользователя"""
     # Извлекаем данные из callback
-    parts = callback.data.split(':')
-    user_id = int(parts[1])
-    role_name = parts[2]
+    match = _SET_ROLE_RE.match(callback.data)
+    if not match:
+        await callback.answer()
+        return
+    user_id = int(match.group(1))
+    role_name = match.group(2)
 
     user = await get_user_by_id(session, user_id)
     
@@ -193,8 +228,7 @@ async def process_set_role(callback: CallbackQuery, state: FSMContext, session:
         await callback.answer()
         return
 
-    current_roles = await get_user_roles(session, user.id)
-    current_role_names = [role.name for role in current_roles]
+    current_role_names = [role.name for role in user.roles]
 
     action = "remove" if role_name in current_role_names else "add"
     action_text = "удалить" if action == "remove" else "добавить"
@@ -226,14 +260,26 @@ async def process_set_role(callback: CallbackQuery, state: FSMContext, session:
 @router.callback_query(AdminStates.waiting_for_confirmation, F.data.startswith("confirm:"))
 async def process_confirm_role_change(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Обработчик подтверждения изменения роли"""
+    match = _CONFIRM_RE.match(callback.data)
+    if not match:
+        await callback.answer()
+        return
+    action = match.group(1)
+    user_id = int(match.group(2))
+    role_name = match.group(3)
+    
+    # Права текущего пользователя и выбранный пользователь читаются параллельно
+    auth, user = await gather_in_sessions(
+        lambda s: get_cached_user_auth(s, callback.from_user.id),
+        lambda s: get_user_by_id(s, user_id),
+    )
+    
     # КРИТИЧЕСКАЯ ПРОВЕРКА ПРАВ!
-    current_user = await get_user_by_tg_id(session, callback.from_user.id)
-    if not current_user:
+    if not auth:
         await callback.answer("❌ Пользователь не найден.", show_alert=True)
         return
         
-    has_permission = await check_user_permission(session, current_user.id, "manage_users")
-    if not has_permission:
+    if "manage_users" not in auth["permissions"]:
         await callback.message.edit_text(
             "❌ <b>Недостаточно прав</b>\n\n"
             "У тебя нет прав для изменения ролей пользователей.\n"
@@ -243,13 +289,6 @@ async def process_confirm_role_change(callback: CallbackQuery, state: FSMContext
         await callback.answer()
         return
     
-    parts = callback.data.split(':')
-    action = parts[1]
-    user_id = int(parts[2])
-    role_name = parts[3]
-    
-    user = await get_user_by_id(session, user_id)
-    
     if not user:
         await callback.message.answer("Пользователь не найден.")
         await callback.answer()
@@ -262,9 +301,13 @@ async def process_confirm_role_change(callback: CallbackQuery, state: FSMContext
         success = await remove_user_role(session, user.id, role_name)
         action_text = "удалена"
     
+    roles_str = None
     if success:
-        updated_roles = await get_user_roles(session, user.id)
-        roles_str = ", ".join([role.name for role in updated_roles])
+        # Новый список ролей выводится из загруженного до изменения без повторного запроса
+        role_names = [role.name for role in user.roles if role.name != role_name]
+        if action == "add":
+            role_names.append(role_name)
+        roles_str = ", ".join(role_names)
         
         await callback.message.answer(
             f"✅ Роль '{role_name}' успешно {action_text} для пользователя {user.full_name}.\n"
@@ -286,7 +329,15 @@ async def process_confirm_role_change(callback: CallbackQuery, state: FSMContext
             {"target_user_id": user.id, "role": role_name, "action": action}
         )
 
-    await show_user_list(callback.message, state, session)
+    # Возвращаем карточку этого же пользователя вместо повторной загрузки всего списка;
+    # к списку ведёт кнопка «Назад к списку» карточки
+    user_info, keyboard = _user_card(user, roles=roles_str)
+    await callback.message.edit_text(
+        user_info,
+        reply_markup=keyboard,
+        parse_mode="HTML"
+    )
+    await state.set_state(AdminStates.waiting_for_user_action)
 
     await callback.answer()
 
@@ -303,21 +354,7 @@ async def process_cancel_role_change(callback: CallbackQuery, state: FSMContext,
 
     user = await get_user_by_id(session, user_id)
     if user:
-        keyboard = get_user_action_keyboard(user.id)
-        
-        user_roles = await get_user_roles(session, user.id)
-        roles_str = ", ".join([role.name for role in user_roles])
-        
-        user_info = f"""
-        👤 <b>Информация о пользователе</b>
-        
-        🧑 ФИО: {user.full_name}
-        📞 Телефон: {user.phone_number}
-        🆔 Telegram ID: {user.tg_id}
-        👤 Username: @{user.username or "не указан"}
-        📅 Дата регистрации: {user.registration_date.strftime('%d.%m.%Y %H:%M')}
-        👑 Роли: {roles_str}
-        """
+        user_info, keyboard = _user_card(user)
 
         await callback.message.edit_text(
             user_info,
@@ -368,21 +405,7 @@ async def process_view_profile(callback: CallbackQuery, state: FSMContext, sessi
         await callback.answer()
         return
 
-    user_roles = await get_user_roles(session, user.id)
-    roles_str = ", ".join([role.name for role in user_roles])
-
-    user_info = f"""
-    👤 <b>Профиль пользователя</b>
-    
-    🧑 ФИО: {user.full_name}
-    📞 Телефон: {user.phone_number}
-    🆔 Telegram ID: {user.tg_id}
-    👤 Username: @{user.username or "не указан"}
-    📅 Дата регистрации: {user.registration_date.strftime('%d.%m.%Y %H:%M')}
-    👑 Роли: {roles_str}
-    """
-
-    keyboard = get_user_action_keyboard(user.id)
+    user_info, keyboard = _user_card(user, title="Профиль пользователя")
 
     await callback.message.edit_text(
         user_info,
@@ -409,20 +432,25 @@ async def cmd_trainees(message: Message, state: FSMContext, session: AsyncSessio
     await show_trainees_list(message, session, page=0)
 
 
-@router.message(F.text.in_(["Список Стажеров", "Стажеры 🐣"]))
-async def button_trainees(message: Message, state: FSMContext, session: AsyncSession):
-    """Обработчик кнопки просмотра списка Стажеров"""
-    if not await check_admin_permission(message, state, session, permission="view_trainee_list"):
-        return
-    
-    await show_trainees_list(message, session, page=0)
+# Кнопки меню раздела: один фильтр с проверкой по множеству и выбор обработчика по словарю
+_MENU_BUTTONS = {
+    "Управление пользователями": cmd_manage_users,
+    "Список Стажеров": cmd_trainees,
+    "Стажеры 🐣": cmd_trainees,
+}
+
+
+@router.message(F.text.in_(frozenset(_MENU_BUTTONS)))
+async def button_admin_menu(message: Message, state: FSMContext, session: AsyncSession):
+    """Обработчик кнопок управления пользователями и списка Стажеров"""
+    await _MENU_BUTTONS[message.text](message, state, session)
 
 
 async def show_trainees_list(message: Message, session: AsyncSession, page: int = 0):
     """Показать список стажеров с пагинацией"""
     from keyboards.keyboards import get_trainees_list_keyboard
     
-    trainees = await get_all_trainees(session)
+    trainees = await get_all_trainees_lite(session)
     
     if not trainees:
         await message.answer("В системе пока нет зарегистрированных Стажеров.")
@@ -444,7 +472,7 @@ async def callback_trainees_page(callback: CallbackQuery, session: AsyncSession)
         from keyboards.keyboards import get_trainees_list_keyboard
         
         page = int(callback.data.split(":")[1])
-        trainees = await get_all_trainees(session)
+        trainees = await get_all_trainees_lite(session)
         
         if not trainees:
             await callback.message.edit_text("В системе пока нет зарегистрированных Стажеров.")
@@ -479,7 +507,7 @@ async def callback_back_to_recruiter_trainees(callback: CallbackQuery, session:
     try:
         from keyboards.keyboards import get_trainees_list_keyboard
         
-        trainees = await get_all_trainees(session)
+        trainees = await get_all_trainees_lite(session)
         
         if not trainees:
             await callback.message.edit_text("В системе пока нет зарегистрированных Стажеров.")
@@ -518,7 +546,7 @@ async def show_trainee_detail(callback: CallbackQuery, session: AsyncSession, tr
     message_text += f"<b>Телефон:</b> {trainee.phone_number}\n"
     message_text += f"<b>Username:</b> @{trainee.username or 'нет юзернейма'}\n"
     message_text += f"<b>Номер:</b> #{trainee.id}\n"
-    message_text += f"<b>Дата регистрации:</b> {trainee.registration_date.strftime('%d.%m.%Y %H:%M')}\n\n"
+    message_text += f"<b>Дата регистрации:</b> {trainee.registration_date_str}\n\n"
     message_text += "━━━━━━━━━━━━\n\n"
     message_text += "🗂️ <b>Статус:</b>\n"
     message_text += f"<b>Группа:</b> {trainee.groups[0].name if trainee.groups else 'Не назначена'}\n"
@@ -1,4 +1,4 @@
-import os
+import asyncio
 import time
 from aiogram import Router, F
 from aiogram.filters import Command
@@ -6,7 +6,8 @@ from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, CallbackQuery
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from database.db import get_user_by_tg_id, get_user_roles
+from config import ALLOW_AUTO_AUTH
+from database.db import get_user_by_tg_id, get_cached_user_auth
 from keyboards.keyboards import get_keyboard_by_role, get_welcome_keyboard
 from states.states import AuthStates, RegistrationStates
 from utils.logger import log_user_action, log_user_error
@@ -14,6 +15,9 @@ from utils.bot_commands import set_bot_commands
 
 router = Router()
 
+# Время жизни авторизации в FSM, секунды
+AUTH_SESSION_TTL = 86400
+
 @router.message(Command("login"))
 async def cmd_login(message: Message, state: FSMContext, session: AsyncSession, bot):
     try:
@@ -29,27 +33,27 @@ async def cmd_login(message: Message, state: FSMContext, session: AsyncSession,
             log_user_error(message.from_user.id, message.from_user.username, "login failed - account deactivated")
             return
         
-        roles = await get_user_roles(session, user.id)
+        # Роли уже загружены get_user_by_tg_id
+        primary_role = user.primary_role
         
-        if not roles:
+        if not primary_role:
             await message.answer("У тебя нет назначенных ролей. Обратись к рекрутеру.")
             log_user_error(message.from_user.id, message.from_user.username, "login failed - no roles assigned")
             return
         
-        primary_role = roles[0].name
-        
-        await message.answer(
-            f"Добро пожаловать, {user.full_name}! Ты вошел как {primary_role}.",
-            reply_markup=get_keyboard_by_role(primary_role)
-        )
-        
-        await set_bot_commands(bot, primary_role)
-        
-        await state.update_data(
-            user_id=user.id,
-            role=primary_role,
-            is_authenticated=True,
-            auth_time=message.date.timestamp()
+        # Приветствие, команды бота и состояние независимы и выполняются параллельно
+        await asyncio.gather(
+            message.answer(
+                f"Добро пожаловать, {user.full_name}! Ты вошел как {primary_role}.",
+                reply_markup=get_keyboard_by_role(primary_role)
+            ),
+            set_bot_commands(bot, primary_role),
+            state.update_data(
+                user_id=user.id,
+                role=primary_role,
+                is_authenticated=True,
+                auth_time=message.date.timestamp()
+            )
         )
 
         log_user_action(
@@ -66,49 +70,55 @@ async def cmd_login(message: Message, state: FSMContext, session: AsyncSession,
         await message.answer("Произошла ошибка при входе в систему. Пожалуйста, попробуй позже.")
 
 async def check_auth(message: Message, state: FSMContext, session: AsyncSession) -> bool:
+    """Проверка авторизации пользователя с автоматическим входом
+    
+    Для уже авторизованного пользователя проверяется только активность аккаунта
+    по кэшу get_cached_user_auth: при попадании в кэш запроса к БД нет. Кэш
+    сбрасывается при любой записи в users/user_roles/role_permissions, поэтому
+    деактивация или смена ролей учитывается со следующего сообщения.
+    """
     try:
         data = await state.get_data()
         is_authenticated = data.get("is_authenticated", False)
         auth_time = data.get("auth_time", 0)
         
-        if is_authenticated and auth_time and (time.time() - auth_time) > 86400:
+        if is_authenticated and auth_time and (time.time() - auth_time) > AUTH_SESSION_TTL:
             await state.clear()
             await message.answer("Сессия истекла. Пожалуйста, войдите заново командой /login.")
             return False
         
+        # Пользователь, роли и права берутся из кэша проверок доступа
+        auth = await get_cached_user_auth(session, message.from_user.id)
+        
         if is_authenticated:
-            user = await get_user_by_tg_id(session, message.from_user.id)
-            if not user or not user.is_active:
+            if not auth or not auth["is_active"]:
                 await state.clear()
                 await message.answer("Твой аккаунт деактивирован. Обратись к администратору.")
                 return False
             return True
         
-        user = await get_user_by_tg_id(session, message.from_user.id)
-        
-        if not user:
+        if not auth:
             await message.answer("Ты не зарегистрирован в системе. Используй команду /register для регистрации.")
             return False
         
-        if not user.is_active:
+        if not auth["is_active"]:
             await message.answer("Твой аккаунт деактивирован. Обратись к администратору.")
             return False
         
-        auto_auth_allowed = os.getenv("ALLOW_AUTO_AUTH", "true").lower() == "true"
-        if not auto_auth_allowed:
+        if not ALLOW_AUTO_AUTH:
             await message.answer("Пожалуйста, выполни команду /login для входа.")
             return False
         
-        roles = await get_user_roles(session, user.id)
+        roles = auth["roles"]
         
         if not roles:
             await message.answer("У тебя нет назначенных ролей. Обратись к рекрутеру.")
             return False
         
-        primary_role = roles[0].name
+        primary_role = roles[0]
         
         await state.update_data(
-            user_id=user.id,
+            user_id=auth["user_id"],
             role=primary_role,
             is_authenticated=True,
             auth_time=message.date.timestamp()
@@ -118,7 +128,7 @@ async def check_auth(message: Message, state: FSMContext, session: AsyncSession)
             message.from_user.id, 
             message.from_user.username, 
             "auto authentication", 
-            {"role": primary_role, "user_id": user.id}
+            {"role": primary_role, "user_id": auth["user_id"]}
         )
         
         return True
@@ -134,9 +144,11 @@ async def cmd_logout(message: Message, state: FSMContext, bot):
         user_id = data.get("user_id")
         role = data.get("role")
         
-        await state.clear()
-        await set_bot_commands(bot)
-        await message.answer("Ты вышел из системы. Используй /login для входа.")
+        await asyncio.gather(
+            state.clear(),
+            set_bot_commands(bot),
+            message.answer("Ты вышел из системы. Используй /login для входа.")
+        )
         
         log_user_action(
             message.from_user.id, 
@@ -154,38 +166,40 @@ async def cmd_start(message: Message, state: FSMContext, session: AsyncSession,
         user = await get_user_by_tg_id(session, message.from_user.id)
         
         if not user:
-            await set_bot_commands(bot)
-            await message.answer(
-                "Привет! Добро пожаловать в чат-бот.\n\n"
-                "Ты ещё не зарегистрирован. Давай подключим тебе доступ.",
-                reply_markup=get_welcome_keyboard()
+            await asyncio.gather(
+                set_bot_commands(bot),
+                message.answer(
+                    "Привет! Добро пожаловать в чат-бот.\n\n"
+                    "Ты ещё не зарегистрирован. Давай подключим тебе доступ.",
+                    reply_markup=get_welcome_keyboard()
+                )
             )
             log_user_action(message.from_user.id, message.from_user.username, "started bot - not registered")
             return
         
         log_user_action(message.from_user.id, message.from_user.username, "started bot - already registered")
         
-        roles = await get_user_roles(session, user.id)
+        # Роли уже загружены get_user_by_tg_id
+        primary_role = user.primary_role
         
-        if not roles:
+        if not primary_role:
             await message.answer("У тебя нет назначенных ролей. Обратись к рекрутеру.")
             log_user_error(message.from_user.id, message.from_user.username, "login failed - no roles assigned")
             return
         
-        primary_role = roles[0].name
-        
-        await message.answer(
-            f"Добро пожаловать, {user.full_name}! Ты вошел как {primary_role}.",
-            reply_markup=get_keyboard_by_role(primary_role)
-        )
-        
-        await set_bot_commands(bot, primary_role)
-        
-        await state.update_data(
-            user_id=user.id,
-            role=primary_role,
-            is_authenticated=True,
-            auth_time=message.date.timestamp()
+        # Приветствие, команды бота и состояние независимы и выполняются параллельно
+        await asyncio.gather(
+            message.answer(
+                f"Добро пожаловать, {user.full_name}! Ты вошел как {primary_role}.",
+                reply_markup=get_keyboard_by_role(primary_role)
+            ),
+            set_bot_commands(bot, primary_role),
+            state.update_data(
+                user_id=user.id,
+                role=primary_role,
+                is_authenticated=True,
+                auth_time=message.date.timestamp()
+            )
         )
         
         log_user_action(
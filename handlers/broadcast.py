@@ -4,16 +4,17 @@
 """
 
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, InputMediaPhoto, InputMediaDocument
+from aiogram.types import ErrorEvent, Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, InputMediaPhoto, InputMediaDocument
 from aiogram.fsm.context import FSMContext
 from aiogram.filters import StateFilter
+from aiogram.exceptions import TelegramAPIError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from database.db import (
-    get_user_by_tg_id, check_user_permission, get_all_active_tests,
-    get_test_by_id, get_all_groups, get_group_by_id, broadcast_test_to_groups,
+    get_cached_user_auth, get_all_active_tests,
+    get_test_by_id, get_all_groups, broadcast_test_to_groups,
     get_employees_in_group, get_all_knowledge_folders, get_knowledge_folder_by_id,
-    get_knowledge_material_by_id
+    get_knowledge_material_by_id, gather_in_sessions
 )
 from states.states import BroadcastStates
 from keyboards.keyboards import (
@@ -28,30 +29,109 @@ from utils.logger import log_user_action, log_user_error
 
 router = Router()
 
+# Ответ и ключ лога при непредвиденной ошибке в обработчиках рассылки без собственного try/except
+_CALLBACK_ERRORS = {
+    "test_filter:broadcast": ("Произошла ошибка при запуске рассылки", "broadcast_start_error"),
+    "broadcast_test:": ("Произошла ошибка при выборе теста", "broadcast_test_select_error"),
+    "broadcast_group:": ("Произошла ошибка при выборе группы", "broadcast_group_toggle_error"),
+    "broadcast_send": ("Произошла ошибка при отправке рассылки", "broadcast_send_error"),
+}
+
+# Шаблоны сообщений редактора рассылки собираются один раз при импорте
+_HDR_EDITOR = "✉️<b>РЕДАКТОР РАССЫЛКИ</b>✉️\n\n"
+
+# Ключи ролей рассылки и соответствующие названия ролей в БД
+_ROLE_NAMES = {
+    "trainee": "Стажер",
+    "employee": "Сотрудник",
+    "mentor": "Наставник",
+    "recruiter": "Рекрутер",
+    "manager": "Руководитель"
+}
+_ALL_ROLES = tuple(_ROLE_NAMES)
+
+_MSG_ROLES_TEMPLATE = (
+    _HDR_EDITOR +
+    "📝 <b>Шаг 5 из 6: Выбор ролей</b>\n\n"
+    "🟡 Выбери роли, которым отправить рассылку:\n\n"
+    "{selection}"
+    "💡 <i>Можно выбрать несколько ролей или отправить всем</i>"
+)
+_MSG_ROLES_START = _MSG_ROLES_TEMPLATE.format(selection="")
+_MSG_ROLES_NONE = _MSG_ROLES_TEMPLATE.format(selection="⚠️ Не выбрано ни одной роли\n\n")
+_MSG_ROLES_ALL = (
+    _HDR_EDITOR +
+    "📝 <b>Шаг 5 из 6: Выбор ролей</b>\n\n"
+    f"✅ Выбраны все роли: {', '.join(_ROLE_NAMES.values())}\n\n"
+    "💡 <i>Рассылка будет отправлена всем пользователям выбранных групп</i>"
+)
+
+
+async def _load_broadcast_start(session: AsyncSession, tg_id: int, reply, denied_text: str, load_tests: bool = False):
+    """Общая проверка доступа при входе в рассылку
+    
+    Возвращает (auth, tests) или (None, None), если пользователь не найден или
+    у него нет права create_tests; в этом случае ответ уже отправлен через reply
+    (message.answer или callback.message.edit_text). Права берутся из кэша
+    get_cached_user_auth, поэтому повторные клики не обращаются к БД. Активные
+    тесты при load_tests загружаются параллельно в отдельной сессии.
+    """
+    tests = None
+    if load_tests:
+        auth, tests = await gather_in_sessions(
+            lambda s: get_cached_user_auth(s, tg_id),
+            get_all_active_tests,
+        )
+    else:
+        auth = await get_cached_user_auth(session, tg_id)
+    
+    if not auth:
+        await reply("❌ Ты не зарегистрирован в системе.")
+        return None, None
+    
+    # Проверяем права на создание тестов (только рекрутеры)
+    if "create_tests" not in auth["permissions"]:
+        await reply(
+            "❌ <b>Недостаточно прав</b>\n\n"
+            f"{denied_text}\n"
+            "Обратись к администратору.",
+            parse_mode="HTML"
+        )
+        return None, None
+    
+    return auth, tests
+
 
 # ===============================
 # Обработчики для Task 8: Массовая рассылка тестов
 # ===============================
 
+@router.errors(F.update.callback_query.data.startswith(tuple(_CALLBACK_ERRORS)))
+async def broadcast_error_handler(event: ErrorEvent):
+    """Единая обработка исключений обработчиков рассылки из _CALLBACK_ERRORS"""
+    callback = event.update.callback_query
+    prefix = next(prefix for prefix in _CALLBACK_ERRORS if callback.data.startswith(prefix))
+    error_text, error_key = _CALLBACK_ERRORS[prefix]
+    log_user_error(callback.from_user.id, error_key, str(event.exception))
+    # Обработчик мог упасть до callback.answer(): без ответа у пользователя
+    # висит индикатор загрузки. Ошибка ответа (например, повторного) не должна
+    # помешать сообщить пользователю об ошибке
+    try:
+        await callback.answer()
+    except TelegramAPIError:
+        pass
+    await callback.message.edit_text(error_text)
+    return True
+
+
 @router.message(F.text.in_(["Рассылка ✈️", "Рассылка"]))
 async def cmd_broadcast(message: Message, state: FSMContext, session: AsyncSession):
     """Обработчик кнопки 'Рассылка ✈️' в главном меню рекрутера"""
     try:
-        # Получаем пользователя и проверяем права
-        user = await get_user_by_tg_id(session, message.from_user.id)
-        if not user:
-            await message.answer("❌ Ты не зарегистрирован в системе.")
-            return
-        
-        # Проверяем права на создание тестов (только рекрутеры)
-        has_permission = await check_user_permission(session, user.id, "create_tests")
-        if not has_permission:
-            await message.answer(
-                "❌ <b>Недостаточно прав</b>\n\n"
-                "У тебя нет прав для массовой рассылки.\n"
-                "Обратись к администратору.",
-                parse_mode="HTML"
-            )
+        auth, _ = await _load_broadcast_start(
+            session, message.from_user.id, message.answer, "У тебя нет прав для массовой рассылки."
+        )
+        if not auth:
             return
         
         # Показываем меню рассылки
@@ -62,7 +142,7 @@ async def cmd_broadcast(message: Message, state: FSMContext, session: AsyncSessi
             reply_markup=get_broadcast_main_menu_keyboard()
         )
         
-        log_user_action(user.tg_id, "broadcast_menu_opened", "Открыто меню рассылки")
+        log_user_action(message.from_user.id, "broadcast_menu_opened", "Открыто меню рассылки")
         
     except Exception as e:
         await message.answer("Произошла ошибка при запуске рассылки")
@@ -341,10 +421,7 @@ async def show_test_selection(callback: CallbackQuery, state: FSMContext, sessio
 async def show_roles_selection(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Вспомогательная функция показа выбора ролей"""
     await callback.message.edit_text(
-        "✉️<b>РЕДАКТОР РАССЫЛКИ</b>✉️\n\n"
-        "📝 <b>Шаг 5 из 6: Выбор ролей</b>\n\n"
-        "🟡 Выбери роли, которым отправить рассылку:\n\n"
-        "💡 <i>Можно выбрать несколько ролей или отправить всем</i>",
+        _MSG_ROLES_START,
         parse_mode="HTML",
         reply_markup=get_broadcast_roles_selection_keyboard([])
     )
@@ -374,7 +451,7 @@ async def show_groups_selection(callback: CallbackQuery, state: FSMContext, sess
         return
     
     # Формируем информацию о рассылке
-    info_lines = ["✉️<b>РЕДАКТОР РАССЫЛКИ</b>✉️\n\n", "📝 <b>Шаг 6 из 6: Выбор групп</b>\n\n"]
+    info_lines = [_HDR_EDITOR, "📝 <b>Шаг 6 из 6: Выбор групп</b>\n\n"]
     
     # Добавляем информацию о тесте (если есть)
     if selected_test_id:
@@ -390,25 +467,22 @@ async def show_groups_selection(callback: CallbackQuery, state: FSMContext, sess
     
     # Добавляем информацию о ролях
     if selected_roles:
-        role_names = {
-            "trainee": "Стажер",
-            "employee": "Сотрудник",
-            "mentor": "Наставник",
-            "recruiter": "Рекрутер",
-            "manager": "Руководитель"
-        }
-        selected_display = [role_names.get(r, r) for r in selected_roles]
+        selected_display = [_ROLE_NAMES.get(r, r) for r in selected_roles]
         info_lines.append(f"🟢 <b>Роли:</b> {', '.join(selected_display)}\n")
     
     info_lines.append("\n🟡 <b>Выбери группы для рассылки👇</b>")
     
+    broadcast_groups = [(group.id, group.name) for group in groups]
     await callback.message.edit_text(
         "".join(info_lines),
         parse_mode="HTML",
-        reply_markup=get_broadcast_groups_selection_keyboard(groups, [])
+        reply_markup=get_broadcast_groups_selection_keyboard(broadcast_groups, [])
     )
     
-    await state.update_data(selected_groups=[])
+    # Список групп сохраняется в FSM: переключение групп дальше не обращается к БД.
+    # Текст прошлого выбора групп сбрасывается, иначе первое переключение могло бы
+    # совпасть с ним и обновить только клавиатуру
+    await state.update_data(selected_groups=[], broadcast_groups=broadcast_groups, broadcast_groups_text=None)
     await state.set_state(BroadcastStates.selecting_groups)
 
 
@@ -517,83 +591,64 @@ async def callback_skip_material(callback: CallbackQuery, state: FSMContext, ses
 @router.callback_query(F.data == "test_filter:broadcast")
 async def callback_start_broadcast(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Шаг 3 ТЗ: Начало процесса рассылки"""
-    try:
-        await callback.answer()
-        
-        # Получаем пользователя и проверяем права
-        user = await get_user_by_tg_id(session, callback.from_user.id)
-        if not user:
-            await callback.message.edit_text("❌ Ты не зарегистрирован в системе.")
-            return
-        
-        # Проверяем права на создание тестов (только рекрутеры)
-        has_permission = await check_user_permission(session, user.id, "create_tests")
-        if not has_permission:
-            await callback.message.edit_text(
-                "❌ <b>Недостаточно прав</b>\n\n"
-                "У тебя нет прав для массовой рассылки тестов.\n"
-                "Обратись к администратору.",
-                parse_mode="HTML"
-            )
-            return
-        
-        # Получаем все активные тесты
-        tests = await get_all_active_tests(session)
-        
-        if not tests:
-            await callback.message.edit_text(
-                "✉️<b>РЕДАКТОР РАССЫЛКИ</b>✉️\n\n"
-                "❌ <b>Нет доступных тестов</b>\n\n"
-                "В системе пока нет созданных тестов для рассылки.\n"
-                "Сначала создай тесты.",
-                parse_mode="HTML",
-                reply_markup=get_main_menu_keyboard()
-            )
-            return
-        
-        # Шаг 4 ТЗ: Показываем список тестов для выбора
+    await callback.answer()
+    
+    auth, tests = await _load_broadcast_start(
+        session, callback.from_user.id, callback.message.edit_text,
+        "У тебя нет прав для массовой рассылки тестов.", load_tests=True
+    )
+    if not auth:
+        return
+    
+    if not tests:
         await callback.message.edit_text(
             "✉️<b>РЕДАКТОР РАССЫЛКИ</b>✉️\n\n"
-            "🟡<b>Какой тест ты хочешь отправить пользователям?</b>\n\n"
-            "📝 <b>Рассылка будет отправлена сотрудникам, стажерам и наставникам</b>\n\n"
-            "Выбери тест из списка👇",
+            "❌ <b>Нет доступных тестов</b>\n\n"
+            "В системе пока нет созданных тестов для рассылки.\n"
+            "Сначала создай тесты.",
             parse_mode="HTML",
-            reply_markup=get_broadcast_test_selection_keyboard(tests)
+            reply_markup=get_main_menu_keyboard()
         )
-        
-        await state.set_state(BroadcastStates.selecting_test)
-        log_user_action(user.tg_id, "broadcast_started", "Начата массовая рассылка тестов")
-        
-    except Exception as e:
-        await callback.message.edit_text("Произошла ошибка при запуске рассылки")
-        log_user_error(callback.from_user.id, "broadcast_start_error", str(e))
+        return
+    
+    # Шаг 4 ТЗ: Показываем список тестов для выбора
+    await callback.message.edit_text(
+        "✉️<b>РЕДАКТОР РАССЫЛКИ</b>✉️\n\n"
+        "🟡<b>Какой тест ты хочешь отправить пользователям?</b>\n\n"
+        "📝 <b>Рассылка будет отправлена сотрудникам, стажерам и наставникам</b>\n\n"
+        "Выбери тест из списка👇",
+        parse_mode="HTML",
+        reply_markup=get_broadcast_test_selection_keyboard(tests)
+    )
+    
+    await state.set_state(BroadcastStates.selecting_test)
+    log_user_action(callback.from_user.id, "broadcast_started", "Начата массовая рассылка тестов")
 
 
 @router.callback_query(F.data.startswith("broadcast_test:"), BroadcastStates.selecting_test)
 async def callback_select_broadcast_test(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Выбор теста для рассылки"""
     try:
-        await callback.answer()
-        
-        test_id = int(callback.data.split(":")[1])
-        
-        # Получаем информацию о тесте
-        test = await get_test_by_id(session, test_id)
-        if not test:
-            await callback.answer("Тест не найден", show_alert=True)
-            return
-        
-        # Сохраняем выбранный тест
-        await state.update_data(selected_test_id=test_id)
-        
-        # Переходим к выбору ролей
-        await show_roles_selection(callback, state, session)
-        
-        log_user_action(callback.from_user.id, "broadcast_test_selected", f"Выбран тест для рассылки: {test.name}")
-        
-    except Exception as e:
-        await callback.message.edit_text("Произошла ошибка при выборе теста")
-        log_user_error(callback.from_user.id, "broadcast_test_select_error", str(e))
+        test_id = int(callback.data.removeprefix("broadcast_test:"))
+    except ValueError:
+        await callback.answer("Тест не найден", show_alert=True)
+        return
+    
+    # Получаем информацию о тесте
+    test = await get_test_by_id(session, test_id)
+    if not test:
+        await callback.answer("Тест не найден", show_alert=True)
+        return
+    
+    await callback.answer()
+    
+    # Сохраняем выбранный тест
+    await state.update_data(selected_test_id=test_id)
+    
+    # Переходим к выбору ролей
+    await show_roles_selection(callback, state, session)
+    
+    log_user_action(callback.from_user.id, "broadcast_test_selected", f"Выбран тест для рассылки: {test.name}")
 
 
 @router.callback_query(F.data == "broadcast_skip_test", StateFilter(BroadcastStates.selecting_test))
@@ -633,27 +688,11 @@ async def callback_toggle_broadcast_role(callback: CallbackQuery, state: FSMCont
         await state.update_data(selected_roles=selected_roles)
         
         # Обновляем клавиатуру
-        role_names = {
-            "trainee": "Стажер",
-            "employee": "Сотрудник", 
-            "mentor": "Наставник",
-            "recruiter": "Рекрутер",
-            "manager": "Руководитель"
-        }
-        selected_display = [role_names[r] for r in selected_roles]
-        
-        info_text = (
-            "✉️<b>РЕДАКТОР РАССЫЛКИ</b>✉️\n\n"
-            "📝 <b>Шаг 5 из 6: Выбор ролей</b>\n\n"
-            "🟡 Выбери роли, которым отправить рассылку:\n\n"
-        )
-        
         if selected_roles:
-            info_text += f"✅ Выбрано: {', '.join(selected_display)}\n\n"
+            selected_display = ", ".join(_ROLE_NAMES[r] for r in selected_roles)
+            info_text = _MSG_ROLES_TEMPLATE.format(selection=f"✅ Выбрано: {selected_display}\n\n")
         else:
-            info_text += "⚠️ Не выбрано ни одной роли\n\n"
-        
-        info_text += "💡 <i>Можно выбрать несколько ролей или отправить всем</i>"
+            info_text = _MSG_ROLES_NONE
         
         await callback.message.edit_text(
             info_text,
@@ -672,41 +711,27 @@ async def callback_select_all_roles(callback: CallbackQuery, state: FSMContext,
     try:
         data = await state.get_data()
         current_roles = data.get("selected_roles", [])
-        all_roles = ["trainee", "employee", "mentor", "recruiter", "manager"]
         
         # TOGGLE: Если все выбраны → снять все, иначе → выбрать все
-        if set(current_roles) == set(all_roles):
+        if set(current_roles) == set(_ALL_ROLES):
             # Снять все
             await callback.answer("Сняты все роли")
             await state.update_data(selected_roles=[])
             
-            info_text = (
-                "✉️<b>РЕДАКТОР РАССЫЛКИ</b>✉️\n\n"
-                "📝 <b>Шаг 5 из 6: Выбор ролей</b>\n\n"
-                "🟡 Выбери роли, которым отправить рассылку:\n\n"
-                "⚠️ Не выбрано ни одной роли\n\n"
-                "💡 <i>Можно выбрать несколько ролей или отправить всем</i>"
-            )
-            
             await callback.message.edit_text(
-                info_text,
+                _MSG_ROLES_NONE,
                 parse_mode="HTML",
                 reply_markup=get_broadcast_roles_selection_keyboard([])
             )
         else:
             # Выбрать все
             await callback.answer("Выбраны все роли")
+            # В состояние кладётся копия: список ролей потом изменяется на месте
+            all_roles = list(_ALL_ROLES)
             await state.update_data(selected_roles=all_roles)
             
-            info_text = (
-                "✉️<b>РЕДАКТОР РАССЫЛКИ</b>✉️\n\n"
-                "📝 <b>Шаг 5 из 6: Выбор ролей</b>\n\n"
-                "✅ Выбраны все роли: Стажер, Сотрудник, Наставник, Рекрутер, Руководитель\n\n"
-                "💡 <i>Рассылка будет отправлена всем пользователям выбранных групп</i>"
-            )
-            
             await callback.message.edit_text(
-                info_text,
+                _MSG_ROLES_ALL,
                 parse_mode="HTML",
                 reply_markup=get_broadcast_roles_selection_keyboard(all_roles)
             )
@@ -743,198 +768,188 @@ async def callback_proceed_to_groups(callback: CallbackQuery, state: FSMContext,
 async def callback_toggle_broadcast_group(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Шаг 7-10 ТЗ: Выбор/отмена групп для рассылки"""
     try:
-        await callback.answer()
-        
-        group_id = int(callback.data.split(":")[1])
-        
-        # Получаем текущие данные
-        data = await state.get_data()
-        selected_test_id = data.get("selected_test_id")
-        selected_groups = data.get("selected_groups", [])
-        broadcast_docs = data.get("broadcast_docs", [])
-        broadcast_material_id = data.get("broadcast_material_id")
-        
-        # Получаем информацию о тесте (опционально) и группе
-        test = None
-        if selected_test_id:
-            test = await get_test_by_id(session, selected_test_id)
-        
-        group = await get_group_by_id(session, group_id)
-        
-        if not group:
-            await callback.answer("Группа не найдена", show_alert=True)
-            return
-        
-        # Переключаем выбор группы
-        if group_id in selected_groups:
-            selected_groups.remove(group_id)
-        else:
-            selected_groups.append(group_id)
-        
-        await state.update_data(selected_groups=selected_groups)
-        
-        # Получаем названия выбранных групп
-        selected_group_names = []
-        for gid in selected_groups:
-            g = await get_group_by_id(session, gid)
-            if g:
-                selected_group_names.append(g.name)
-        
-        # Формируем сообщение согласно ТЗ
-        groups_text = "; ".join(selected_group_names) if selected_group_names else ""
-        
-        # Получаем все группы для отображения
-        all_groups = await get_all_groups(session)
-        
-        # Формируем информацию о рассылке
-        info_lines = ["✉️<b>РЕДАКТОР РАССЫЛКИ</b>✉️\n\n"]
-        
-        # Добавляем информацию о тесте (если есть)
-        if test:
-            info_lines.append(f"🟢 <b>Тест:</b> {test.name}\n")
-        
-        # Добавляем информацию о материале (если есть)
-        if broadcast_material_id:
-            material = await get_knowledge_material_by_id(session, broadcast_material_id)
-            if material:
-                info_lines.append(f"🟢 <b>Материал:</b> {material.name}\n")
-        
-        # Добавляем информацию о группах
-        if selected_group_names:
-            info_lines.append(f"🟢 <b>Группы:</b> {groups_text}\n\n")
-            info_lines.append("🟡 <b>Добавить ещё группу?</b>\n")
-            info_lines.append("Выбери группу на клавиатуре👇")
-        else:
-            info_lines.append("🟡 <b>Выбери группы для рассылки👇</b>")
-        
-        message_text = "".join(info_lines)
-        
+        group_id = int(callback.data.removeprefix("broadcast_group:"))
+    except ValueError:
+        await callback.answer("Группа не найдена", show_alert=True)
+        return
+    
+    # Получаем текущие данные
+    data = await state.get_data()
+    selected_test_id = data.get("selected_test_id")
+    selected_groups = data.get("selected_groups", [])
+    broadcast_docs = data.get("broadcast_docs", [])
+    broadcast_material_id = data.get("broadcast_material_id")
+    
+    # Получаем информацию о тесте (опционально) и группе
+    test = None
+    if selected_test_id:
+        test = await get_test_by_id(session, selected_test_id)
+    
+    # Пары (id, название) групп сохранены при входе в выбор групп:
+    # из них берутся выбранная группа, названия выбранных групп и клавиатура
+    broadcast_groups = data.get("broadcast_groups", [])
+    group_names = dict(broadcast_groups)
+    
+    group_name = group_names.get(group_id)
+    
+    if group_name is None:
+        await callback.answer("Группа не найдена", show_alert=True)
+        return
+    
+    await callback.answer()
+    
+    # Переключаем выбор группы
+    if group_id in selected_groups:
+        selected_groups.remove(group_id)
+    else:
+        selected_groups.append(group_id)
+    
+    # Получаем названия выбранных групп
+    selected_group_names = [group_names[gid] for gid in selected_groups if gid in group_names]
+    
+    # Формируем сообщение согласно ТЗ
+    groups_text = "; ".join(selected_group_names) if selected_group_names else ""
+    
+    # Формируем информацию о рассылке
+    info_lines = [_HDR_EDITOR]
+    
+    # Добавляем информацию о тесте (если есть)
+    if test:
+        info_lines.append(f"🟢 <b>Тест:</b> {test.name}\n")
+    
+    # Добавляем информацию о материале (если есть)
+    if broadcast_material_id:
+        material = await get_knowledge_material_by_id(session, broadcast_material_id)
+        if material:
+            info_lines.append(f"🟢 <b>Материал:</b> {material.name}\n")
+    
+    # Добавляем информацию о группах
+    if selected_group_names:
+        info_lines.append(f"🟢 <b>Группы:</b> {groups_text}\n\n")
+        info_lines.append("🟡 <b>Добавить ещё группу?</b>\n")
+        info_lines.append("Выбери группу на клавиатуре👇")
+    else:
+        info_lines.append("🟡 <b>Выбери группы для рассылки👇</b>")
+    
+    message_text = "".join(info_lines)
+    keyboard = get_broadcast_groups_selection_keyboard(broadcast_groups, selected_groups)
+    
+    # Если текст не изменился, обновляем только клавиатуру: Telegram отклоняет
+    # edit_text с тем же содержимым
+    if message_text == data.get("broadcast_groups_text"):
+        await callback.message.edit_reply_markup(reply_markup=keyboard)
+    else:
         await callback.message.edit_text(
             message_text,
             parse_mode="HTML",
-            reply_markup=get_broadcast_groups_selection_keyboard(all_groups, selected_groups)
+            reply_markup=keyboard
         )
-        
-        log_user_action(callback.from_user.id, "broadcast_group_toggled", 
-                       f"Группа {group.name} {'добавлена' if group_id in selected_groups else 'убрана'}")
-        
-    except Exception as e:
-        await callback.message.edit_text("Произошла ошибка при выборе группы")
-        log_user_error(callback.from_user.id, "broadcast_group_toggle_error", str(e))
+    
+    await state.update_data(selected_groups=selected_groups, broadcast_groups_text=message_text)
+    
+    log_user_action(callback.from_user.id, "broadcast_group_toggled", 
+                   f"Группа {group_name} {'добавлена' if group_id in selected_groups else 'убрана'}")
 
 
 @router.callback_query(F.data == "broadcast_send", BroadcastStates.selecting_groups)
 async def callback_send_broadcast(callback: CallbackQuery, state: FSMContext, session: AsyncSession, bot):
     """Отправка рассылки с новыми параметрами"""
-    try:
-        await callback.answer()
-        
-        # Получаем данные рассылки
-        data = await state.get_data()
-        broadcast_script = data.get("broadcast_script")
-        broadcast_photos = data.get("broadcast_photos", [])
-        broadcast_material_id = data.get("broadcast_material_id")
-        selected_test_id = data.get("selected_test_id")
-        selected_groups = data.get("selected_groups", [])
-        selected_roles = data.get("selected_roles", [])
-        broadcast_docs = data.get("broadcast_docs", [])
-        
-        # Проверяем обязательные поля
-        if not broadcast_script or not selected_groups:
-            await callback.answer("Не указан текст рассылки или группы", show_alert=True)
-            return
-        
-        # Получаем пользователя
-        user = await get_user_by_tg_id(session, callback.from_user.id)
-        if not user:
-            await callback.message.edit_text("❌ Пользователь не найден")
-            return
-        
-        # Проверяем права на рассылку
-        has_permission = await check_user_permission(session, user.id, "create_tests")
-        if not has_permission:
-            await callback.message.edit_text("❌ У тебя нет прав для массовой рассылки.")
-            return
-        
-        # Преобразуем ключи ролей в названия для БД
-        target_role_names = None
-        if selected_roles:
-            role_mapping = {
-                "trainee": "Стажер",
-                "employee": "Сотрудник",
-                "mentor": "Наставник",
-                "recruiter": "Рекрутер",
-                "manager": "Руководитель"
-            }
-            target_role_names = [role_mapping[r] for r in selected_roles]
-        
-        # Выполняем массовую рассылку с новыми параметрами
-        result = await broadcast_test_to_groups(
-            session=session,
-            test_id=selected_test_id,
-            group_ids=selected_groups,
-            sent_by_id=user.id,
-            bot=bot,
-            broadcast_script=broadcast_script,
-            broadcast_photos=broadcast_photos,
-            broadcast_material_id=broadcast_material_id,
-            broadcast_docs=broadcast_docs,
-            target_roles=target_role_names
-        )
-        
-        if not result["success"]:
-            await callback.message.edit_text(
-                "❌ <b>Ошибка рассылки</b>\n\n"
-                f"Произошла ошибка: {result.get('error', 'Неизвестная ошибка')}",
-                parse_mode="HTML",
-                reply_markup=get_main_menu_keyboard()
-            )
-            return
-        
-        # Формируем сообщение об успехе
-        groups_text = "; ".join(result["group_names"])
-        
-        success_parts = ["✉️<b>РЕДАКТОР РАССЫЛКИ</b>✉️\n\n"]
-        
-        if selected_test_id:
-            test = await get_test_by_id(session, selected_test_id)
-            if test:
-                success_parts.append(f"🟢 <b>Тест:</b> {test.name}\n")
-        
-        if broadcast_material_id:
-            material = await get_knowledge_material_by_id(session, broadcast_material_id)
-            if material:
-                success_parts.append(f"🟢 <b>Материал:</b> {material.name}\n")
-        
-        if broadcast_photos:
-            success_parts.append(f"🟢 <b>Фото:</b> {len(broadcast_photos)} шт.\n")
-        if broadcast_docs:
-            success_parts.append(f"🟢 <b>Документы-изображения:</b> {len(broadcast_docs)} шт.\n")
-        
-        success_parts.append(f"🟢 <b>Группы:</b> {groups_text}\n\n")
-        success_parts.append("✅ <b>Ты успешно отправил рассылку!</b>\n\n")
-        success_parts.append(
-            f"📊 <b>Статистика:</b>\n"
-            f"• Получателей в группах: {result['total_users']}\n"
-            f"• Уведомлений отправлено: {result['total_sent']}\n"
-            f"• Ошибок отправки: {result['failed_sends']}"
-        )
-        
+    # Получаем данные рассылки
+    data = await state.get_data()
+    broadcast_script = data.get("broadcast_script")
+    broadcast_photos = data.get("broadcast_photos", [])
+    broadcast_material_id = data.get("broadcast_material_id")
+    selected_test_id = data.get("selected_test_id")
+    selected_groups = data.get("selected_groups", [])
+    selected_roles = data.get("selected_roles", [])
+    broadcast_docs = data.get("broadcast_docs", [])
+    
+    # Проверяем обязательные поля
+    if not broadcast_script or not selected_groups:
+        await callback.answer("Не указан текст рассылки или группы", show_alert=True)
+        return
+    
+    await callback.answer()
+    
+    # Получаем пользователя
+    auth = await get_cached_user_auth(session, callback.from_user.id)
+    if not auth:
+        await callback.message.edit_text("❌ Пользователь не найден")
+        return
+    
+    # Проверяем права на рассылку
+    if "create_tests" not in auth["permissions"]:
+        await callback.message.edit_text("❌ У тебя нет прав для массовой рассылки.")
+        return
+    
+    # Преобразуем ключи ролей в названия для БД
+    target_role_names = None
+    if selected_roles:
+        target_role_names = [_ROLE_NAMES[r] for r in selected_roles]
+    
+    # Выполняем массовую рассылку с новыми параметрами
+    result = await broadcast_test_to_groups(
+        session=session,
+        test_id=selected_test_id,
+        group_ids=selected_groups,
+        sent_by_id=auth["user_id"],
+        bot=bot,
+        broadcast_script=broadcast_script,
+        broadcast_photos=broadcast_photos,
+        broadcast_material_id=broadcast_material_id,
+        broadcast_docs=broadcast_docs,
+        target_roles=target_role_names
+    )
+    
+    if not result["success"]:
         await callback.message.edit_text(
-            "".join(success_parts),
+            "❌ <b>Ошибка рассылки</b>\n\n"
+            f"Произошла ошибка: {result.get('error', 'Неизвестная ошибка')}",
             parse_mode="HTML",
-            reply_markup=get_broadcast_success_keyboard()
+            reply_markup=get_main_menu_keyboard()
         )
-        
-        # Очищаем состояние
-        await state.clear()
-        
-        log_user_action(callback.from_user.id, "broadcast_completed", 
-                       f"Рассылка завершена: группы {groups_text}, отправлено {result['total_sent']}")
-        
-    except Exception as e:
-        await callback.message.edit_text("Произошла ошибка при отправке рассылки")
-        log_user_error(callback.from_user.id, "broadcast_send_error", str(e))
+        return
+    
+    # Формируем сообщение об успехе
+    groups_text = "; ".join(result["group_names"])
+    
+    success_parts = [_HDR_EDITOR]
+    
+    # Тест уже загружен внутри рассылки
+    test = result["test"]
+    if test:
+        success_parts.append(f"🟢 <b>Тест:</b> {test.name}\n")
+    
+    if broadcast_material_id:
+        material = await get_knowledge_material_by_id(session, broadcast_material_id)
+        if material:
+            success_parts.append(f"🟢 <b>Материал:</b> {material.name}\n")
+    
+    if broadcast_photos:
+        success_parts.append(f"🟢 <b>Фото:</b> {len(broadcast_photos)} шт.\n")
+    if broadcast_docs:
+        success_parts.append(f"🟢 <b>Документы-изображения:</b> {len(broadcast_docs)} шт.\n")
+    
+    success_parts.append(f"🟢 <b>Группы:</b> {groups_text}\n\n")
+    success_parts.append("✅ <b>Ты успешно отправил рассылку!</b>\n\n")
+    success_parts.append(
+        f"📊 <b>Статистика:</b>\n"
+        f"• Получателей в группах: {result['total_users']}\n"
+        f"• Уведомлений отправлено: {result['total_sent']}\n"
+        f"• Ошибок отправки: {result['failed_sends']}"
+    )
+    
+    await callback.message.edit_text(
+        "".join(success_parts),
+        parse_mode="HTML",
+        reply_markup=get_broadcast_success_keyboard()
+    )
+    
+    # Очищаем состояние
+    await state.clear()
+    
+    log_user_action(callback.from_user.id, "broadcast_completed", 
+                   f"Рассылка завершена: группы {groups_text}, отправлено {result['total_sent']}")
 
 
 @router.callback_query(F.data.startswith("broadcast_material:"))
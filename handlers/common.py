@@ -43,7 +43,7 @@ async def format_profile_text(user, session: AsyncSession) -> str:
 <b>Телефон:</b> {user.phone_number}
 <b>Username:</b> {username_display}
 <b>Номер:</b> #{user.id}
-<b>Дата регистрации:</b> {user.registration_date.strftime('%d.%m.%Y %H:%M')}
+<b>Дата регистрации:</b> {user.registration_date_str}
 
 ━━━━━━━━━━━━
 
@@ -5,7 +5,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from database.db import (
     create_group, get_all_groups, get_group_by_id, 
-    update_group_name, get_group_users, get_user_roles,
+    update_group_name, get_group_users,
     check_user_permission, get_user_by_tg_id, delete_group
 )
 from handlers.auth import check_auth
@@ -220,9 +220,7 @@ async def callback_select_group(callback: CallbackQuery, state: FSMContext, sess
         user_list = ""
         if group_users:
             for group_user in group_users:
-                user_roles = await get_user_roles(session, group_user.id)
-                role_names = ", ".join([role.name for role in user_roles])
-                user_list += f"{group_user.full_name} ({role_names})\n"
+                user_list += f"{group_user.full_name} ({group_user.roles_display})\n"
         else:
             user_list = "Пользователей в группе нет"
         
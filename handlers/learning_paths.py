@@ -9,7 +9,7 @@ from database.db import (
     save_trajectory_with_attestation_and_group, delete_learning_path,
     create_attestation, add_attestation_question, get_all_attestations,
     get_attestation_by_id, check_attestation_in_use, delete_attestation, 
-    get_all_active_tests, create_test, add_question_to_test,
+    get_all_active_tests, create_test, add_questions_to_test_bulk,
     get_all_groups, check_user_permission, get_user_by_tg_id, get_user_roles,
     get_trajectories_using_attestation, get_trajectory_usage_info
 )
@@ -1006,7 +1006,7 @@ async def process_test_threshold(message: Message, state: FSMContext, session: A
         questions = data.get('new_test_questions') or []
         for question_data in questions:
             question_data['test_id'] = test.id
-            await add_question_to_test(session, question_data)
+        await add_questions_to_test_bulk(session, questions)
         
         # Добавляем тест к текущей сессии
         trajectory_data = data.get('trajectory_data', {})
@@ -284,7 +284,7 @@ async def callback_confirm_mentor_assignment(callback: CallbackQuery, state: FSM
                 "✅ <b>Наставник успешно назначен!</b>\n\n"
                 f"👤 <b>Стажер:</b> {trainee.full_name}\n"
                 f"👨‍🏫 <b>Наставник:</b> {mentor.full_name}\n\n"
-                f"📅 <b>Дата назначения:</b> {trainee.registration_date.strftime('%d.%m.%Y %H:%M')}\n"
+                f"📅 <b>Дата назначения:</b> {trainee.registration_date_str}\n"
                 f"👤 <b>Назначил:</b> {recruiter.full_name} - Рекрутер\n\n"
                 "📬 <b>Уведомления отправлены:</b>\n"
                 "• ✅ Стажер получил контакты наставника\n"
@@ -8,7 +8,7 @@ from datetime import datetime
 
 from database.db import (
     get_unassigned_trainees, get_available_mentors, assign_mentor,
-    get_mentor_trainees, get_trainee_mentor, check_user_permission,
+    get_mentor_trainees, get_trainee_mentor, get_trainees_with_mentors, check_user_permission,
     get_user_by_tg_id, get_user_by_id, get_user_test_results, get_user_test_result,
     get_test_by_id, get_all_active_tests, grant_test_access,
     get_trainee_available_tests, get_trainee_learning_path,
@@ -598,14 +598,7 @@ async def callback_reassign_mentor(callback: CallbackQuery, state: FSMContext, s
     """Переназначение наставника - выбор стажера"""
     try:
         # Получаем всех стажеров, у которых есть наставники
-        mentors = await get_available_mentors(session)
-        trainees_with_mentors = []
-        
-        for mentor in mentors:
-            trainees = await get_mentor_trainees(session, mentor.id)
-            for trainee in trainees:
-                trainee.current_mentor = mentor  # Добавляем информацию о текущем наставнике
-                trainees_with_mentors.append(trainee)
+        trainees_with_mentors = await get_trainees_with_mentors(session)
         
         if not trainees_with_mentors:
             await callback.message.edit_text(
@@ -891,7 +884,7 @@ async def cmd_list_unassigned_trainees(message: Message, state: FSMContext, sess
             f"{i}. <b>{trainee.full_name}</b>\n"
             f"   📞 {trainee.phone_number}\n"
             f"   📧 @{trainee.username or 'не указан'}\n"
-            f"   📅 Регистрация: {trainee.registration_date.strftime('%d.%m.%Y %H:%M')}"
+            f"   📅 Регистрация: {trainee.registration_date_str}"
         )
     
     users_list = "\n\n".join(users_info)
@@ -940,11 +933,11 @@ async def callback_select_trainee_for_trajectory(callback: CallbackQuery, sessio
         f"<b>Телефон:</b> {trainee.phone_number}\n"
         f"<b>Username:</b> @{trainee.username or 'не указан'}\n"
         f"<b>Номер:</b> #{trainee_id}\n"
-        f"<b>Дата регистрации:</b> {trainee.registration_date.strftime('%d.%m.%Y %H:%M')}\n\n\n"
+        f"<b>Дата регистрации:</b> {trainee.registration_date_str}\n\n\n"
         "━━━━━━━━━━━━\n\n\n"
         "🗂️ <b>Статус:</b>\n"
         f"<b>Группа:</b> {', '.join([group.name for group in trainee.groups]) if trainee.groups else 'Не указана'}\n"
-        f"<b>Роль:</b> {', '.join([role.name for role in trainee.roles])}\n\n\n"
+        f"<b>Роль:</b> {trainee.roles_display}\n\n\n"
         "━━━━━━━━━━━━\n\n\n"
         "📍 <b>Объект:</b>\n"
         f"<b>Стажировки:</b> {trainee.internship_object.name if trainee.internship_object else 'Не указан'}\n"
@@ -1027,11 +1020,11 @@ async def callback_select_trajectory_for_trainee(callback: CallbackQuery, sessio
             f"<b>Телефон:</b> {trainee.phone_number}\n"
             f"<b>Username:</b> @{trainee.username or 'не указан'}\n"
             f"<b>Номер:</b> #{trainee_id}\n"
-            f"<b>Дата регистрации:</b> {trainee.registration_date.strftime('%d.%m.%Y %H:%M')}\n\n\n"
+            f"<b>Дата регистрации:</b> {trainee.registration_date_str}\n\n\n"
             "━━━━━━━━━━━━\n\n\n"
             "🗂️ <b>Статус:</b>\n"
             f"<b>Группа:</b> {', '.join([group.name for group in trainee.groups]) if trainee.groups else 'Не указана'}\n"
-            f"<b>Роль:</b> {', '.join([role.name for role in trainee.roles])}\n\n\n"
+            f"<b>Роль:</b> {trainee.roles_display}\n\n\n"
             "━━━━━━━━━━━━\n\n\n"
             "📍 <b>Объект:</b>\n"
             f"<b>Стажировки:</b> {trainee.internship_object.name if trainee.internship_object else 'Не указан'}\n"
@@ -1672,7 +1665,7 @@ async def process_trainee_action_selection(callback: CallbackQuery, state: FSMCo
 🧑 <b>ФИО:</b> {trainee.full_name}
 📞 <b>Телефон:</b> {trainee.phone_number}
 📧 <b>Telegram:</b> @{trainee.username or 'не указан'}
-📅 <b>Дата регистрации:</b> {trainee.registration_date.strftime('%d.%m.%Y %H:%M')}
+📅 <b>Дата регистрации:</b> {trainee.registration_date_str}
 
 👨‍🏫 <b>Наставник:</b> {mentor.full_name if mentor else 'Не назначен'}
 
@@ -1849,7 +1842,7 @@ async def process_trainee_profile(callback: CallbackQuery, session: AsyncSession
    • Телефон: {trainee.phone_number}
    • Telegram: @{trainee.username or 'не указан'}
    • ID: {trainee.tg_id}
-   • Дата регистрации: {trainee.registration_date.strftime('%d.%m.%Y %H:%M')}
+   • Дата регистрации: {trainee.registration_date_str}
 
 👨‍🏫 <b>Наставничество:</b>
    • Наставник: {mentor.full_name if mentor else 'Не назначен'}
@@ -2007,7 +2000,7 @@ async def process_new_trainees_list_callback(callback: CallbackQuery, session: A
             f"{i}. <b>{trainee.full_name}</b>\n"
             f"   📞 {trainee.phone_number}\n"
             f"   📧 @{trainee.username or 'не указан'}\n"
-            f"   📅 Регистрация: {trainee.registration_date.strftime('%d.%m.%Y %H:%M')}"
+            f"   📅 Регистрация: {trainee.registration_date_str}"
         )
     
     users_list = "\n\n".join(users_info)
@@ -2202,7 +2195,7 @@ async def callback_confirm_trajectory_assignment(callback: CallbackQuery, state:
                 f"👤 <b>Стажер:</b> {trainee.full_name}\n"
                 f"🗺️ <b>Траектория:</b> {trajectory.name}\n"
                 f"👨‍🏫 <b>Назначил:</b> {mentor.full_name}\n"
-            f"📅 <b>Дата назначения:</b> {trainee.registration_date.strftime('%d.%m.%Y %H:%M')}\n\n"
+            f"📅 <b>Дата назначения:</b> {trainee.registration_date_str}\n\n"
                 "📬 <b>Стажер получил уведомление о назначении траектории!</b>\n\n"
                 "🎯 <b>Теперь ты можешь открывать этапы стажеру по мере необходимости.</b>"
             )
@@ -2425,11 +2418,11 @@ async def callback_view_trajectory(callback: CallbackQuery, state: FSMContext, s
             f"<b>Телефон:</b> {trainee.phone_number}\n"
             f"<b>Username:</b> @{trainee.username or 'не указан'}\n"
             f"<b>Номер:</b> #{trainee_id}\n"
-            f"<b>Дата регистрации:</b> {trainee.registration_date.strftime('%d.%m.%Y %H:%M')}\n\n\n"
+            f"<b>Дата регистрации:</b> {trainee.registration_date_str}\n\n\n"
             "━━━━━━━━━━━━\n\n\n"
             "🗂️ <b>Статус:</b>\n"
             f"<b>Группа:</b> {', '.join([group.name for group in trainee.groups]) if trainee.groups else 'Не указана'}\n"
-            f"<b>Роль:</b> {', '.join([role.name for role in trainee.roles])}\n\n\n"
+            f"<b>Роль:</b> {trainee.roles_display}\n\n\n"
             "━━━━━━━━━━━━\n\n\n"
             "📍 <b>Объект:</b>\n"
             f"<b>Стажировки:</b> {trainee.internship_object.name if trainee.internship_object else 'Не указан'}\n"
@@ -2517,11 +2510,11 @@ async def callback_open_stage(callback: CallbackQuery, state: FSMContext, sessio
                 f"<b>Телефон:</b> {trainee.phone_number}\n"
                 f"<b>Username:</b> @{trainee.username or 'не указан'}\n"
                 f"<b>Номер:</b> #{trainee_id}\n"
-                f"<b>Дата регистрации:</b> {trainee.registration_date.strftime('%d.%m.%Y %H:%M')}\n\n\n"
+                f"<b>Дата регистрации:</b> {trainee.registration_date_str}\n\n\n"
                 "━━━━━━━━━━━━\n\n\n"
                 "🗂️ <b>Статус:</b>\n"
                 f"<b>Группа:</b> {', '.join([group.name for group in trainee.groups]) if trainee.groups else 'Не указана'}\n"
-                f"<b>Роль:</b> {', '.join([role.name for role in trainee.roles])}\n\n\n"
+                f"<b>Роль:</b> {trainee.roles_display}\n\n\n"
                 "━━━━━━━━━━━━\n\n\n"
                 "📍 <b>Объект:</b>\n"
                 f"<b>Стажировки:</b> {trainee.internship_object.name if trainee.internship_object else 'Не указан'}\n"
@@ -2975,11 +2968,11 @@ async def callback_view_trainee_attestation(callback: CallbackQuery, state: FSMC
             f"<b>Телефон:</b> {trainee.phone_number}\n"
             f"<b>Username:</b> @{trainee.username or 'не указан'}\n"
             f"<b>Номер:</b> #{trainee_id}\n"
-            f"<b>Дата регистрации:</b> {trainee.registration_date.strftime('%d.%m.%Y %H:%M')}\n\n\n"
+            f"<b>Дата регистрации:</b> {trainee.registration_date_str}\n\n\n"
             "━━━━━━━━━━━━\n\n\n"
             "🗂️ <b>Статус:</b>\n"
             f"<b>Группа:</b> {', '.join([group.name for group in trainee.groups]) if trainee.groups else 'Не указана'}\n"
-            f"<b>Роль:</b> {', '.join([role.name for role in trainee.roles])}\n\n\n"
+            f"<b>Роль:</b> {trainee.roles_display}\n\n\n"
             "━━━━━━━━━━━━\n\n\n"
             "📍 <b>Объект:</b>\n"
             f"<b>Стажировки:</b> {trainee.internship_object.name if trainee.internship_object else 'Не указан'}\n"
@@ -3056,11 +3049,11 @@ async def callback_select_manager_for_attestation(callback: CallbackQuery, state
             f"<b>Телефон:</b> {trainee.phone_number}\n"
             f"<b>Username:</b> @{trainee.username or 'не указан'}\n"
             f"<b>Номер:</b> #{trainee_id}\n"
-            f"<b>Дата регистрации:</b> {trainee.registration_date.strftime('%d.%m.%Y %H:%M')}\n\n\n"
+            f"<b>Дата регистрации:</b> {trainee.registration_date_str}\n\n\n"
             "━━━━━━━━━━━━\n\n\n"
             "🗂️ <b>Статус:</b>\n"
             f"<b>Группа:</b> {', '.join([group.name for group in trainee.groups]) if trainee.groups else 'Не указана'}\n"
-            f"<b>Роль:</b> {', '.join([role.name for role in trainee.roles])}\n\n\n"
+            f"<b>Роль:</b> {trainee.roles_display}\n\n\n"
             "━━━━━━━━━━━━\n\n\n"
             "📍 <b>Объект:</b>\n"
             f"<b>Стажировки:</b> {trainee.internship_object.name if trainee.internship_object else 'Не указан'}\n"
@@ -3222,7 +3215,7 @@ async def send_attestation_assignment_notification_to_manager(session: AsyncSess
             f"🧑 <b>ФИО:</b> {trainee.full_name}\n"
             f"📞 <b>Телефон:</b> {trainee.phone_number}\n"
             f"👤 <b>Username:</b> @{trainee.username or 'не указан'}\n"
-            f"👑 <b>Роли:</b> {', '.join([role.name for role in trainee.roles])}\n"
+            f"👑 <b>Роли:</b> {trainee.roles_display}\n"
             f"🗂️<b>Группа:</b> {', '.join([group.name for group in trainee.groups]) if trainee.groups else 'Не указана'}\n"
             f"📍<b>1️⃣Объект стажировки:</b> {trainee.internship_object.name if trainee.internship_object else 'Не указан'}\n"
             f"📍<b>2️⃣Объект работы:</b> {trainee.work_object.name if trainee.work_object else 'Не указан'}\n\n"
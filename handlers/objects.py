@@ -10,7 +10,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from database.db import (
     create_object, get_all_objects, get_object_by_id, 
-    update_object_name, get_object_users, get_user_roles,
+    update_object_name, get_object_users,
     check_user_permission, get_user_by_tg_id, delete_object
 )
 from handlers.auth import check_auth
@@ -226,9 +226,7 @@ async def callback_select_object(callback: CallbackQuery, state: FSMContext, ses
         user_list = ""
         if object_users:
             for object_user in object_users:
-                user_roles = await get_user_roles(session, object_user.id)
-                role_names = ", ".join([role.name for role in user_roles])
-                user_list += f"{object_user.full_name} ({role_names})\n"
+                user_list += f"{object_user.full_name} ({object_user.roles_display})\n"
         else:
             user_list = "Пользователей на объекте нет"
         
@@ -3,8 +3,8 @@ from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from sqlalchemy.ext.asyncio import AsyncSession
-import os
 
+from config import ADMIN_INIT_TOKENS_STR, MAX_ADMINS, ALLOW_AUTO_AUTH
 from database.db import get_user_by_tg_id, create_user, create_user_without_role, check_phone_exists, create_initial_admin_with_token, get_users_by_role, validate_admin_token
 from keyboards.keyboards import get_contact_keyboard, get_role_selection_keyboard
 from states.states import RegistrationStates
@@ -15,9 +15,7 @@ router = Router()
 
 async def get_admin_settings() -> tuple[int, str]:
     """Получает настройки администраторов из переменных окружения"""
-    max_admins = int(os.getenv("MAX_ADMINS", "5"))
-    admin_tokens_str = os.getenv("ADMIN_INIT_TOKENS", os.getenv("ADMIN_INIT_TOKEN", ""))
-    return max_admins, admin_tokens_str
+    return MAX_ADMINS, ADMIN_INIT_TOKENS_STR
 
 async def show_admin_token_prompt(message: Message, state: FSMContext, max_admins: int, existing_managers: list):
     """Показывает сообщение о возможности ввода токена администратора"""
@@ -470,8 +468,7 @@ async def process_role_selection(callback: CallbackQuery, state: FSMContext, ses
     try:
         await create_user(session, user_data, selected_role, bot)
         
-        auto_auth_allowed = os.getenv("ALLOW_AUTO_AUTH", "true").lower() == "true"
-        if auto_auth_allowed:
+        if ALLOW_AUTO_AUTH:
             await callback.message.answer(f"🎉 Поздравляем! Ты успешно зарегистрирован как {selected_role}.\n\nТы можешь сразу начать работу - авторизация произойдет автоматически.")
         else:
             await callback.message.answer(f"🎉 Поздравляем! Ты успешно зарегистрирован как {selected_role}.\n\nИспользуй команду /login для входа.")
@@ -748,7 +748,6 @@ async def finish_test(message: Message, state: FSMContext, session: AsyncSession
     test_id = data['test_id']
     
     score = 0
-    wrong_answers_data = []
     
     # Используем уже собранные правильные answers_details из состояния
     answers_details = data.get('answers_details', [])
@@ -767,27 +766,6 @@ async def finish_test(message: Message, state: FSMContext, session: AsyncSession
             score += question.points
         else:
             score -= question.penalty_points
-            # Добавляем в список ошибок
-            # Форматируем правильный ответ для удобного отображения
-            correct_answer_display = question.correct_answer
-            if question.question_type == 'multiple_choice':
-                try:
-                    correct_answers = json.loads(question.correct_answer) if isinstance(question.correct_answer, str) else question.correct_answer
-                    if isinstance(correct_answers, list):
-                        correct_answer_display = ', '.join(correct_answers)
-                except Exception:
-                    pass  # Если не удается распарсить, оставляем как есть
-            
-            # Форматируем пользовательский ответ для удобного отображения
-            user_answer_display = answer_detail['answer']
-            if question.question_type == 'multiple_choice' and isinstance(user_answer_display, list):
-                user_answer_display = ', '.join(user_answer_display)
-            
-            wrong_answers_data.append({
-                "question": question.question_text,
-                "user_answer": user_answer_display,
-                "correct_answer": correct_answer_display
-            })
     
     test = await get_test_by_id(session, test_id)
     score = max(0, score) # Не уходим в минус
@@ -827,8 +805,7 @@ async def finish_test(message: Message, state: FSMContext, session: AsyncSession
         'is_passed': is_passed,
         'start_time': data['start_time'],
         'end_time': datetime.now(),
-        'answers_details': data.get('answers_details', []),
-        'wrong_answers': wrong_answers_data
+        'answers_details': data.get('answers_details', [])
     }
     result = await save_test_result(session, result_data)
 
@@ -1658,7 +1635,7 @@ async def send_stage_completion_notification(session: AsyncSession, trainee_id:
         # Формируем уведомление согласно ТЗ
         notification_message = (
             f"🧑 <b>ФИО:</b> {trainee.full_name}\n"
-            f"👑 <b>Роли:</b> {', '.join([role.name for role in trainee.roles]) if trainee.roles else 'Стажёр'}\n"
+            f"👑 <b>Роли:</b> {trainee.roles_display or 'Стажёр'}\n"
             f"🗂️<b>Группа:</b> {', '.join([group.name for group in trainee.groups]) if trainee.groups else 'Не указана'}\n"
             f"📍<b>1️⃣Объект стажировки:</b> {trainee.internship_object.name if trainee.internship_object else 'Не указан'}\n"
             f"📍<b>2️⃣Объект работы:</b> {trainee.work_object.name if trainee.work_object else 'Не указан'}\n\n"
@@ -7,9 +7,9 @@ import json
 
 from database.db import (
     create_test, get_tests_by_creator, get_all_active_tests,
-    add_question_to_test, get_test_questions, get_all_stages,
+    add_questions_to_test_bulk, get_test_questions, get_all_stages,
     update_test, delete_test, get_test_by_id, check_user_permission,
-    get_user_by_tg_id, get_test_results_summary, get_user_by_id, get_user_roles,
+    get_user_by_tg_id, iter_test_results, get_user_by_id, get_user_roles,
     get_mentor_trainees, grant_test_access, update_question, delete_question,
     get_question_analytics, get_user_test_result, check_test_access
 )
@@ -779,8 +779,8 @@ async def process_threshold_and_create_test(message: Message, state: FSMContext,
         return
         
     # 2. Добавляем вопросы в БД, связанные с этим тестом
-    for i, q_data in enumerate(questions):
-        question_db_data = {
+    await add_questions_to_test_bulk(session, [
+        {
             'test_id': test.id,
             'question_number': i + 1,
             'question_type': q_data['type'],
@@ -789,7 +789,8 @@ async def process_threshold_and_create_test(message: Message, state: FSMContext,
             'correct_answer': q_data['answer'],
             'points': q_data['points']
         }
-        await add_question_to_test(session, question_db_data)
+        for i, q_data in enumerate(questions)
+    ])
         
     # 3. Финальное сообщение
     success_rate = (threshold_score / max_score) * 100
@@ -1608,9 +1609,20 @@ async def process_test_results(callback: CallbackQuery, state: FSMContext, sessi
         await callback.answer()
         return
     
-    results = await get_test_results_summary(session, test_id)
-    
-    if not results:
+    # Результаты читаются потоком: статистика считается на лету, в памяти
+    # остаются только первые 5 строк для вывода
+    total_attempts = 0
+    passed_count = 0
+    total_score = 0
+    top_results = []
+    async for result in iter_test_results(session, test_id):
+        total_attempts += 1
+        passed_count += result.is_passed
+        total_score += result.score
+        if len(top_results) < 5:
+            top_results.append(result)
+    
+    if not total_attempts:
         await callback.message.edit_text(
             f"📊 <b>Результаты теста:</b> {test.name}\n\n"
             "📋 Пока никто не проходил этот тест.\n"
@@ -1623,9 +1635,7 @@ async def process_test_results(callback: CallbackQuery, state: FSMContext, sessi
         )
     else:
         # Формируем статистику
-        total_attempts = len(results)
-        passed_count = sum(1 for r in results if r.is_passed)
-        average_score = sum(r.score for r in results) / total_attempts
+        average_score = total_score / total_attempts
         
         results_text = f"""📊 <b>Результаты теста:</b> {test.name}
 
@@ -1637,7 +1647,7 @@ async def process_test_results(callback: CallbackQuery, state: FSMContext, sessi
 📋 <b>Последние результаты:</b>"""
         
         # Показываем последние 5 результатов
-        for i, result in enumerate(results[:5]):
+        for i, result in enumerate(top_results):
             user = await get_user_by_id(session, result.user_id)
             status = "✅" if result.is_passed else "❌"
             results_text += f"\n{status} {user.full_name if user else 'Неизвестен'}: {result.score}/{result.max_possible_score} баллов"
@@ -51,7 +51,7 @@ async def format_trajectory_info(user, trainee_path=None, header="ВЫБОР Э
 <b>Телефон:</b> {user.phone_number}
 <b>Username:</b> {username_display}
 <b>Номер:</b> #{user.id}
-<b>Дата регистрации:</b> {user.registration_date.strftime('%d.%m.%Y %H:%M')}
+<b>Дата регистрации:</b> {user.registration_date_str}
 
 ━━━━━━━━━━━━
 
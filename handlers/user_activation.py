@@ -56,7 +56,7 @@ async def show_role_selection(callback: CallbackQuery, state: FSMContext, sessio
     ])
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
-    registration_date = user.registration_date.strftime('%d.%m.%Y %H:%M') if user.registration_date else "Неизвестно"
+    registration_date = user.registration_date_str or "Неизвестно"
     
     await callback.message.edit_text(
         f"✏️Укажи <b>роль</b> нового пользователя\n\n"
@@ -105,7 +105,7 @@ async def show_group_selection(callback: CallbackQuery, state: FSMContext, sessi
     ])
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
-    registration_date = user.registration_date.strftime('%d.%m.%Y %H:%M') if user.registration_date else "Неизвестно"
+    registration_date = user.registration_date_str or "Неизвестно"
     
     await callback.message.edit_text(
         f"✏️Укажи <b>группу</b> нового пользователя\n\n"
@@ -155,7 +155,7 @@ async def show_work_object_selection(callback: CallbackQuery, state: FSMContext,
     ])
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
-    registration_date = user.registration_date.strftime('%d.%m.%Y %H:%M') if user.registration_date else "Неизвестно"
+    registration_date = user.registration_date_str or "Неизвестно"
     
     await callback.message.edit_text(
         f"✏️Укажи <b>объект работы</b>, к которому будет привязан новый пользователь\n\n"
@@ -504,7 +504,7 @@ async def process_role_selection(callback: CallbackQuery, state: FSMContext, ses
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
     
-    registration_date = user.registration_date.strftime('%d.%m.%Y %H:%M') if user.registration_date else "Неизвестно"
+    registration_date = user.registration_date_str or "Неизвестно"
     
     await callback.message.edit_text(
         f"✏️Укажи <b>группу</b> нового пользователя\n\n"
@@ -589,7 +589,7 @@ async def process_group_selection(callback: CallbackQuery, state: FSMContext, se
         
         keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
         
-        registration_date = user.registration_date.strftime('%d.%m.%Y %H:%M') if user.registration_date else "Неизвестно"
+        registration_date = user.registration_date_str or "Неизвестно"
         
         await callback.message.edit_text(
             f"✏️Укажи <b>объект стажировки</b>, к которому будет привязан новый пользователь\n\n"
@@ -706,7 +706,7 @@ async def process_back_to_previous_step(callback: CallbackQuery, state: FSMConte
             ])
             
             keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
-            registration_date = user.registration_date.strftime('%d.%m.%Y %H:%M') if user.registration_date else "Неизвестно"
+            registration_date = user.registration_date_str or "Неизвестно"
             
             await callback.message.edit_text(
                 f"✏️Укажи <b>объект стажировки</b>, к которому будет привязан новый пользователь\n\n"
@@ -765,7 +765,7 @@ async def process_work_object_selection(callback: CallbackQuery, state: FSMConte
         [InlineKeyboardButton(text="❌ Отменить", callback_data="cancel_activation")]
     ])
     
-    registration_date = user.registration_date.strftime('%d.%m.%Y %H:%M') if user.registration_date else "Неизвестно"
+    registration_date = user.registration_date_str or "Неизвестно"
     
     # Формируем текст с условным отображением объекта стажировки
     confirmation_text = (
@@ -822,7 +822,7 @@ async def process_activation_confirmation(callback: CallbackQuery, state: FSMCon
         internship_object_name = internship_object.name if internship_object else "Неизвестен"
         work_object_name = work_object.name if work_object else "Неизвестен"
         
-        registration_date = user.registration_date.strftime('%d.%m.%Y %H:%M') if user.registration_date else "Неизвестно"
+        registration_date = user.registration_date_str or "Неизвестно"
         
         # Формируем текст с условным отображением объекта стажировки
         success_text = (
@@ -887,7 +887,7 @@ async def process_activation_cancellation(callback: CallbackQuery, state: FSMCon
     user_id = state_data['selected_user_id']
     user = await get_user_by_id(session, user_id)
     
-    registration_date = user.registration_date.strftime('%d.%m.%Y %H:%M') if user.registration_date else "Неизвестно"
+    registration_date = user.registration_date_str or "Неизвестно"
     
     await callback.message.edit_text(
         f"❌Ты отменил активацию нового пользователя\n"
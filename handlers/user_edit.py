@@ -44,7 +44,7 @@ async def show_user_info_detail(callback: CallbackQuery, user_id: int, session:
         f"<b>Телефон:</b> {user.phone_number}\n"
         f"<b>Username:</b> @{user.username if user.username else 'Не указан'}\n"
         f"<b>Номер:</b> #{user.id}\n"
-        f"<b>Дата регистрации:</b> {user.registration_date.strftime('%d.%m.%Y %H:%M') if user.registration_date else 'Не указана'}\n\n"
+        f"<b>Дата регистрации:</b> {user.registration_date_str or 'Не указана'}\n\n"
         f"━━━━━━━━━━━━\n\n"
         f"🗂️ <b>Статус:</b>\n"
         f"<b>Группа:</b> {group_name}\n"
@@ -434,7 +434,7 @@ async def callback_edit_user(callback: CallbackQuery, state: FSMContext, session
             f"<b>Телефон:</b> {user.phone_number}\n"
             f"<b>Username:</b> @{user.username if user.username else 'Не указан'}\n"
             f"<b>Номер:</b> #{user.id}\n"
-            f"<b>Дата регистрации:</b> {user.registration_date.strftime('%d.%m.%Y %H:%M') if user.registration_date else 'Не указана'}\n\n"
+            f"<b>Дата регистрации:</b> {user.registration_date_str or 'Не указана'}\n\n"
             f"━━━━━━━━━━━━\n\n"
             f"🗂️ <b>Статус:</b>\n"
             f"<b>Группа:</b> {group_name}\n"
@@ -676,7 +676,7 @@ async def show_user_editor(message: Message, session: AsyncSession,
 📞 Телефон: {target_user.phone_number}
 🆔 Telegram ID: {target_user.tg_id}
 👤 Username: @{target_user.username if target_user.username else 'Не указан'}
-📅 Дата регистрации: {target_user.registration_date.strftime('%d.%m.%Y %H:%M') if target_user.registration_date else 'Не указана'}
+📅 Дата регистрации: {target_user.registration_date_str or 'Не указана'}
 👑 Роли: {role_name}
 🗂️Группа: {group_name}"""
     
@@ -1075,7 +1075,7 @@ async def process_new_internship_object(callback: CallbackQuery, session: AsyncS
 📞 Телефон: {target_user.phone_number}
 🆔 Telegram ID: {target_user.tg_id}
 👤 Username: @{target_user.username if target_user.username else 'Не указан'}
-📅 Дата регистрации: {target_user.registration_date.strftime('%d.%m.%Y %H:%M') if target_user.registration_date else 'Не указана'}
+📅 Дата регистрации: {target_user.registration_date_str or 'Не указана'}
 👑 Роли: {target_user.roles[0].name if target_user.roles else 'Нет роли'}
 🗂️Группа: {target_user.groups[0].name if target_user.groups else 'Нет группы'}
 📍1️⃣Объект стажировки: {target_user.internship_object.name if target_user.internship_object else 'Не назначен'}"""
@@ -1169,7 +1169,7 @@ async def process_new_work_object(callback: CallbackQuery, session: AsyncSession
 📞 Телефон: {target_user.phone_number}
 🆔 Telegram ID: {target_user.tg_id}
 👤 Username: @{target_user.username if target_user.username else 'Не указан'}
-📅 Дата регистрации: {target_user.registration_date.strftime('%d.%m.%Y %H:%M') if target_user.registration_date else 'Не указана'}
+📅 Дата регистрации: {target_user.registration_date_str or 'Не указана'}
 👑 Роли: {current_role}
 🗂️Группа: {target_user.groups[0].name if target_user.groups else 'Нет группы'}
 📍2️⃣Объект работы: {target_user.work_object.name if target_user.work_object else 'Не назначен'}"""
@@ -1252,7 +1252,7 @@ async def process_confirm_change(callback: CallbackQuery, session: AsyncSession,
 <b>Телефон:</b> {target_user.phone_number}
 <b>Username:</b> @{target_user.username if target_user.username else 'Не указан'}
 <b>Номер:</b> #{target_user.id}
-<b>Дата регистрации:</b> {target_user.registration_date.strftime('%d.%m.%Y %H:%M') if target_user.registration_date else 'Не указана'}
+<b>Дата регистрации:</b> {target_user.registration_date_str or 'Не указана'}
 
 ━━━━━━━━━━━━
 
@@ -1455,7 +1455,7 @@ async def callback_cancel_delete_user(callback: CallbackQuery, state: FSMContext
             f"<b>Телефон:</b> {user.phone_number}\n"
             f"<b>Username:</b> @{user.username if user.username else 'Не указан'}\n"
             f"<b>Номер:</b> #{user.id}\n"
-            f"<b>Дата регистрации:</b> {user.registration_date.strftime('%d.%m.%Y %H:%M') if user.registration_date else 'Не указана'}\n\n"
+            f"<b>Дата регистрации:</b> {user.registration_date_str or 'Не указана'}\n\n"
             f"━━━━━━━━━━━━\n\n"
             f"🗂️ <b>Статус:</b>\n"
             f"<b>Группа:</b> {group_name}\n"
@@ -1557,7 +1557,7 @@ async def callback_cancel_edit(callback: CallbackQuery, state: FSMContext, sessi
             f"<b>Телефон:</b> {target_user.phone_number}\n"
             f"<b>Username:</b> @{target_user.username if target_user.username else 'Не указан'}\n"
             f"<b>Номер:</b> #{target_user.id}\n"
-            f"<b>Дата регистрации:</b> {target_user.registration_date.strftime('%d.%m.%Y %H:%M') if target_user.registration_date else 'Не указана'}\n\n"
+            f"<b>Дата регистрации:</b> {target_user.registration_date_str or 'Не указана'}\n\n"
             f"━━━━━━━━━━━━\n\n"
             f"🗂️ <b>Статус:</b>\n"
             f"<b>Группа:</b> {group_name}\n"
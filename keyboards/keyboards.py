@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
@@ -141,23 +143,57 @@ def get_manager_keyboard() -> ReplyKeyboardMarkup:
     return keyboard
 
 
-def get_user_selection_keyboard(users: list) -> InlineKeyboardMarkup:
-    """Создает инлайн-клавиатуру со списком пользователей"""
+def get_user_selection_keyboard(users: list, page: int = 0, per_page: int = 20) -> InlineKeyboardMarkup:
+    """Создает инлайн-клавиатуру со списком пользователей с пагинацией"""
 
     keyboard = []
     
-    for user in users:
+    # Пагинация: в клавиатуру попадает только текущая страница
+    start_index = page * per_page
+    end_index = start_index + per_page
+    page_users = users[start_index:end_index]
+    
+    for user in page_users:
         button = InlineKeyboardButton(
             text=f"{user.full_name} ({user.username or 'нет юзернейма'})",
             callback_data=f"user:{user.id}"
         )
         keyboard.append([button])
     
+    # Навигационные кнопки
+    nav_buttons = []
+    if page > 0:
+        nav_buttons.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"admin_users_page:{page-1}"))
+    
+    total_pages = (len(users) + per_page - 1) // per_page
+    if page < total_pages - 1:
+        nav_buttons.append(InlineKeyboardButton(text="➡️ Далее", callback_data=f"admin_users_page:{page+1}"))
+    
+    if nav_buttons:
+        keyboard.append(nav_buttons)
+    
+    # Информация о страницах
+    if total_pages > 1:
+        page_info = InlineKeyboardButton(
+            text=f"📄 {page + 1}/{total_pages}",
+            callback_data="page_info"
+        )
+        keyboard.append([page_info])
+    
     keyboard.append([InlineKeyboardButton(text="Отмена", callback_data="cancel")])
     
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
+@lru_cache(maxsize=32)
+def get_cached_user_selection_keyboard(users: tuple, page: int = 0) -> InlineKeyboardMarkup:
+    """get_user_selection_keyboard для неизменяемого списка строк пользователей
+    
+    Пока список пользователей не менялся, возвращается уже собранная клавиатура страницы.
+    """
+    return get_user_selection_keyboard(users, page)
+
+
 def get_user_action_keyboard(user_id: int) -> InlineKeyboardMarkup:
     """Создает инлайн-клавиатуру с действиями для пользователя"""
 
@@ -437,23 +473,26 @@ def get_broadcast_test_selection_keyboard(tests: list) -> InlineKeyboardMarkup:
 
 
 def get_broadcast_groups_selection_keyboard(groups: list, selected_groups: list = None) -> InlineKeyboardMarkup:
-    """Клавиатура для выбора групп для рассылки (Task 8)"""
+    """Клавиатура для выбора групп для рассылки (Task 8)
+    
+    groups - пары (id, название) групп, сохранённые в состоянии рассылки
+    """
     if selected_groups is None:
         selected_groups = []
     
     keyboard = []
     
-    for group in groups:
+    for group_id, group_name in groups:
         # Показываем выбранные группы с галочкой
-        if group.id in selected_groups:
-            text = f"✅ {group.name}"
+        if group_id in selected_groups:
+            text = f"✅ {group_name}"
         else:
-            text = f"{group.name}"
+            text = f"{group_name}"
         
         keyboard.append([
             InlineKeyboardButton(
                 text=text,
-                callback_data=f"broadcast_group:{group.id}"
+                callback_data=f"broadcast_group:{group_id}"
             )
         ])
     
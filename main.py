@@ -5,13 +5,15 @@ from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
 
 from config import BOT_TOKEN, LOG_LEVEL
-from database.db import init_db
+from database.db import init_db, warm_up_pool, start_notification_workers, stop_notification_workers
 from handlers import auth, registration, common, admin, role_permissions, tests, mentorship, test_taking, groups, objects, user_activation, user_edit, learning_paths, mentor_assignment, trainee_trajectory, manager_attestation, manager_menu, employee_transition, broadcast, knowledge_base, fallback
 from middlewares.db_middleware import DatabaseMiddleware
 from middlewares.role_middleware import RoleMiddleware
 from middlewares.bot_middleware import BotMiddleware
+from middlewares.rate_limit_middleware import RateLimitMiddleware
 from utils.errors import router as error_router
 from utils.config_validator import validate_env_vars
 from utils.logger import logger
@@ -23,11 +25,28 @@ logging.basicConfig(
     stream=sys.stdout
 )
 
-bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+
+class KeepAliveAiohttpSession(AiohttpSession):
+    """HTTP-сессия бота с увеличенным временем жизни простаивающих соединений
+    
+    По умолчанию aiohttp закрывает простаивающее соединение через 15 с,
+    из-за чего каждая новая пачка уведомлений заново проходит TLS-рукопожатие.
+    """
+    
+    def __init__(self, keepalive_timeout: float = 60, **kwargs):
+        super().__init__(**kwargs)
+        self._connector_init["keepalive_timeout"] = keepalive_timeout
+
+
+# Одна HTTP-сессия с пулом соединений на весь бот: TLS-соединения с API Telegram
+# переиспользуются между рассылками, DNS кэшируется (ttl_dns_cache aiogram)
+bot_session = KeepAliveAiohttpSession(limit=100, keepalive_timeout=60)
+bot = Bot(token=BOT_TOKEN, session=bot_session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+# Лимит частоты отправки для массовых рассылок и уведомлений (блоки bulk_sending)
+bot.session.middleware(RateLimitMiddleware())
 storage = MemoryStorage()
 dp = Dispatcher(storage=storage)
 
-dp.include_router(error_router)
 dp.include_router(auth.router)
 dp.include_router(registration.router)
 dp.include_router(admin.router)
@@ -50,6 +69,9 @@ dp.include_router(employee_transition.router)  # Переход стажеров
 dp.include_router(common.router)
 # Fallback роутер должен быть в конце!
 dp.include_router(fallback.router)
+# Глобальный обработчик ошибок - после всех роутеров, чтобы ошибки сначала
+# получали обработчики ошибок отдельных роутеров (например, рассылки)
+dp.include_router(error_router)
 
 dp.update.middleware(DatabaseMiddleware())
 dp.update.middleware(BotMiddleware())
@@ -64,6 +86,8 @@ async def main():
         # Инициализация базы данных
         logger.info("Инициализация базы данных...")
         await init_db()
+        await warm_up_pool()
+        await start_notification_workers()
 
         # Исправление прав доступа к базе знаний (если нужно)
         logger.info("Проверка прав доступа к базе знаний...")
@@ -86,6 +110,7 @@ async def main():
     finally:
         # Корректное завершение работы бота
         logger.info("Завершение работы...")
+        await stop_notification_workers()
         await bot.session.close()
         logger.info("Бот остановлен")
 
@@ -2,8 +2,9 @@ from typing import Any, Awaitable, Callable, Dict
 
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject, Message
+from sqlalchemy.exc import SQLAlchemyError
 
-from database.db import get_session
+from database.db import async_session
 from utils.logger import logger
 
 class DatabaseMiddleware(BaseMiddleware):
@@ -21,7 +22,9 @@ class DatabaseMiddleware(BaseMiddleware):
         if user_id:
             logger.debug(f"Обработка {event_type} от пользователя {user_id}")
         
-        async for session in get_session():
+        # Своя сессия на каждое обновление; async with закрывает её и возвращает
+        # соединение в пул сразу после обработчика, а не при сборке генератора
+        async with async_session() as session:
             data["session"] = session
             
             try:
@@ -34,7 +37,11 @@ class DatabaseMiddleware(BaseMiddleware):
             except Exception as e:
                 await session.rollback()
                 
-                if user_id:
+                # Функции чтения из БД не перехватывают ошибки сами,
+                # поэтому ошибки SQLAlchemy логируются здесь, на границе запроса
+                if isinstance(e, SQLAlchemyError):
+                    logger.error(f"Ошибка БД при обработке {event_type} от пользователя {user_id}: {str(e)}")
+                elif user_id:
                     logger.error(f"Ошибка обработки {event_type} от пользователя {user_id}: {str(e)}")
                 
                 if isinstance(event, Message):
@@ -0,0 +1,87 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import (
+    TelegramMethod, SendMessage, SendPhoto, SendDocument, SendVideo, SendAnimation,
+    SendAudio, SendVoice, SendVideoNote, SendMediaGroup, SendSticker, CopyMessage, ForwardMessage
+)
+from aiogram.methods.base import Response, TelegramType
+
+from utils.logger import logger
+
+# Telegram допускает около 30 сообщений в секунду на бота; оставляем запас
+MESSAGES_PER_SECOND = 25
+# Ограничение одновременных запросов отправки, чтобы не держать сотни соединений
+MAX_CONCURRENT_SENDS = 20
+# Методы, отправляющие сообщения получателям и попадающие под лимит
+RATE_LIMITED_METHODS = (
+    SendMessage, SendPhoto, SendDocument, SendVideo, SendAnimation,
+    SendAudio, SendVoice, SendVideoNote, SendMediaGroup, SendSticker,
+    CopyMessage, ForwardMessage,
+)
+
+_bulk_sending: ContextVar[bool] = ContextVar("bulk_sending", default=False)
+
+
+@contextmanager
+def bulk_sending():
+    """Помечает отправки внутри блока как массовые (рассылки, уведомления рекрутерам)
+
+    Задачи asyncio, созданные внутри блока, наследуют пометку через контекст.
+    """
+    token = _bulk_sending.set(True)
+    try:
+        yield
+    finally:
+        _bulk_sending.reset(token)
+
+
+class RateLimitMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота, ограничивающий частоту отправки сообщений
+
+    Действует только на отправки из блоков bulk_sending(), поэтому параллельные
+    рассылки и уведомления не упираются в лимит Telegram, а ответы обработчиков
+    пользователям не ждут в общей очереди за сообщениями рассылки.
+    Если Telegram всё же ответил 429, все отправки приостанавливаются на
+    retry_after секунд, а запрос повторяется один раз.
+    """
+
+    def __init__(self, rate: int = MESSAGES_PER_SECOND, max_concurrent: int = MAX_CONCURRENT_SENDS):
+        self.interval = 1 / rate
+        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.lock = asyncio.Lock()
+        self.next_slot = 0.0
+
+    async def _wait_slot(self):
+        # Слоты выдаются по очереди с равным интервалом
+        async with self.lock:
+            now = time.monotonic()
+            delay = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        if not (_bulk_sending.get() and isinstance(method, RATE_LIMITED_METHODS)):
+            return await make_request(bot, method)
+
+        async with self.semaphore:
+            await self._wait_slot()
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                logger.warning(f"Превышен лимит API Telegram, повтор через {e.retry_after} с")
+                async with self.lock:
+                    self.next_slot = max(self.next_slot, time.monotonic() + e.retry_after)
+                await self._wait_slot()
+                return await make_request(bot, method)
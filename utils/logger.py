@@ -1,7 +1,9 @@
+import atexit
 import logging
+import queue
 import sys
 import os
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 from datetime import datetime
 
 logs_dir = os.path.join(os.getcwd(), 'logs')
@@ -33,10 +35,31 @@ if sys.platform == "win32":
     import codecs
     sys.stdout.reconfigure(encoding='utf-8')
 
+# Максимум записей, ожидающих записи в файл и консоль; при переполнении новые записи отбрасываются
+LOG_QUEUE_SIZE = 10000
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler, который не блокирует и не падает при переполненной очереди"""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+# Запись в файл и консоль выполняется в отдельном потоке QueueListener,
+# чтобы логирование в обработчиках не блокировало цикл событий бота
+log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+log_listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+log_listener.start()
+# При завершении процесса дописываем оставшиеся в очереди записи
+atexit.register(log_listener.stop)
+
 logger = logging.getLogger('telegram_bot')
 logger.setLevel(logging.INFO)
-logger.addHandler(file_handler)
-logger.addHandler(console_handler)
+logger.addHandler(DroppingQueueHandler(log_queue))
 
 def log_user_action(user_id, username, action, extra_data=None):
     """Логирует действия пользователя"""